@@ -0,0 +1,104 @@
+"""
+Money movements between the department budget, grants and their budgets.
+Each movement is also appended to the grant's LedgerEntry history.
+
+Every balance change is a single UPDATE with an F() expression (or runs
+under a row lock), so concurrent requests can't lose each other's updates,
+and the checks ("enough department funds?") happen in the same statement
+as the debit.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from users.models import HOD
+from .models import Grant, Budget, LedgerEntry
+from . import analytics
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def _positive(amount):
+    amount = Decimal(amount)
+    if amount <= 0:
+        raise ValueError("Amount must be positive.")
+    return amount
+
+
+def debit_department(hod, amount):
+    """Take `amount` from the HOD's department budget, failing if it would go negative."""
+    updated = HOD.objects.filter(pk=hod.pk, total_department_budget__gte=amount).update(
+        total_department_budget=F('total_department_budget') - amount
+    )
+    if not updated:
+        raise InsufficientFunds(f"Insufficient department funds for RM{amount}.")
+    hod.refresh_from_db(fields=['total_department_budget'])
+
+
+def credit_department(hod, amount):
+    HOD.objects.filter(pk=hod.pk).update(total_department_budget=F('total_department_budget') + amount)
+    hod.refresh_from_db(fields=['total_department_budget'])
+
+
+def allocate_grant(hod, proposal, amount, start_date, end_date):
+    """Fund a new grant for `proposal` out of the department budget."""
+    amount = _positive(amount)
+    with transaction.atomic():
+        debit_department(hod, amount)
+        grant = Grant.objects.create(
+            proposal=proposal,
+            totalAllocatedAmount=amount,
+            startDate=start_date,
+            endDate=end_date
+        )
+        Budget.objects.create(grant=grant, totalSpent=0)
+        LedgerEntry.objects.create(grant=grant, kind=LedgerEntry.ALLOCATION, amount=amount)
+        analytics.record_allocation(amount, new_grant=True)
+    return grant
+
+
+def reallocate_grant(hod, grant, amount, start_date, end_date):
+    """Change an existing grant's allocation, moving the difference to/from the department."""
+    amount = _positive(amount)
+    with transaction.atomic():
+        current = Grant.objects.select_for_update().get(pk=grant.pk).totalAllocatedAmount
+        delta = amount - current
+        if delta > 0:
+            debit_department(hod, delta)
+        elif delta < 0:
+            credit_department(hod, -delta)
+        Grant.objects.filter(pk=grant.pk).update(totalAllocatedAmount=amount, startDate=start_date, endDate=end_date)
+        if delta:
+            LedgerEntry.objects.create(grant=grant, kind=LedgerEntry.ADJUSTMENT, amount=delta)
+        analytics.record_allocation(delta)
+    grant.refresh_from_db()
+    return grant
+
+
+def top_up_grant(hod, grant, amount):
+    """Move extra funds from the department budget into a grant."""
+    amount = _positive(amount)
+    with transaction.atomic():
+        debit_department(hod, amount)
+        Grant.objects.filter(pk=grant.pk).update(totalAllocatedAmount=F('totalAllocatedAmount') + amount)
+        LedgerEntry.objects.create(grant=grant, kind=LedgerEntry.TOP_UP, amount=amount)
+        analytics.record_allocation(amount)
+    grant.refresh_from_db(fields=['totalAllocatedAmount'])
+    return grant
+
+
+def record_expenditure(proposal, amount, report=None):
+    """Add a reported expenditure to the proposal's grant budget. Returns False if there is no budget."""
+    amount = _positive(amount)
+    grant_id = Grant.objects.filter(proposal=proposal).values_list('pk', flat=True).first()
+    if grant_id is None:
+        return False
+    with transaction.atomic():
+        updated = Budget.objects.filter(grant_id=grant_id).update(totalSpent=F('totalSpent') + amount)
+        if updated:
+            LedgerEntry.objects.create(grant_id=grant_id, kind=LedgerEntry.EXPENDITURE, amount=amount, report=report)
+            analytics.record_expenditure(amount)
+    return bool(updated)
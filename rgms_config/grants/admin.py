@@ -1,4 +1,4 @@
 from django.contrib import admin
-from .models import Proposal, Grant, Budget, Evaluation, ProgressReport
+from .models import ProposalThread, Proposal, ProposalTransition, Grant, Budget, Evaluation, ProgressReport
 
-admin.site.register([Proposal, Grant, Budget, Evaluation, ProgressReport])
\ No newline at end of file
+admin.site.register([ProposalThread, Proposal, ProposalTransition, Grant, Budget, Evaluation, ProgressReport])
\ No newline at end of file
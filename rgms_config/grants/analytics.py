@@ -0,0 +1,129 @@
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum
+
+from .models import Proposal, ProposalStatus, Grant, Budget, AnalyticsSnapshot
+
+# Bucket name -> Proposal.status value
+STATUS_BUCKETS = {
+    'approved': ProposalStatus.APPROVED,
+    'rejected': ProposalStatus.REJECTED,
+    'on_track': ProposalStatus.ON_TRACK,
+    'needs_intervention': ProposalStatus.NEEDS_INTERVENTION,
+}
+BUCKET_FOR_STATUS = {status: name for name, status in STATUS_BUCKETS.items()}
+
+SNAPSHOT_ID = 1
+
+
+def proposal_status_counts():
+    """Total proposals plus one count per status bucket, in a single query."""
+    buckets = {
+        name: Count('pk', filter=Q(status=status))
+        for name, status in STATUS_BUCKETS.items()
+    }
+    return Proposal.objects.aggregate(total=Count('pk'), **buckets)
+
+
+def grant_totals():
+    """Sum of allocated funds and number of grants, in a single query."""
+    totals = Grant.objects.aggregate(
+        total_allocated=Sum('totalAllocatedAmount'),
+        active_grants=Count('pk'),
+    )
+    totals['total_allocated'] = totals['total_allocated'] or 0
+    return totals
+
+
+def department_analytics():
+    """Everything the analytics page and PDF export need, computed live: two queries flat."""
+    return {**proposal_status_counts(), **grant_totals()}
+
+
+# --- Materialized snapshot ---
+
+def _live_snapshot_values():
+    stats = department_analytics()
+    return {
+        'total_proposals': stats['total'],
+        'approved': stats['approved'],
+        'rejected': stats['rejected'],
+        'on_track': stats['on_track'],
+        'needs_intervention': stats['needs_intervention'],
+        'active_grants': stats['active_grants'],
+        'total_allocated': Decimal(stats['total_allocated']),
+        'total_expenditure': Budget.objects.aggregate(total=Sum('totalSpent'))['total'] or Decimal('0'),
+    }
+
+
+def rebuild_snapshot():
+    """Recompute the snapshot from the live tables."""
+    snapshot, _ = AnalyticsSnapshot.objects.update_or_create(pk=SNAPSHOT_ID, defaults=_live_snapshot_values())
+    return snapshot
+
+
+def snapshot_drift():
+    """Fields where the snapshot disagrees with the live aggregates: {field: (snapshot, live)}."""
+    snapshot = AnalyticsSnapshot.objects.filter(pk=SNAPSHOT_ID).first()
+    live = _live_snapshot_values()
+    if snapshot is None:
+        return {field: (None, value) for field, value in live.items()}
+    return {
+        field: (getattr(snapshot, field), value)
+        for field, value in live.items()
+        if getattr(snapshot, field) != value
+    }
+
+
+def snapshot_analytics():
+    """Analytics read from the snapshot row (same keys as department_analytics)."""
+    snapshot = AnalyticsSnapshot.objects.filter(pk=SNAPSHOT_ID).first() or rebuild_snapshot()
+    return {
+        'total': snapshot.total_proposals,
+        'approved': snapshot.approved,
+        'rejected': snapshot.rejected,
+        'on_track': snapshot.on_track,
+        'needs_intervention': snapshot.needs_intervention,
+        'active_grants': snapshot.active_grants,
+        'total_allocated': snapshot.total_allocated,
+        'total_expenditure': snapshot.total_expenditure,
+    }
+
+
+def _bump(**deltas):
+    """Apply deltas with F() so concurrent writers don't overwrite each other."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = AnalyticsSnapshot.objects.filter(pk=SNAPSHOT_ID).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        # No snapshot yet: build it from the live tables (which already include this write)
+        rebuild_snapshot()
+
+
+def record_proposal_created(status):
+    deltas = {'total_proposals': 1}
+    if status in BUCKET_FOR_STATUS:
+        deltas[BUCKET_FOR_STATUS[status]] = 1
+    _bump(**deltas)
+
+
+def record_status_change(old_status, new_status):
+    if old_status == new_status:
+        return
+    deltas = {}
+    if old_status in BUCKET_FOR_STATUS:
+        deltas[BUCKET_FOR_STATUS[old_status]] = -1
+    if new_status in BUCKET_FOR_STATUS:
+        deltas[BUCKET_FOR_STATUS[new_status]] = deltas.get(BUCKET_FOR_STATUS[new_status], 0) + 1
+    _bump(**deltas)
+
+
+def record_allocation(amount, new_grant=False):
+    _bump(total_allocated=amount, active_grants=1 if new_grant else 0)
+
+
+def record_expenditure(amount):
+    _bump(total_expenditure=amount)
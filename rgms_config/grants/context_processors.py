@@ -0,0 +1,6 @@
+from .models import ProposalStatus
+
+
+def workflow(request):
+    # Lets templates compare against states: {% if proposal.status == ProposalStatus.APPROVED %}
+    return {'ProposalStatus': ProposalStatus}
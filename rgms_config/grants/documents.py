@@ -0,0 +1,130 @@
+"""
+Serving stored files (proposal documents) without loading them into memory.
+
+serve_file() streams from the storage backend in FILE_CHUNK_SIZE pieces,
+answers single-range Range requests with 206, and honours If-None-Match /
+If-Modified-Since with 304. With DOCUMENT_SENDFILE_HEADER set it returns no
+body at all and lets the web server (nginx X-Accel-Redirect, Apache/lighttpd
+X-Sendfile) send the file.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import escape_uri_path
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(size, modified):
+    return quote_etag(f'{size:x}-{int(modified.timestamp() * 1_000_000):x}')
+
+
+def if_range_matches(if_range, etag, last_modified):
+    """Whether an If-Range validator (entity tag or HTTP-date) still matches the file."""
+    if if_range.startswith(('"', 'W/"')):
+        return if_range == etag  # strong comparison: weak tags never match
+    date = parse_http_date_safe(if_range)
+    return date is not None and date == int(last_modified)
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to ignore the header
+    (missing, malformed or multi-range: send the whole file), or False when the
+    range can't be satisfied.
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes; none of an empty file or "-0" can be sent
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(fileobj, start, length):
+    try:
+        fileobj.seek(start)
+        while length > 0:
+            chunk = fileobj.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def serve_file(request, fieldfile, filename=None):
+    """Response for downloading `fieldfile` (a FieldFile), handling conditional and range requests."""
+    storage, name = fieldfile.storage, fieldfile.name
+    filename = filename or os.path.basename(name)
+    size = storage.size(name)
+    modified = storage.get_modified_time(name)
+    etag = file_etag(size, modified)
+    last_modified = modified.timestamp()
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        # Caches refresh their stored validators from the 304
+        not_modified['ETag'] = etag
+        not_modified['Last-Modified'] = http_date(last_modified)
+        not_modified['Cache-Control'] = 'private, no-cache'
+        return not_modified
+
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    sendfile_header = getattr(settings, 'DOCUMENT_SENDFILE_HEADER', None)
+
+    if sendfile_header:
+        # The web server handles the body, including Range
+        response = HttpResponse(content_type=content_type)
+        if sendfile_header == 'X-Accel-Redirect':
+            response[sendfile_header] = escape_uri_path(settings.DOCUMENT_SENDFILE_PREFIX + name)
+        else:
+            response[sendfile_header] = storage.path(name)
+    else:
+        byte_range = parse_range(request.headers.get('Range'), size)
+        # If-Range: only honour the range if the client's copy is still current
+        if_range = request.headers.get('If-Range')
+        if byte_range and if_range and not if_range_matches(if_range.strip(), etag, last_modified):
+            byte_range = None
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _read_range(storage.open(name, 'rb'), start, length), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+        else:
+            response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+            response.block_size = FILE_CHUNK_SIZE
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = content_disposition_header(False, filename)
+    # Private documents: browsers may cache and revalidate, shared caches may not
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,110 @@
+"""
+Plain-text extraction from uploaded proposal documents, for the search index.
+
+PDFs are read with pypdf, DOCX files straight from their XML. Legacy .doc
+files have no practical pure-Python reader, so they contribute no text (the
+title and research interests are still indexed).
+"""
+import logging
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from django.utils import timezone
+
+from .models import Proposal, ProposalText
+
+logger = logging.getLogger(__name__)
+
+# Enough for any real proposal; keeps one odd upload from bloating the index
+MAX_TEXT_LENGTH = 500_000
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def _pdf_text(fileobj):
+    from pypdf import PdfReader
+
+    reader = PdfReader(fileobj)
+    parts, length = [], 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        parts.append(text)
+        length += len(text)
+        if length >= MAX_TEXT_LENGTH:
+            break
+    return '\n'.join(parts)
+
+
+def _docx_text(fileobj):
+    with zipfile.ZipFile(fileobj) as docx:
+        root = ElementTree.fromstring(docx.read('word/document.xml'))
+    paragraphs = []
+    for paragraph in root.iter(f'{_WORD_NS}p'):
+        paragraphs.append(''.join(node.text or '' for node in paragraph.iter(f'{_WORD_NS}t')))
+    return '\n'.join(p for p in paragraphs if p)
+
+
+EXTRACTORS = {
+    '.pdf': _pdf_text,
+    '.docx': _docx_text,
+}
+
+
+def extract_text(fieldfile):
+    """Text content of a stored document, or '' if it can't be read."""
+    extractor = EXTRACTORS.get(os.path.splitext(fieldfile.name)[1].lower())
+    if extractor is None:
+        return ''
+    try:
+        with fieldfile.storage.open(fieldfile.name, 'rb') as f:
+            text = extractor(f)
+    except Exception:
+        logger.warning("Could not extract text from %s", fieldfile.name, exc_info=True)
+        return ''
+    return re.sub(r'[ \t\r\f\v]+', ' ', text).strip()[:MAX_TEXT_LENGTH]
+
+
+def extract_proposal_text(proposal):
+    """Extract and store the text of `proposal`'s document; returns the ProposalText."""
+    source = proposal.pdf_file.name if proposal.pdf_file else ''
+    existing = ProposalText.objects.filter(proposal=proposal).first()
+    if existing is not None and existing.source == source:
+        return existing
+
+    # Content-addressed storage: another version with the same blob was already extracted
+    reused = ProposalText.objects.filter(source=source).exclude(source='').values_list('content', flat=True).first()
+    content = reused if reused is not None else (extract_text(proposal.pdf_file) if source else '')
+
+    text, _ = ProposalText.objects.update_or_create(
+        proposal=proposal, defaults={'source': source, 'content': content, 'extracted_at': timezone.now()}
+    )
+    return text
+
+
+def _index(proposals):
+    from . import search
+
+    try:
+        backend = search.get_backend()
+    except NotImplementedError:
+        backend = None  # the stored text still serves the substring fallback
+    for proposal in proposals:
+        text = extract_proposal_text(proposal)
+        if backend is not None:
+            backend.index(proposal, text.content)
+
+
+def index_proposal_job(job):
+    """Background job handler (kind 'index_proposal'): extract the document text, then index it."""
+    _index(Proposal.objects.select_related('researcher').filter(pk=job.payload['proposal_id']))
+
+
+def index_researcher_job(job):
+    """
+    Background job handler (kind 'index_researcher'): re-index every proposal of a
+    researcher, whose research interests are part of each indexed document.
+    Already extracted text is reused, so this only rewrites the index rows.
+    """
+    _index(Proposal.objects.select_related('researcher').filter(researcher_id=job.payload['researcher_id']).iterator())
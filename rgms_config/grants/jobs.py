@@ -0,0 +1,159 @@
+"""
+Database-backed background jobs.
+
+Jobs are rows in BackgroundJob. By default they are run on a small in-process
+thread pool as soon as the enqueuing transaction commits; with
+BACKGROUND_JOBS_IN_PROCESS = False they are left for `manage.py run_job_worker`.
+Either way a job is claimed with a conditional UPDATE, so only one worker runs it.
+
+A worker that dies mid-job leaves the row RUNNING; once it has been running for
+BACKGROUND_JOB_STALE_AFTER seconds reclaim_stale() requeues it (or fails it after
+BACKGROUND_JOB_MAX_ATTEMPTS claims). Finished jobs and their export files are
+removed by purge_finished_jobs() after BACKGROUND_JOB_RETENTION_DAYS.
+"""
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> dotted path of a handler taking the BackgroundJob
+HANDLERS = {
+    'analytics_pdf': 'grants.reports.analytics_pdf_job',
+    'index_proposal': 'grants.extraction.index_proposal_job',
+    'index_researcher': 'grants.extraction.index_researcher_job',
+    'purge_jobs': 'grants.jobs.purge_jobs_job',
+    'purge_notifications': 'users.retention.purge_notifications_job',
+    'purge_sessions': 'users.sessions.purge_sessions_job',
+    'purge_uploads': 'grants.uploads.purge_uploads_job',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BACKGROUND_JOB_WORKERS', 2),
+                thread_name_prefix='rgms-job'
+            )
+    return _executor
+
+
+def enqueue(kind, payload=None, requested_by=None):
+    """Create a job and schedule it; returns the BackgroundJob."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = BackgroundJob.objects.create(kind=kind, payload=payload or {}, requested_by=requested_by)
+    if getattr(settings, 'BACKGROUND_JOBS_IN_PROCESS', True):
+        transaction.on_commit(lambda: get_executor().submit(run_in_thread, job.pk))
+    return job
+
+
+def claim(job_id):
+    """Atomically move a queued job to running; False if someone else got it."""
+    return BackgroundJob.objects.filter(pk=job_id, status=BackgroundJob.QUEUED).update(
+        status=BackgroundJob.RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1
+    ) == 1
+
+
+def run_job(job_id):
+    """Claim and execute one job. Returns True if this call ran it."""
+    if not claim(job_id):
+        return False
+
+    job = BackgroundJob.objects.get(pk=job_id)
+    try:
+        import_string(HANDLERS[job.kind])(job)
+    except Exception:
+        logger.exception("Background job %s failed", job_id)
+        job.status = BackgroundJob.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = BackgroundJob.DONE
+    job.finished_at = timezone.now()
+    # Only record the outcome if the job wasn't reclaimed from us in the meantime
+    finished = BackgroundJob.objects.filter(pk=job.pk, status=BackgroundJob.RUNNING, attempts=job.attempts).update(
+        status=job.status, error=job.error, result_file=job.result_file.name or '', finished_at=job.finished_at
+    )
+    if not finished:
+        logger.warning("Background job %s was reclaimed while running; discarding this run", job_id)
+        if job.result_file:
+            job.result_file.delete(save=False)
+    return True
+
+
+def reclaim_stale(now=None):
+    """
+    Requeue jobs left RUNNING past BACKGROUND_JOB_STALE_AFTER by a lost worker;
+    those already claimed BACKGROUND_JOB_MAX_ATTEMPTS times are failed instead.
+    Returns (requeued, failed).
+    """
+    now = now or timezone.now()
+    stale = BackgroundJob.objects.filter(
+        status=BackgroundJob.RUNNING,
+        started_at__lt=now - timedelta(seconds=getattr(settings, 'BACKGROUND_JOB_STALE_AFTER', 30 * 60)),
+    )
+    max_attempts = getattr(settings, 'BACKGROUND_JOB_MAX_ATTEMPTS', 3)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=BackgroundJob.FAILED, finished_at=now,
+        error=f"Worker was lost while running this job ({max_attempts} attempts).",
+    )
+    requeued = stale.update(status=BackgroundJob.QUEUED, started_at=None)
+    return requeued, failed
+
+
+def run_in_thread(job_id):
+    # Pool threads keep their own DB connections; drop stale ones around each job
+    close_old_connections()
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def run_pending(limit=None):
+    """Run queued jobs oldest first (used by the worker command). Returns the number run."""
+    reclaim_stale()
+    job_ids = BackgroundJob.objects.filter(status=BackgroundJob.QUEUED).order_by('created_at').values_list('pk', flat=True)
+    if limit:
+        job_ids = job_ids[:limit]
+    return sum(1 for job_id in list(job_ids) if run_job(job_id))
+
+
+def finished_jobs(now=None):
+    """Done or failed jobs that finished more than BACKGROUND_JOB_RETENTION_DAYS ago."""
+    days = getattr(settings, 'BACKGROUND_JOB_RETENTION_DAYS', 7)
+    return BackgroundJob.objects.filter(
+        status__in=[BackgroundJob.DONE, BackgroundJob.FAILED],
+        finished_at__lt=(now or timezone.now()) - timedelta(days=days),
+    )
+
+
+def purge_finished_jobs(now=None):
+    """Delete old finished jobs and their result files. Returns the number removed."""
+    removed = 0
+    for job in finished_jobs(now).only('pk', 'result_file').iterator():
+        if job.result_file:
+            job.result_file.delete(save=False)
+        removed += BackgroundJob.objects.filter(pk=job.pk).delete()[0]
+    return removed
+
+
+def purge_jobs_job(job):
+    """Background job handler (kind 'purge_jobs')."""
+    reclaim_stale()
+    purge_finished_jobs()
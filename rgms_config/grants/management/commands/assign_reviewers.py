@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from grants import matching
+
+
+class Command(BaseCommand):
+    help = "Match pending proposals to reviewers by research-interest similarity."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-proposal', type=int, default=matching.REVIEWERS_PER_PROPOSAL)
+        parser.add_argument('--capacity', type=int, help="Max open assignments per reviewer (default: spread evenly).")
+        parser.add_argument('--dry-run', action='store_true', help="Print the plan without saving it.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        plan = matching.plan_assignments(per_proposal=options['per_proposal'], capacity=options['capacity'])
+        elapsed = time.perf_counter() - started
+
+        if options['verbosity'] > 1 or options['dry_run']:
+            for assignment in plan:
+                self.stdout.write(
+                    f"#{assignment.proposal.pk} {assignment.proposal.title} -> "
+                    f"{assignment.reviewer.username} ({assignment.score:.3f})"
+                )
+        if options['dry_run']:
+            self.stdout.write(f"Planned {len(plan)} assignment(s) in {elapsed:.2f}s.")
+        else:
+            created = matching.save_assignments(plan)
+            self.stdout.write(f"Created {created} assignment(s) in {elapsed:.2f}s.")
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from grants import storage
+
+
+class Command(BaseCommand):
+    help = "Recount document blob references and delete blobs no proposal uses any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=24,
+            help="Hours an unreferenced blob is kept before deletion (default 24).",
+        )
+        parser.add_argument('--import-legacy', action='store_true', help="First move pre-blob documents into the blob store.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted without deleting.")
+
+    def handle(self, *args, **options):
+        if options['import_legacy'] and not options['dry_run']:
+            moved = storage.import_legacy_documents()
+            self.stdout.write(f"Moved {moved} legacy document(s) into the blob store.")
+
+        removed, freed = storage.collect_garbage(timedelta(hours=options['grace']), dry_run=options['dry_run'])
+        verb = "Would remove" if options['dry_run'] else "Removed"
+        self.stdout.write(f"{verb} {removed} unreferenced blob(s), {freed} bytes.")
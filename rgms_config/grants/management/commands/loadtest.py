@@ -0,0 +1,234 @@
+import hashlib
+import logging
+import queue
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from grants import analytics
+from grants.models import BackgroundJob, DocumentBlob, Proposal
+from grants.storage import blob_name
+from users.models import HOD, Researcher, Reviewer, User
+
+USERNAME_PREFIX = 'loadtest-'
+# Errors that mean "waited too long for a lock" rather than a bug
+LOCK_ERRORS = ('database is locked', 'database table is locked', 'lock timeout', 'deadlock', 'could not serialize')
+
+STEPS = ('submit', 'evaluate', 'approve')
+
+
+class Command(BaseCommand):
+    help = (
+        "Push proposals through submit -> evaluate -> approve from concurrent clients against the "
+        "configured database (RGMS_DB_PROFILE) and report throughput and lock-wait errors. "
+        "Throwaway users and everything they create are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--proposals', type=int, default=200, help="Proposals to push through the workflow.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Worker threads (simultaneous requests).")
+        parser.add_argument('--researchers', type=int, default=20)
+        parser.add_argument('--reviewers', type=int, default=10)
+        parser.add_argument('--hods', type=int, default=2)
+
+    def handle(self, *args, **options):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.document = f'%PDF-1.4\n% loadtest {self.run_id}\n%%EOF\n'.encode()
+        media_root = tempfile.mkdtemp(prefix='rgms-loadtest-')
+        try:
+            # Jobs are queued but not run, so the numbers are the request path only
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                BACKGROUND_JOBS_IN_PROCESS=False,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                self.create_users(options)
+                # Failed requests are counted below; don't also dump every traceback
+                request_logger = logging.getLogger('django.request')
+                level = request_logger.level
+                request_logger.setLevel(logging.CRITICAL)
+                try:
+                    elapsed = self.run(options['proposals'], options['concurrency'])
+                finally:
+                    request_logger.setLevel(level)
+                    self.clean_up()
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.report(elapsed, options['concurrency'])
+
+    def create_users(self, options):
+        prefix = f'{USERNAME_PREFIX}{self.run_id}-'
+        self.researchers = [
+            Researcher.objects.create_user(
+                username=f'{prefix}researcher-{i}', role='Researcher', department='Load', researchinterests='testing',
+            )
+            for i in range(options['researchers'])
+        ]
+        self.reviewers = [
+            Reviewer.objects.create_user(
+                username=f'{prefix}reviewer-{i}', role='Reviewer', specialization='Load', researchinterests='testing',
+            )
+            for i in range(options['reviewers'])
+        ]
+        self.hods = [
+            HOD.objects.create_user(
+                username=f'{prefix}hod-{i}', role='HOD', deptID='LOAD', total_department_budget=10 ** 12,
+            )
+            for i in range(options['hods'])
+        ]
+
+    def run(self, proposals, concurrency):
+        self.timings = defaultdict(list)
+        self.lock_errors = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.first_errors = {}
+        self.stats_lock = threading.Lock()
+
+        tasks = queue.Queue()
+        for i in range(proposals):
+            tasks.put(('submit', i))
+        self.remaining = proposals
+        self.local = threading.local()
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=self.worker, args=(tasks,)) for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - started
+
+    def worker(self, tasks):
+        self.local.clients = {}
+        try:
+            while True:
+                with self.stats_lock:
+                    if self.remaining == 0:
+                        return
+                try:
+                    step, value = tasks.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+
+                next_task = None
+                started = time.perf_counter()
+                try:
+                    next_task = getattr(self, step)(value)
+                except OperationalError as e:
+                    self.record_error(step, e, lock=any(s in str(e).lower() for s in LOCK_ERRORS))
+                except Exception as e:
+                    self.record_error(step, e, lock=False)
+                else:
+                    with self.stats_lock:
+                        self.timings[step].append(time.perf_counter() - started)
+
+                if next_task is None:
+                    # Finished (approved) or abandoned after an error
+                    with self.stats_lock:
+                        self.remaining -= 1
+                else:
+                    tasks.put(next_task)
+        finally:
+            connection.close()
+
+    def record_error(self, step, error, lock):
+        with self.stats_lock:
+            (self.lock_errors if lock else self.errors)[step] += 1
+            self.first_errors.setdefault(step, f'{type(error).__name__}: {error}')
+
+    def client_for(self, user):
+        client = self.local.clients.get(user.pk)
+        if client is None:
+            client = self.local.clients[user.pk] = Client()
+            client.force_login(user)
+        return client
+
+    def submit(self, i):
+        title = f'Load test {self.run_id} #{i}'
+        response = self.client_for(random.choice(self.researchers)).post(reverse('submit_proposal'), {
+            'title': title,
+            'requested_amount': '5000',
+            'pdf_file': SimpleUploadedFile('proposal.pdf', self.document, content_type='application/pdf'),
+        })
+        expect_redirect(response, 'submit')
+        return ('evaluate', Proposal.objects.values_list('pk', flat=True).get(title=title))
+
+    def evaluate(self, proposal_id):
+        response = self.client_for(random.choice(self.reviewers)).post(
+            reverse('evaluate_proposal', args=[proposal_id]),
+            {'score': random.randint(40, 100), 'feedbackComments': 'Load test evaluation.'},
+        )
+        expect_redirect(response, 'evaluate')
+        return ('approve', proposal_id)
+
+    def approve(self, proposal_id):
+        today = date.today()
+        response = self.client_for(random.choice(self.hods)).post(reverse('approve_proposal', args=[proposal_id]), {
+            'action': 'approve',
+            'amount': '1000',
+            'start_date': today.isoformat(),
+            'end_date': (today + timedelta(days=365)).isoformat(),
+        })
+        expect_redirect(response, 'approve')
+        return None
+
+    def clean_up(self):
+        users = User.objects.filter(username__startswith=f'{USERNAME_PREFIX}{self.run_id}-')
+        BackgroundJob.objects.filter(requested_by__in=users).delete()
+        # Cascades to proposals, evaluations, grants, ledger entries and notifications
+        users.delete()
+        DocumentBlob.objects.filter(name=blob_name(hashlib.sha256(self.document).hexdigest(), '.pdf')).delete()
+        # The workflow bumped the analytics snapshot for rows that are now gone
+        analytics.rebuild_snapshot()
+
+    def report(self, elapsed, concurrency):
+        db = settings.DATABASES['default']
+        self.stdout.write(
+            f"Profile {getattr(settings, 'DB_PROFILE', '?')} ({db['ENGINE'].rsplit('.', 1)[-1]}), "
+            f"{concurrency} concurrent clients"
+        )
+        self.stdout.write(f"{'step':<10} {'ok':>6} {'lock-wait':>10} {'errors':>7} {'p50':>9} {'p95':>9}")
+        total = 0
+        for step in STEPS:
+            timings = self.timings[step]
+            total += len(timings)
+            self.stdout.write(
+                f"{step:<10} {len(timings):>6} {self.lock_errors[step]:>10} {self.errors[step]:>7} "
+                f"{ms(percentile(timings, 50)):>9} {ms(percentile(timings, 95)):>9}"
+            )
+        self.stdout.write(
+            f"{total} requests in {elapsed:.2f}s = {total / elapsed if elapsed else 0:.1f} req/s, "
+            f"{sum(self.lock_errors.values())} lock-wait error(s), {sum(self.errors.values())} other error(s)"
+        )
+        for step, message in self.first_errors.items():
+            self.stdout.write(f"  first {step} error: {message}")
+
+
+def expect_redirect(response, step):
+    if response.status_code != 302:
+        raise RuntimeError(f"{step} returned {response.status_code} instead of redirecting")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def ms(seconds):
+    return f'{seconds * 1000:.1f}ms'
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from grants.jobs import finished_jobs, purge_finished_jobs, reclaim_stale
+
+
+class Command(BaseCommand):
+    help = "Requeue jobs lost with their worker and delete old finished jobs with their export files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many finished jobs would be removed.")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(
+                f"{finished_jobs().count()} job(s) finished over {settings.BACKGROUND_JOB_RETENTION_DAYS} day(s) ago would be removed."
+            )
+            return
+        requeued, failed = reclaim_stale()
+        if requeued or failed:
+            self.stdout.write(f"Requeued {requeued} and failed {failed} stale running job(s).")
+        removed = purge_finished_jobs()
+        self.stdout.write(f"Removed {removed} finished job(s).")
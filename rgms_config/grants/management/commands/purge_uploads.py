@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from grants.uploads import purge_stale_uploads, session_ttl, stale_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete upload sessions older than UPLOAD_SESSION_TTL that were never attached, with their part files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many sessions would be removed.")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f"{stale_sessions().count()} upload session(s) older than {session_ttl()} would be removed.")
+            return
+        removed = purge_stale_uploads()
+        self.stdout.write(f"Removed {removed} stale upload session(s).")
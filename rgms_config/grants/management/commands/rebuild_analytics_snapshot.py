@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from grants import analytics
+
+
+class Command(BaseCommand):
+    help = "Rebuild the department analytics snapshot from the live tables, or check it for drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only compare the snapshot with live aggregates; exit non-zero on drift."
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = analytics.snapshot_drift()
+            if not drift:
+                self.stdout.write(self.style.SUCCESS("Snapshot matches live aggregates."))
+                return
+            for field, (snapshot_value, live_value) in drift.items():
+                self.stdout.write(f"{field}: snapshot={snapshot_value} live={live_value}")
+            raise CommandError(f"Snapshot drift detected in {len(drift)} field(s).")
+
+        snapshot = analytics.rebuild_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {snapshot}."))
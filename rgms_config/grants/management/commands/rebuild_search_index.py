@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from grants import search
+from grants.extraction import extract_proposal_text
+from grants.models import Proposal
+
+
+class Command(BaseCommand):
+    help = "Extract document text where needed and (re)index every proposal for search."
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        backend.uninstall()
+        backend.install()
+
+        count = 0
+        for proposal in Proposal.objects.select_related('researcher').iterator(chunk_size=500):
+            text = extract_proposal_text(proposal)
+            backend.index(proposal, text.content)
+            count += 1
+        self.stdout.write(f"Indexed {count} proposal(s).")
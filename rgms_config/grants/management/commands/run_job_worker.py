@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from grants import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (PDF exports, ...) in a local worker process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds between polls when idle.")
+
+    def handle(self, *args, **options):
+        while True:
+            ran = jobs.run_pending()
+            if ran:
+                self.stdout.write(f"Ran {ran} job(s).")
+            if options['once']:
+                return
+            if not ran:
+                time.sleep(options['interval'])
@@ -0,0 +1,189 @@
+"""
+Reviewer-proposal matching.
+
+Reviewers are described by their specialization and research interests,
+proposals by their title, the researcher's interests and the extracted
+document text. Both sides are turned into TF-IDF vectors (SciPy sparse
+matrices), so the whole similarity table is one sparse matrix product.
+Assignments are then made greedily from the best scores down, with a
+per-reviewer load cap and no reviewer from the researcher's own department.
+"""
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from django.db import transaction
+
+from users.departments import department_keys
+from users.models import Reviewer
+from .models import Proposal, ProposalStatus, ReviewerAssignment
+
+REVIEWERS_PER_PROPOSAL = 2
+# Proposal text beyond this adds little signal and a lot of vocabulary
+MAX_DOCUMENT_CHARS = 20_000
+# Candidate reviewers considered per proposal in the first greedy pass
+CANDIDATES_PER_PROPOSAL = 20
+
+_TOKEN_RE = re.compile(r'[a-z][a-z0-9]{2,}')
+STOP_WORDS = frozenset('''
+    and the for with from that this are was were will can has have had not but our their its into
+    using use based study research project proposal analysis new towards via also which these those
+'''.split())
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall((text or '').lower()) if t not in STOP_WORDS]
+
+
+def tfidf_matrices(*corpora):
+    """
+    Fit one vocabulary and IDF over all `corpora` (lists of texts) and return
+    a row-normalised CSR matrix per corpus, in the same order.
+    """
+    vocabulary = {}
+    counted = []
+    for corpus in corpora:
+        rows, cols, values = [], [], []
+        for row, text in enumerate(corpus):
+            for token, count in Counter(tokenize(text)).items():
+                rows.append(row)
+                cols.append(vocabulary.setdefault(token, len(vocabulary)))
+                values.append(1.0 + math.log(count))  # sublinear tf
+        counted.append((len(corpus), rows, cols, values))
+
+    shape_cols = max(len(vocabulary), 1)
+    matrices = [
+        sparse.csr_matrix((values, (rows, cols)), shape=(n_rows, shape_cols), dtype=np.float64)
+        for n_rows, rows, cols, values in counted
+    ]
+
+    stacked = sparse.vstack(matrices, format='csr')
+    n_docs = stacked.shape[0]
+    df = np.bincount(stacked.indices, minlength=shape_cols)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+    normalised = []
+    for matrix in matrices:
+        weighted = matrix @ sparse.diags(idf)
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        normalised.append(sparse.diags(1.0 / norms) @ weighted)
+    return [m.tocsr() for m in normalised]
+
+
+def similarity(proposal_texts, reviewer_texts):
+    """Cosine similarity, proposals x reviewers, as a dense array."""
+    proposals, reviewers = tfidf_matrices(proposal_texts, reviewer_texts)
+    return (proposals @ reviewers.T).toarray()
+
+
+def _conflicts(proposal_departments, reviewer_departments):
+    """
+    Boolean proposals x reviewers mask: True where the reviewer is in the
+    researcher's department. Researchers name their department, reviewers give
+    its code, so both are compared as department keys (users.departments).
+    """
+    p = np.array(department_keys(proposal_departments), dtype=object)
+    r = np.array(department_keys(reviewer_departments), dtype=object)
+    return (p[:, None] == r[None, :]) & (r[None, :] != '')
+
+
+def assign(scores, conflicts, needed, capacity):
+    """
+    Greedy load-balanced assignment. `needed[i]` reviewers for proposal i,
+    at most `capacity[j]` proposals for reviewer j, never where `conflicts`.
+    Returns a list of (proposal index, reviewer index, score).
+    """
+    scores = np.where(conflicts, -np.inf, scores)
+    needed = np.array(needed, dtype=int)
+    capacity = np.array(capacity, dtype=int)
+    taken = np.zeros(scores.shape, dtype=bool)
+    result = []
+
+    def take(pairs):
+        for i, j in pairs:
+            if needed[i] > 0 and capacity[j] > 0 and not taken[i, j] and np.isfinite(scores[i, j]):
+                taken[i, j] = True
+                needed[i] -= 1
+                capacity[j] -= 1
+                result.append((int(i), int(j), float(scores[i, j])))
+
+    n_proposals, n_reviewers = scores.shape
+    if not n_proposals or not n_reviewers:
+        return result
+
+    # Pass 1: each proposal's top candidates, best scores first across everything
+    k = min(CANDIDATES_PER_PROPOSAL, n_reviewers)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    rows = np.repeat(np.arange(n_proposals), k)
+    cols = top.ravel()
+    order = np.argsort(-scores[rows, cols], kind='stable')
+    take(zip(rows[order], cols[order]))
+
+    # Pass 2: proposals still short (their favourites were full) take whoever is left
+    for i in np.flatnonzero(needed > 0):
+        take((i, j) for j in np.argsort(-scores[i], kind='stable'))
+    return result
+
+
+def plan_assignments(per_proposal=REVIEWERS_PER_PROPOSAL, capacity=None):
+    """
+    Proposed new ReviewerAssignments (unsaved) for pending proposals that
+    don't yet have `per_proposal` reviewers. `capacity` caps each reviewer's
+    open assignments; by default the load is spread evenly.
+    """
+    proposals = list(
+        Proposal.objects.latest_versions().filter(status=ProposalStatus.PENDING)
+        .select_related('researcher', 'extracted_text').order_by('proposalID')
+    )
+    reviewers = list(Reviewer.objects.filter(is_active=True).order_by('pk'))
+    if not proposals or not reviewers:
+        return []
+
+    open_assignments = ReviewerAssignment.objects.filter(proposal__status=ProposalStatus.PENDING)
+    existing = Counter(open_assignments.values_list('proposal_id', flat=True))
+    load = Counter(open_assignments.values_list('reviewer_id', flat=True))
+    already = set(open_assignments.values_list('proposal_id', 'reviewer_id'))
+
+    needed = [max(per_proposal - existing[p.pk], 0) for p in proposals]
+    if capacity is None:
+        capacity = math.ceil((sum(needed) + sum(load.values())) / len(reviewers))
+    capacities = [max(capacity - load[r.pk], 0) for r in reviewers]
+
+    def proposal_text(p):
+        extracted = getattr(p, 'extracted_text', None)
+        body = extracted.content[:MAX_DOCUMENT_CHARS] if extracted else ''
+        return ' '.join([p.title, p.researcher.researchinterests, body])
+
+    scores = similarity(
+        [proposal_text(p) for p in proposals],
+        [f'{r.specialization} {r.researchinterests}' for r in reviewers],
+    )
+    conflicts = _conflicts([p.researcher.department for p in proposals], [r.deptID for r in reviewers])
+    # Pairs that already exist can't be proposed again
+    proposal_index = {p.pk: i for i, p in enumerate(proposals)}
+    reviewer_index = {r.pk: j for j, r in enumerate(reviewers)}
+    for proposal_id, reviewer_id in already:
+        if proposal_id in proposal_index and reviewer_id in reviewer_index:
+            conflicts[proposal_index[proposal_id], reviewer_index[reviewer_id]] = True
+
+    return [
+        ReviewerAssignment(proposal=proposals[i], reviewer=reviewers[j], score=round(score, 4))
+        for i, j, score in assign(scores, conflicts, needed, capacities)
+    ]
+
+
+def save_assignments(assignments, assigned_by=None):
+    """
+    Insert `assignments`, skipping pairs that already exist. Returns how many rows
+    were actually added (bulk_create with ignore_conflicts returns every object).
+    """
+    for assignment in assignments:
+        assignment.assigned_by = assigned_by
+    with transaction.atomic():
+        before = ReviewerAssignment.objects.count()
+        ReviewerAssignment.objects.bulk_create(assignments, ignore_conflicts=True)
+        return ReviewerAssignment.objects.count() - before
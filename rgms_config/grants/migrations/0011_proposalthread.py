@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-18 08:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_threads(apps, schema_editor):
+    """Group existing versions by (researcher, title) into threads."""
+    Proposal = apps.get_model('grants', 'Proposal')
+    ProposalThread = apps.get_model('grants', 'ProposalThread')
+
+    thread = None
+    for proposal in Proposal.objects.order_by('researcher_id', 'title', 'version', 'proposalID').iterator():
+        if thread is None or (thread.researcher_id, thread.title) != (proposal.researcher_id, proposal.title):
+            if thread is not None:
+                thread.save()
+            thread = ProposalThread.objects.create(researcher_id=proposal.researcher_id, title=proposal.title)
+        thread.revision_count += 1
+        thread.head_id = proposal.proposalID
+        proposal.thread_id = thread.id
+        proposal.revision = thread.revision_count
+        proposal.save(update_fields=['thread', 'revision'])
+    if thread is not None:
+        thread.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grants', '0010_alter_evaluation_id'),
+        ('users', '0008_alter_notification_id_alter_user_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposal',
+            name='revision',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='ProposalThread',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('revision_count', models.PositiveIntegerField(default=0)),
+                ('head', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='head_of', to='grants.proposal')),
+                ('researcher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proposal_threads', to='users.researcher')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='thread',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='grants.proposalthread'),
+        ),
+        migrations.AddConstraint(
+            model_name='proposal',
+            constraint=models.UniqueConstraint(fields=('thread', 'revision'), name='unique_revision_per_thread'),
+        ),
+        migrations.AddConstraint(
+            model_name='proposalthread',
+            constraint=models.UniqueConstraint(fields=('researcher', 'title'), name='unique_thread_per_researcher_title'),
+        ),
+        migrations.RunPython(build_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grants', '0011_proposalthread'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_proposals', models.IntegerField(default=0)),
+                ('approved', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+                ('on_track', models.IntegerField(default=0)),
+                ('needs_intervention', models.IntegerField(default=0)),
+                ('active_grants', models.IntegerField(default=0)),
+                ('total_allocated', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_expenditure', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-18 08:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from datetime import datetime, time, timezone
+
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    """Seed the ledger from existing grants (allocation to date) and report expenditures."""
+    Grant = apps.get_model('grants', 'Grant')
+    ProgressReport = apps.get_model('grants', 'ProgressReport')
+    LedgerEntry = apps.get_model('grants', 'LedgerEntry')
+
+    def at(day):
+        return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+    entries = [
+        LedgerEntry(grant=grant, kind='allocation', amount=grant.totalAllocatedAmount, created_at=at(grant.startDate))
+        for grant in Grant.objects.all()
+    ]
+    reports = ProgressReport.objects.filter(expenditure_amount__gt=0, proposal__grant__isnull=False).select_related('proposal__grant')
+    entries += [
+        LedgerEntry(grant=report.proposal.grant, kind='expenditure', amount=report.expenditure_amount,
+                    created_at=at(report.submissionDate), report=report)
+        for report in reports
+    ]
+    LedgerEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grants', '0013_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='budget',
+            name='expendituresDetails',
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('allocation', 'Initial allocation'), ('top_up', 'Top-up'), ('adjustment', 'Allocation adjustment'), ('expenditure', 'Expenditure')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('grant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='grants.grant')),
+                ('report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='grants.progressreport')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['grant', 'created_at'], name='ledger_grant_created_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
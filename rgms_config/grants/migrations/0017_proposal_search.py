@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-18 08:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Frozen copy of the index DDL in grants.search at the time of this migration
+SEARCH_INDEX_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS grants_proposal_search "
+        "USING fts5(title, interests, body, tokenize='porter unicode61')",
+    ],
+    'postgresql': [
+        'CREATE TABLE IF NOT EXISTS grants_proposal_search ('
+        '  proposal_id integer PRIMARY KEY REFERENCES grants_proposal ("proposalID") ON DELETE CASCADE,'
+        '  body text NOT NULL,'
+        '  document tsvector NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS grants_proposal_search_gin ON grants_proposal_search USING GIN (document)',
+    ],
+}
+
+
+def install_search_index(apps, schema_editor):
+    for statement in SEARCH_INDEX_DDL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def uninstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in SEARCH_INDEX_DDL:
+        schema_editor.execute('DROP TABLE IF EXISTS grants_proposal_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grants', '0016_documentblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProposalText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('content', models.TextField(blank=True)),
+                ('extracted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('proposal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='extracted_text', to='grants.proposal')),
+            ],
+        ),
+        # Existing proposals are indexed by `manage.py rebuild_search_index`
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
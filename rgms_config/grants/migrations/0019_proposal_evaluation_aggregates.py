@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-18 08:45
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+
+
+def backfill_aggregates(apps, schema_editor):
+    Proposal = apps.get_model('grants', 'Proposal')
+    Evaluation = apps.get_model('grants', 'Evaluation')
+
+    stats = Evaluation.objects.values('proposal_id').annotate(
+        n=Count('id'), total=Sum('score'), squares=Sum(F('score') * F('score')), low=Min('score'), high=Max('score')
+    )
+    proposals = []
+    for row in stats:
+        proposals.append(Proposal(
+            pk=row['proposal_id'], eval_count=row['n'], eval_score_sum=row['total'],
+            eval_score_sq_sum=row['squares'], eval_score_min=row['low'], eval_score_max=row['high'],
+        ))
+    Proposal.objects.bulk_update(
+        proposals, ['eval_count', 'eval_score_sum', 'eval_score_sq_sum', 'eval_score_min', 'eval_score_max'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grants', '0018_reviewerassignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposal',
+            name='eval_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='eval_score_max',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='eval_score_min',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='eval_score_sq_sum',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='eval_score_sum',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-18 08:53
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+
+
+def remove_duplicate_evaluations(apps, schema_editor):
+    """Keep each reviewer's latest evaluation of a proposal, then recompute that proposal's aggregates."""
+    Proposal = apps.get_model('grants', 'Proposal')
+    Evaluation = apps.get_model('grants', 'Evaluation')
+
+    duplicates = (
+        Evaluation.objects.values('proposal_id', 'reviewer_id')
+        .annotate(n=Count('id'), keep=Max('id'))
+        .filter(n__gt=1)
+    )
+    affected = set()
+    for row in duplicates:
+        Evaluation.objects.filter(proposal_id=row['proposal_id'], reviewer_id=row['reviewer_id']).exclude(pk=row['keep']).delete()
+        affected.add(row['proposal_id'])
+    if not affected:
+        return
+
+    stats = Evaluation.objects.filter(proposal_id__in=affected).values('proposal_id').annotate(
+        n=Count('id'), total=Sum('score'), squares=Sum(F('score') * F('score')), low=Min('score'), high=Max('score')
+    )
+    Proposal.objects.bulk_update(
+        [
+            Proposal(
+                pk=row['proposal_id'], eval_count=row['n'], eval_score_sum=row['total'],
+                eval_score_sq_sum=row['squares'], eval_score_min=row['low'], eval_score_max=row['high'],
+            )
+            for row in stats
+        ],
+        ['eval_count', 'eval_score_sum', 'eval_score_sq_sum', 'eval_score_min', 'eval_score_max'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grants', '0019_proposal_evaluation_aggregates'),
+        ('users', '0010_notification_retention'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_evaluations, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='progressreport',
+            index=models.Index(fields=['proposal', '-submissionDate'], name='report_proposal_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposal',
+            index=models.Index(fields=['status', '-submissionDate'], name='proposal_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposal',
+            index=models.Index(fields=['researcher', '-submissionDate'], name='proposal_researcher_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='evaluation',
+            constraint=models.UniqueConstraint(fields=('proposal', 'reviewer'), name='unique_evaluation_per_reviewer'),
+        ),
+    ]
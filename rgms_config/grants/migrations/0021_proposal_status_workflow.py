@@ -0,0 +1,108 @@
+# Generated by Django 6.0 on 2026-10-18 08:57
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+STATUS_CODES = {
+    'draft': 1, 'pending': 2, 'review complete': 3, 'approved': 4,
+    'rejected': 5, 'on track': 6, 'needs intervention': 7,
+}
+STATUS_LABELS = {
+    1: 'Draft', 2: 'Pending', 3: 'Review Complete', 4: 'Approved',
+    5: 'Rejected', 6: 'On Track', 7: 'Needs Intervention',
+}
+STATUS_CHOICES = list(STATUS_LABELS.items())
+
+
+def encode_statuses(apps, schema_editor):
+    Proposal = apps.get_model('grants', 'Proposal')
+    Grant = apps.get_model('grants', 'Grant')
+    funded = set(Grant.objects.values_list('proposal_id', flat=True))
+    for label in Proposal.objects.values_list('status', flat=True).distinct():
+        code = STATUS_CODES.get((label or '').strip().lower())
+        rows = Proposal.objects.filter(status=label)
+        if code is not None:
+            rows.update(status_code=code)
+        else:
+            # Free-form values could only come from the old monitoring form
+            rows.filter(pk__in=funded).update(status_code=6)
+            rows.exclude(pk__in=funded).update(status_code=2)
+
+
+def decode_statuses(apps, schema_editor):
+    Proposal = apps.get_model('grants', 'Proposal')
+    for code, label in STATUS_LABELS.items():
+        Proposal.objects.filter(status_code=code).update(status=label)
+
+
+def start_history(apps, schema_editor):
+    """One 'created' transition per proposal, at its submission date; history starts here."""
+    Proposal = apps.get_model('grants', 'Proposal')
+    ProposalTransition = apps.get_model('grants', 'ProposalTransition')
+    batch = []
+    for pk, status, submitted in Proposal.objects.values_list('pk', 'status', 'submissionDate').iterator():
+        changed_at = datetime.datetime.combine(submitted, datetime.time.min, tzinfo=datetime.timezone.utc)
+        batch.append(ProposalTransition(proposal_id=pk, to_status=status, changed_at=changed_at))
+        if len(batch) >= 1000:
+            ProposalTransition.objects.bulk_create(batch)
+            batch = []
+    ProposalTransition.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grants', '0020_workflow_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposal',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.RunPython(encode_statuses, decode_statuses),
+        migrations.RemoveIndex(
+            model_name='proposal',
+            name='proposal_status_date_idx',
+        ),
+        migrations.RemoveField(
+            model_name='proposal',
+            name='status',
+        ),
+        migrations.RenameField(
+            model_name='proposal',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.AlterField(
+            model_name='proposal',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=1),
+        ),
+        migrations.AddIndex(
+            model_name='proposal',
+            index=models.Index(fields=['status', '-submissionDate'], name='proposal_status_date_idx'),
+        ),
+        migrations.CreateModel(
+            name='ProposalTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.PositiveSmallIntegerField(blank=True, choices=STATUS_CHOICES, null=True)),
+                ('to_status', models.PositiveSmallIntegerField(choices=STATUS_CHOICES)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('seconds_in_previous', models.PositiveIntegerField(blank=True, null=True)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('proposal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='grants.proposal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['proposal', 'changed_at'], name='transition_proposal_idx'), models.Index(fields=['from_status', 'changed_at'], name='transition_from_status_idx')],
+            },
+        ),
+        migrations.RunPython(start_history, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,111 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
+from django.db.models import Case, Exists, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Floor, Greatest, Least, NullIf
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
 from users.models import Researcher, Reviewer, HOD, User
 from django.core.validators import FileExtensionValidator
+from .storage import get_document_storage
+
+class ProposalThreadManager(models.Manager):
+	def for_title(self, researcher, title):
+		"""The lineage for this researcher's proposal title, created on first submission."""
+		thread, _ = self.get_or_create(researcher=researcher, title=title)
+		return thread
+
+	def reset_heads(self, thread_ids):
+		"""
+		Point each thread that lost its head back at its highest remaining revision.
+		A thread left with no revisions starts over, so the next submission is v1.0 again.
+		"""
+		newest = Proposal.objects.filter(thread=OuterRef('pk')).order_by('-revision').values('pk')[:1]
+		self.filter(pk__in=thread_ids, head__isnull=True).update(head=Subquery(newest))
+		self.filter(pk__in=thread_ids, head__isnull=True).exclude(
+			Exists(Proposal.objects.filter(thread=OuterRef('pk')))
+		).update(revision_count=0)
+
+class ProposalThread(models.Model):
+	"""
+	Lineage of a proposal: every submitted version of one (researcher, title).
+	Keeps a pointer to the current head version and an integer revision counter
+	so creating a version or finding the latest one never scans the history.
+	"""
+	researcher = models.ForeignKey(Researcher, on_delete=models.CASCADE, related_name='proposal_threads')
+	title = models.CharField(max_length=255)
+	head = models.OneToOneField('Proposal', null=True, blank=True, on_delete=models.SET_NULL, related_name='head_of')
+	revision_count = models.PositiveIntegerField(default=0)
+
+	objects = ProposalThreadManager()
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['researcher', 'title'], name='unique_thread_per_researcher_title'),
+		]
+
+	def __str__(self):
+		return f"{self.title} ({self.revision_count} revisions)"
+
+	def add_revision(self, proposal):
+		"""Save `proposal` as the next version of this thread and make it the head."""
+		with transaction.atomic():
+			# Lock the thread row so concurrent submissions get distinct revisions
+			thread = ProposalThread.objects.select_for_update().get(pk=self.pk)
+			thread.revision_count += 1
+
+			proposal.thread = thread
+			proposal.researcher_id = thread.researcher_id
+			proposal.title = thread.title
+			proposal.revision = thread.revision_count
+			# Display version keeps the old 1.0, 1.1, 1.2 ... numbering
+			proposal.version = round(1.0 + (thread.revision_count - 1) * 0.1, 1)
+			proposal.save()
+
+			thread.head = proposal
+			thread.save(update_fields=['revision_count', 'head'])
+
+		self.revision_count = thread.revision_count
+		self.head = proposal
+		return proposal
+
+class ProposalStatus(models.IntegerChoices):
+	"""Workflow states, stored as small integers (allowed moves: grants.workflow.TRANSITIONS)."""
+	DRAFT = 1, 'Draft'
+	PENDING = 2, 'Pending'
+	REVIEW_COMPLETE = 3, 'Review Complete'
+	APPROVED = 4, 'Approved'
+	REJECTED = 5, 'Rejected'
+	ON_TRACK = 6, 'On Track'
+	NEEDS_INTERVENTION = 7, 'Needs Intervention'
+
+class ProposalQuerySet(models.QuerySet):
+	def latest_versions(self):
+		"""Only the head (newest) version of each proposal thread, found through the
+		thread's head pointer, plus proposals outside any thread, with the grant
+		joined for dashboard rows."""
+		return self.filter(Q(head_of__isnull=False) | Q(thread__isnull=True)).select_related('grant')
+
+	def review_queue(self, reviewer):
+		"""Submitted (non-draft) proposals with the researcher joined and
+		`evaluated_by_me` / `assigned_to_me` computed as EXISTS subqueries for this reviewer."""
+		evaluations = Evaluation.objects.filter(proposal=OuterRef('pk'), reviewer=reviewer)
+		assignments = ReviewerAssignment.objects.filter(proposal=OuterRef('pk'), reviewer=reviewer)
+		return self.exclude(status=ProposalStatus.DRAFT).select_related('researcher').annotate(
+			evaluated_by_me=Exists(evaluations),
+			assigned_to_me=Exists(assignments),
+		)
+
+	def with_evaluation_stats(self):
+		"""Annotate `eval_mean` and `eval_variance` from the stored evaluation sums
+		(NULL when there are no evaluations), so lists can sort by score in SQL."""
+		count = NullIf(Cast('eval_count', FloatField()), Value(0.0))
+		mean = ExpressionWrapper(F('eval_score_sum') / count, output_field=FloatField())
+		return self.annotate(
+			eval_mean=mean,
+			eval_variance=ExpressionWrapper(F('eval_score_sq_sum') / count - mean * mean, output_field=FloatField()),
+		)
 
 class Proposal(models.Model):
 	proposalID = models.AutoField(primary_key=True)
@@ -9,18 +114,123 @@ class Proposal(models.Model):
 	# --- UPDATED FIELD WITH VALIDATOR ---
 	pdf_file = models.FileField(
         upload_to='proposals/pdfs/', 
+        storage=get_document_storage,  # content-addressed: identical files are stored once
         null=True, 
         blank=True,
         validators=[FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx'])],
         help_text="Upload only PDF or Word documents (.doc, .docx)")
 	submissionDate = models.DateField(auto_now_add=True) 
-	status = models.CharField(max_length=50, default='Draft') 
+	status = models.PositiveSmallIntegerField(choices=ProposalStatus.choices, default=ProposalStatus.DRAFT)
 	version = models.FloatField(default=1.0) 
 	researcher = models.ForeignKey(Researcher, on_delete=models.CASCADE) 
+	thread = models.ForeignKey(ProposalThread, null=True, blank=True, on_delete=models.CASCADE, related_name='revisions')
+	revision = models.PositiveIntegerField(default=1)
+
+	# Running evaluation aggregates, maintained by add_evaluation(); mean and
+	# variance come from the sums (see ProposalQuerySet.with_evaluation_stats)
+	eval_count = models.PositiveIntegerField(default=0)
+	eval_score_sum = models.BigIntegerField(default=0)
+	eval_score_sq_sum = models.BigIntegerField(default=0)
+	eval_score_min = models.IntegerField(null=True, blank=True)
+	eval_score_max = models.IntegerField(null=True, blank=True)
+
+	objects = ProposalQuerySet.as_manager()
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['thread', 'revision'], name='unique_revision_per_thread'),
+		]
+		indexes = [
+			# HOD pending/rejected lists filter on status, newest first
+			models.Index(fields=['status', '-submissionDate'], name='proposal_status_date_idx'),
+			# Researcher dashboard: own proposals, newest first
+			models.Index(fields=['researcher', '-submissionDate'], name='proposal_researcher_date_idx'),
+		]
 
 	def __str__(self):
 		return f"{self.title} - {self.researcher.username}"
+
+	@property
+	def eval_score_mean(self):
+		if not self.eval_count:
+			return None
+		return self.eval_score_sum / self.eval_count
+
+	@property
+	def eval_score_variance(self):
+		if not self.eval_count:
+			return None
+		mean = self.eval_score_sum / self.eval_count
+		return self.eval_score_sq_sum / self.eval_count - mean * mean
+
+	def add_evaluation(self, evaluation):
+		"""Save `evaluation` for this proposal and fold its score into the aggregates."""
+		score = evaluation.score
+		with transaction.atomic():
+			evaluation.proposal = self
+			evaluation.save()
+			# Single UPDATE, so concurrent reviewers can't lose each other's scores
+			Proposal.objects.filter(pk=self.pk).update(
+				eval_count=F('eval_count') + 1,
+				eval_score_sum=F('eval_score_sum') + score,
+				eval_score_sq_sum=F('eval_score_sq_sum') + score * score,
+				eval_score_min=Case(When(eval_score_min__isnull=True, then=Value(score)), default=Least('eval_score_min', Value(score))),
+				eval_score_max=Case(When(eval_score_max__isnull=True, then=Value(score)), default=Greatest('eval_score_max', Value(score))),
+			)
+		self.refresh_from_db(fields=['eval_count', 'eval_score_sum', 'eval_score_sq_sum', 'eval_score_min', 'eval_score_max'])
+		return evaluation
      
+
+@receiver(post_delete, sender=Proposal)
+def _move_thread_head(sender, instance, **kwargs):
+	# The head FK is SET_NULL by the delete; fall back to the newest revision left
+	if instance.thread_id:
+		ProposalThread.objects.reset_heads([instance.thread_id])
+
+@receiver(pre_save, sender=Researcher)
+def _note_interests_change(sender, instance, update_fields=None, **kwargs):
+	# Research interests are copied into each proposal's search document
+	if instance.pk is None or (update_fields is not None and 'researchinterests' not in update_fields):
+		instance._interests_changed = False
+		return
+	previous = Researcher.objects.filter(pk=instance.pk).values_list('researchinterests', flat=True).first()
+	instance._interests_changed = previous is not None and previous != instance.researchinterests
+
+@receiver(post_save, sender=Researcher)
+def _reindex_researcher(sender, instance, created, **kwargs):
+	if getattr(instance, '_interests_changed', False) and instance.proposal_set.exists():
+		from . import jobs
+		jobs.enqueue('index_researcher', {'researcher_id': instance.pk})
+
+@receiver(post_delete, sender=Proposal)
+def _drop_search_row(sender, instance, using, **kwargs):
+	# The SQLite FTS table has no foreign key to cascade from
+	from django.db import connections
+	from . import search
+	try:
+		backend = search.get_backend(connections[using])
+	except NotImplementedError:
+		return
+	backend.remove(instance.pk)
+
+class GrantQuerySet(models.QuerySet):
+	def for_listing(self):
+		"""Grants joined with proposal, researcher and budget, with usage % computed in SQL."""
+		return self.select_related('proposal__researcher', 'budget').annotate(
+			usage_percent=Case(
+				When(
+					totalAllocatedAmount__gt=0,
+					budget__isnull=False,
+					then=Least(
+						Cast(Floor(F('budget__totalSpent') * 100 / F('totalAllocatedAmount')), models.IntegerField()),
+						Value(100),
+					),
+				),
+				default=Value(0),
+				output_field=models.IntegerField(),
+			)
+		)
+
 class Grant(models.Model):
 	grantID = models.AutoField(primary_key=True) 
 	totalAllocatedAmount = models.DecimalField(max_digits=12, decimal_places=2) 
@@ -28,10 +238,15 @@ class Grant(models.Model):
 	endDate = models.DateField() 
 	proposal = models.OneToOneField(Proposal, on_delete=models.CASCADE) 
 
+	objects = GrantQuerySet.as_manager()
+
 	def __str__(self):
-		return f"Grant: {self.proposal.title} ({self.proposal.status})"
+		return f"Grant: {self.proposal.title} ({self.proposal.get_status_display()})"
 	
 	def get_usage_percent(self):
+		# Listings annotate this in SQL (see GrantQuerySet.for_listing)
+		if hasattr(self, 'usage_percent'):
+			return self.usage_percent
 		if hasattr(self, 'budget') and self.totalAllocatedAmount > 0:
 			percent = (self.budget.totalSpent / self.totalAllocatedAmount) * 100
 			return min(int(percent), 100) # Cap at 100 for the bar width
@@ -39,8 +254,8 @@ class Grant(models.Model):
 
 class Budget(models.Model):
 	budgetID = models.AutoField(primary_key=True) 
+	# Running total of expenditure ledger entries, maintained by grants.accounting
 	totalSpent = models.DecimalField(max_digits=12, decimal_places=2, default=0.0) 
-	expendituresDetails = models.TextField(blank=True, default='') 
 	grant = models.OneToOneField(Grant, on_delete=models.CASCADE) 
 
 	def __str__(self):
@@ -56,6 +271,12 @@ class Evaluation(models.Model):
 	proposal = models.ForeignKey(Proposal, on_delete=models.CASCADE) 
 	reviewer = models.ForeignKey(Reviewer, on_delete=models.CASCADE) 
 
+	class Meta:
+		constraints = [
+			# One evaluation per reviewer per proposal; also the index for "evaluated by me" lookups
+			models.UniqueConstraint(fields=['proposal', 'reviewer'], name='unique_evaluation_per_reviewer'),
+		]
+
 	def __str__(self):
 		return f"Evaluation by {self.reviewer.username} for {self.proposal.title}"
 	
@@ -75,5 +296,201 @@ class ProgressReport(models.Model):
 		
 	proposal = models.ForeignKey(Proposal, on_delete=models.CASCADE) 
 
+	class Meta:
+		indexes = [
+			# A grant's reports, newest first
+			models.Index(fields=['proposal', '-submissionDate'], name='report_proposal_date_idx'),
+		]
+
 	def validateSubmission(self): 
-		return f"Report {self.proposal.title} submitted on {self.submissionDate}"
\ No newline at end of file
+		return f"Report {self.proposal.title} submitted on {self.submissionDate}"
+
+class AnalyticsSnapshot(models.Model):
+	"""
+	Precomputed department analytics (a single row), kept current by the
+	workflow views through grants.analytics so the analytics page and PDF
+	export read one row instead of aggregating the whole tables.
+	"""
+	total_proposals = models.IntegerField(default=0)
+	approved = models.IntegerField(default=0)
+	rejected = models.IntegerField(default=0)
+	on_track = models.IntegerField(default=0)
+	needs_intervention = models.IntegerField(default=0)
+	active_grants = models.IntegerField(default=0)
+	total_allocated = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+	total_expenditure = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"Analytics snapshot ({self.updated_at:%Y-%m-%d %H:%M})"
+
+class BackgroundJob(models.Model):
+	"""A unit of work (e.g. a PDF export) run outside the request by grants.jobs."""
+	QUEUED = 'queued'
+	RUNNING = 'running'
+	DONE = 'done'
+	FAILED = 'failed'
+	STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+	kind = models.CharField(max_length=50)
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+	payload = models.JSONField(default=dict, blank=True)
+	requested_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs')
+	result_file = models.FileField(upload_to='exports/', null=True, blank=True)
+	error = models.TextField(blank=True, default='')
+	created_at = models.DateTimeField(default=timezone.now)
+	started_at = models.DateTimeField(null=True, blank=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+	# Times the job was claimed; a worker that dies mid-job leaves it RUNNING until reclaimed
+	attempts = models.PositiveSmallIntegerField(default=0)
+
+	class Meta:
+		indexes = [models.Index(fields=['status', 'created_at'], name='job_status_created_idx')]
+
+	def __str__(self):
+		return f"{self.kind} job #{self.pk} ({self.status})"
+
+class LedgerEntryQuerySet(models.QuerySet):
+	def between(self, start=None, end=None):
+		"""Entries in [start, end); served by the (grant, created_at) index."""
+		qs = self
+		if start is not None:
+			qs = qs.filter(created_at__gte=start)
+		if end is not None:
+			qs = qs.filter(created_at__lt=end)
+		return qs
+
+	def totals(self):
+		"""Sum per entry kind in one query."""
+		sums = {
+			kind: Sum('amount', filter=Q(kind=kind), default=0)
+			for kind, _ in LedgerEntry.KIND_CHOICES
+		}
+		return self.aggregate(**sums)
+
+class LedgerEntry(models.Model):
+	"""
+	Append-only record of every money movement on a grant. Rows are never
+	updated or deleted; Budget.totalSpent is the running total of expenditures.
+	"""
+	ALLOCATION = 'allocation'
+	TOP_UP = 'top_up'
+	ADJUSTMENT = 'adjustment'
+	EXPENDITURE = 'expenditure'
+	KIND_CHOICES = [
+		(ALLOCATION, 'Initial allocation'),
+		(TOP_UP, 'Top-up'),
+		(ADJUSTMENT, 'Allocation adjustment'),
+		(EXPENDITURE, 'Expenditure'),
+	]
+
+	grant = models.ForeignKey(Grant, on_delete=models.CASCADE, related_name='ledger_entries')
+	kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+	amount = models.DecimalField(max_digits=12, decimal_places=2)
+	created_at = models.DateTimeField(default=timezone.now)
+	report = models.ForeignKey(ProgressReport, null=True, blank=True, on_delete=models.SET_NULL, related_name='ledger_entries')
+
+	objects = LedgerEntryQuerySet.as_manager()
+
+	class Meta:
+		indexes = [models.Index(fields=['grant', 'created_at'], name='ledger_grant_created_idx')]
+
+	def __str__(self):
+		return f"{self.get_kind_display()} of RM{self.amount} on grant #{self.grant_id}"
+
+	def save(self, *args, **kwargs):
+		if not self._state.adding:
+			raise ValueError("Ledger entries are append-only.")
+		super().save(*args, **kwargs)
+
+	def delete(self, *args, **kwargs):
+		raise ValueError("Ledger entries are append-only.")
+
+class UploadSession(models.Model):
+	"""
+	A resumable, chunked upload of a proposal document (see grants.uploads).
+	Chunks are appended to a part file; once every byte has arrived and the
+	checksum matches, the file can be attached to a new Proposal.
+	"""
+	OPEN = 'open'
+	COMPLETE = 'complete'
+	FAILED = 'failed'
+	STATUS_CHOICES = [(OPEN, 'Open'), (COMPLETE, 'Complete'), (FAILED, 'Failed')]
+
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	owner = models.ForeignKey(Researcher, on_delete=models.CASCADE, related_name='upload_sessions')
+	filename = models.CharField(max_length=255)
+	size = models.BigIntegerField()
+	sha256 = models.CharField(max_length=64)
+	received = models.BigIntegerField(default=0)
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+	created_at = models.DateTimeField(default=timezone.now)
+	completed_at = models.DateTimeField(null=True, blank=True)
+
+	def __str__(self):
+		return f"Upload {self.filename} ({self.received}/{self.size} bytes, {self.status})"
+
+class DocumentBlob(models.Model):
+	"""One stored file in the content-addressed document store (grants.storage)."""
+	name = models.CharField(max_length=255, unique=True)
+	sha256 = models.CharField(max_length=64)
+	size = models.BigIntegerField()
+	ref_count = models.PositiveIntegerField(default=0)
+	created_at = models.DateTimeField(default=timezone.now)
+	last_referenced_at = models.DateTimeField(default=timezone.now)
+
+	def __str__(self):
+		return f"{self.name} ({self.ref_count} refs)"
+
+class ProposalText(models.Model):
+	"""Text extracted from a proposal's document (grants.extraction), feeding search and matching."""
+	proposal = models.OneToOneField(Proposal, on_delete=models.CASCADE, related_name='extracted_text')
+	# Storage name the text came from; unchanged blob -> no re-extraction
+	source = models.CharField(max_length=255, blank=True, db_index=True)
+	content = models.TextField(blank=True)
+	extracted_at = models.DateTimeField(default=timezone.now)
+
+	def __str__(self):
+		return f"Text of proposal #{self.proposal_id} ({len(self.content)} chars)"
+
+class ReviewerAssignment(models.Model):
+	"""A reviewer picked for a proposal by the matching engine (grants.matching)."""
+	proposal = models.ForeignKey(Proposal, on_delete=models.CASCADE, related_name='assignments')
+	reviewer = models.ForeignKey(Reviewer, on_delete=models.CASCADE, related_name='assignments')
+	score = models.FloatField(default=0)  # interest similarity, 0..1
+	assigned_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+	created_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['proposal', 'reviewer'], name='unique_assignment_per_reviewer'),
+		]
+
+	def __str__(self):
+		return f"Reviewer {self.reviewer_id} on proposal #{self.proposal_id} ({self.score:.2f})"
+
+class ProposalTransition(models.Model):
+	"""
+	One workflow status change of a proposal (written by grants.workflow).
+	`from_status` is NULL for the row recording creation. `seconds_in_previous`
+	is how long the proposal sat in `from_status`, stored at write time so
+	time-in-state metrics are a plain aggregate over this table.
+	"""
+	proposal = models.ForeignKey(Proposal, on_delete=models.CASCADE, related_name='transitions')
+	from_status = models.PositiveSmallIntegerField(choices=ProposalStatus.choices, null=True, blank=True)
+	to_status = models.PositiveSmallIntegerField(choices=ProposalStatus.choices)
+	changed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+	changed_at = models.DateTimeField(default=timezone.now)
+	seconds_in_previous = models.PositiveIntegerField(null=True, blank=True)
+
+	class Meta:
+		indexes = [
+			# A proposal's history in order (and its latest transition)
+			models.Index(fields=['proposal', 'changed_at'], name='transition_proposal_idx'),
+			# Time-in-state aggregates per state
+			models.Index(fields=['from_status', 'changed_at'], name='transition_from_status_idx'),
+		]
+
+	def __str__(self):
+		previous = self.get_from_status_display() or 'created'
+		return f"Proposal #{self.proposal_id}: {previous} -> {self.get_to_status_display()}"
@@ -0,0 +1,38 @@
+from django.core import signing
+from django.db.models import Q
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=25):
+    """
+    Cursor (keyset) pagination: seeks past the last row of the previous page
+    instead of using OFFSET, so deep pages cost the same as the first one.
+
+    `ordering` is a tuple of field names (with optional '-' prefix); the last
+    field must be unique (e.g. the primary key) so the cursor is unambiguous.
+    Returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    fields = [f.lstrip('-') for f in ordering]
+    queryset = queryset.order_by(*ordering)
+
+    if cursor:
+        try:
+            values = signing.loads(cursor, salt='keyset')
+        except signing.BadSignature:
+            values = None
+        if values and len(values) == len(fields):
+            # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+            seek = Q()
+            for i, field in enumerate(ordering):
+                lookup = 'lt' if field.startswith('-') else 'gt'
+                equal = {fields[j]: values[j] for j in range(i)}
+                seek |= Q(**equal, **{f'{fields[i]}__{lookup}': values[i]})
+            queryset = queryset.filter(seek)
+
+    # Fetch one extra row to know whether there is a next page
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = signing.dumps([str(getattr(last, f)) for f in fields], salt='keyset')
+    return rows, next_cursor
@@ -0,0 +1,154 @@
+import os
+import threading
+from datetime import datetime
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.template.loader import get_template
+from xhtml2pdf import pisa
+
+from users.models import HOD
+from . import analytics
+
+FALLBACK_PDF_CSS = '''
+        @page { size: A4; margin: 2cm; }
+        .pdf-body { font-family: Arial, sans-serif; font-size: 12pt; color: #333; }
+        .pdf-header { text-align: center; margin-bottom: 30px; border-bottom: 3px solid #2563eb; padding-bottom: 15px; }
+        .pdf-header h1 { color: #2563eb; margin: 0; font-size: 24pt; }
+        .pdf-header p { color: #666; margin: 5px 0 0 0; font-size: 11pt; }
+        .pdf-report-date { text-align: right; color: #666; font-size: 10pt; margin-bottom: 20px; }
+        .pdf-section { margin-bottom: 25px; }
+        .pdf-section-title { font-size: 16pt; font-weight: bold; color: #2563eb; margin-bottom: 10px; padding-bottom: 5px; border-bottom: 2px solid #e5e7eb; }
+        .pdf-kpi-table { width: 100%; border-collapse: collapse; margin-bottom: 20px; }
+        .pdf-kpi-table th { background-color: #f3f4f6; padding: 12px; text-align: left; font-weight: bold; border: 1px solid #d1d5db; }
+        .pdf-kpi-table td { padding: 12px; border: 1px solid #d1d5db; }
+        .pdf-kpi-table tr:nth-child(even) { background-color: #f9fafb; }
+        .pdf-value-positive { color: #10b981; font-weight: bold; }
+        .pdf-value-negative { color: #ef4444; font-weight: bold; }
+        .pdf-value-primary { color: #2563eb; font-weight: bold; }
+        .pdf-stat-grid { display: table; width: 100%; margin-top: 15px; }
+        .pdf-stat-row { display: table-row; }
+        .pdf-stat-label { display: table-cell; padding: 8px; font-weight: bold; width: 60%; }
+        .pdf-stat-value { display: table-cell; padding: 8px; text-align: right; }
+        .pdf-footer { margin-top: 40px; padding-top: 15px; border-top: 1px solid #d1d5db; text-align: center; color: #666; font-size: 9pt; }
+        '''
+
+
+class PDFRenderError(Exception):
+    pass
+
+
+# Process-level caches, keyed on the source file's mtime so edits are picked up
+_pdf_css_cache = {'path': None, 'mtime': None, 'css': None}
+_pdf_template_cache = {'mtime': None, 'template': None}
+_cache_lock = threading.Lock()
+
+
+def _extract_pdf_css(full_css):
+    """Carve the PDF EXPORT STYLES section out of style.css."""
+    pdf_start = full_css.find('/* =========================================')
+    pdf_start = full_css.find('PDF EXPORT STYLES', pdf_start)
+    if pdf_start == -1:
+        return ''
+    # Start of the comment block, then everything from that point onward
+    section_start = full_css.rfind('/*', 0, pdf_start)
+    return full_css[section_start:]
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
+def load_pdf_css():
+    """ONLY the PDF-specific CSS from style.css; re-read only when the file changes."""
+    css_path = os.path.join(settings.BASE_DIR, 'static', 'css', 'style.css')
+    mtime = _mtime(css_path)
+    if mtime is None:
+        # Fallback CSS if file can't be read
+        return FALLBACK_PDF_CSS
+
+    with _cache_lock:
+        if _pdf_css_cache['path'] == css_path and _pdf_css_cache['mtime'] == mtime:
+            return _pdf_css_cache['css']
+
+    try:
+        with open(css_path, 'r', encoding='utf-8') as f:
+            css_content = _extract_pdf_css(f.read())
+    except Exception:
+        return FALLBACK_PDF_CSS
+
+    with _cache_lock:
+        _pdf_css_cache.update(path=css_path, mtime=mtime, css=css_content)
+    return css_content
+
+
+def get_pdf_template():
+    """The compiled export template, recompiled only when the template file changes."""
+    with _cache_lock:
+        template, mtime = _pdf_template_cache['template'], _pdf_template_cache['mtime']
+    if template is not None and _mtime(template.origin.name) == mtime:
+        return template
+
+    template = get_template('grants/hod_analytics_pdf.html')
+    with _cache_lock:
+        _pdf_template_cache.update(mtime=_mtime(template.origin.name), template=template)
+    return template
+
+
+def render_analytics_pdf(hod):
+    """Render the department analytics report for `hod` and return the PDF bytes."""
+    stats = analytics.snapshot_analytics()
+
+    # 1. Budget calculations
+    total_spent = stats['total_allocated']
+    remaining_funds = hod.total_department_budget
+
+    # Calculate total budget for display
+    total_budget = float(total_spent) + float(remaining_funds)
+
+    # Calculate budget utilization percentage
+    if total_budget > 0:
+        budget_utilization = (float(total_spent) / total_budget) * 100
+    else:
+        budget_utilization = 0
+
+    # 2. Success metrics
+    total_props = stats['total']
+    if total_props > 0:
+        approval_rate = round((stats['approved'] / total_props) * 100, 1)
+        rejection_rate = round(stats['rejected'] / total_props * 100, 1)
+    else:
+        approval_rate = 0
+        rejection_rate = 0
+
+    context = {
+        'total_spent': float(total_spent),
+        'remaining_funds': float(remaining_funds),
+        'total_budget': total_budget,
+        'budget_utilization': budget_utilization,
+        'active_grants_count': stats['active_grants'],
+        'approval_rate': approval_rate,
+        'rejection_rate': rejection_rate,
+        'current_date': datetime.now().strftime('%B %d, %Y at %I:%M %p'),
+        'css_content': load_pdf_css()  # Pass only PDF CSS to template
+    }
+
+    html = get_pdf_template().render(context)
+
+    output = BytesIO()
+    pisa_status = pisa.CreatePDF(html, dest=output)
+    if pisa_status.err:
+        raise PDFRenderError('Error generating PDF')
+    return output.getvalue()
+
+
+def analytics_pdf_job(job):
+    """Background job handler: render the analytics PDF and attach it to the job."""
+    hod = HOD.objects.get(pk=job.payload['hod_id'])
+    pdf = render_analytics_pdf(hod)
+    filename = f"Department_Analytics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    job.result_file.save(filename, ContentFile(pdf), save=False)
@@ -0,0 +1,233 @@
+"""
+Full-text search over proposals (title, the researcher's interests and the
+extracted document text).
+
+The index lives beside the ORM tables and is written by the 'index_proposal'
+background job, and by 'index_researcher' when a researcher's interests change. get_backend() picks the implementation for the database in
+use; both expose the same install / index / remove / search API:
+
+- SQLite: an FTS5 virtual table ranked with bm25().
+- PostgreSQL: a table with a weighted tsvector column and a GIN index,
+  ranked with ts_rank().
+
+Other databases raise NotImplementedError from get_backend(); callers fall back
+to SubstringSearchBackend, an unranked icontains match on the live tables.
+"""
+import re
+from abc import ABC, abstractmethod
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Proposal
+
+INDEX_TABLE = 'grants_proposal_search'
+
+# Relative weight of each indexed column in the ranking
+TITLE_WEIGHT, INTERESTS_WEIGHT, BODY_WEIGHT = 10.0, 4.0, 1.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchHit:
+    def __init__(self, proposal_id, rank, snippet):
+        self.proposal_id = proposal_id
+        self.rank = rank
+        self.snippet = snippet
+
+
+class SearchBackend(ABC):
+    def __init__(self, connection):
+        self.connection = connection
+
+    @abstractmethod
+    def install(self):
+        pass
+
+    def uninstall(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+    @abstractmethod
+    def index(self, proposal, body):
+        pass
+
+    @abstractmethod
+    def remove(self, proposal_id):
+        pass
+
+    @abstractmethod
+    def search(self, query, limit, offset=0, exclude_statuses=()):
+        """Ranked SearchHits for `query`, best first; proposals in `exclude_statuses` are skipped."""
+
+    @abstractmethod
+    def count(self, query, exclude_statuses=()):
+        pass
+
+    def _status_filter(self, exclude_statuses):
+        if not exclude_statuses:
+            return '', []
+        placeholders = ', '.join(['%s'] * len(exclude_statuses))
+        return f' AND p.status NOT IN ({placeholders})', list(exclude_statuses)
+
+
+class SQLiteSearchBackend(SearchBackend):
+    def install(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} "
+                f"USING fts5(title, interests, body, tokenize='porter unicode61')"
+            )
+
+    def index(self, proposal, body):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [proposal.pk])
+            cursor.execute(
+                f'INSERT INTO {INDEX_TABLE} (rowid, title, interests, body) VALUES (%s, %s, %s, %s)',
+                [proposal.pk, proposal.title, proposal.researcher.researchinterests, body],
+            )
+
+    def remove(self, proposal_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [proposal_id])
+
+    def _match(self, query):
+        # Quote every token so user input can't be parsed as FTS syntax; last one is a prefix
+        tokens = _TOKEN_RE.findall(query)
+        if not tokens:
+            return None
+        quoted = [f'"{t}"' for t in tokens]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, query, limit, offset=0, exclude_statuses=()):
+        match = self._match(query)
+        if match is None:
+            return []
+        status_sql, status_params = self._status_filter(exclude_statuses)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT s.rowid, bm25({INDEX_TABLE}, %s, %s, %s) AS rank, "
+                f"snippet({INDEX_TABLE}, 2, '[', ']', '…', 16) "
+                f"FROM {INDEX_TABLE} s JOIN grants_proposal p ON p.proposalID = s.rowid "
+                f"WHERE {INDEX_TABLE} MATCH %s{status_sql} "
+                f"ORDER BY rank, s.rowid DESC LIMIT %s OFFSET %s",
+                [TITLE_WEIGHT, INTERESTS_WEIGHT, BODY_WEIGHT, match, *status_params, limit, offset],
+            )
+            # bm25() is lower-is-better; flip it so callers see higher-is-better
+            return [SearchHit(pk, -rank, snippet) for pk, rank, snippet in cursor.fetchall()]
+
+    def count(self, query, exclude_statuses=()):
+        match = self._match(query)
+        if match is None:
+            return 0
+        status_sql, status_params = self._status_filter(exclude_statuses)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {INDEX_TABLE} s JOIN grants_proposal p ON p.proposalID = s.rowid "
+                f"WHERE {INDEX_TABLE} MATCH %s{status_sql}",
+                [match, *status_params],
+            )
+            return cursor.fetchone()[0]
+
+
+class PostgresSearchBackend(SearchBackend):
+    def install(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ('
+                f'  proposal_id integer PRIMARY KEY REFERENCES grants_proposal ("proposalID") ON DELETE CASCADE,'
+                f'  body text NOT NULL,'
+                f'  document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_gin ON {INDEX_TABLE} USING GIN (document)')
+
+    def index(self, proposal, body):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {INDEX_TABLE} (proposal_id, body, document) VALUES (%s, %s, "
+                f"setweight(to_tsvector('english', %s), 'A') || "
+                f"setweight(to_tsvector('english', %s), 'B') || "
+                f"setweight(to_tsvector('english', %s), 'D')) "
+                f"ON CONFLICT (proposal_id) DO UPDATE SET body = EXCLUDED.body, document = EXCLUDED.document",
+                [proposal.pk, body, proposal.title, proposal.researcher.researchinterests, body],
+            )
+
+    def remove(self, proposal_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE proposal_id = %s', [proposal_id])
+
+    def _weights(self):
+        # ts_rank weights are ordered {D, C, B, A}
+        top = TITLE_WEIGHT
+        return f'{{{BODY_WEIGHT / top}, 0, {INTERESTS_WEIGHT / top}, 1}}'
+
+    def search(self, query, limit, offset=0, exclude_statuses=()):
+        status_sql, status_params = self._status_filter(exclude_statuses)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT s.proposal_id, ts_rank(%s::float4[], s.document, q) AS rank, "
+                f"ts_headline('english', s.body, q, 'StartSel=[, StopSel=], MaxWords=16, MinWords=8') "
+                f"FROM {INDEX_TABLE} s JOIN grants_proposal p ON p.\"proposalID\" = s.proposal_id, "
+                f"websearch_to_tsquery('english', %s) q "
+                f"WHERE s.document @@ q{status_sql} "
+                f"ORDER BY rank DESC, s.proposal_id DESC LIMIT %s OFFSET %s",
+                [self._weights(), query, *status_params, limit, offset],
+            )
+            return [SearchHit(pk, rank, snippet) for pk, rank, snippet in cursor.fetchall()]
+
+    def count(self, query, exclude_statuses=()):
+        status_sql, status_params = self._status_filter(exclude_statuses)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {INDEX_TABLE} s JOIN grants_proposal p ON p.\"proposalID\" = s.proposal_id "
+                f"WHERE s.document @@ websearch_to_tsquery('english', %s){status_sql}",
+                [query, *status_params],
+            )
+            return cursor.fetchone()[0]
+
+
+class SubstringSearchBackend(SearchBackend):
+    """Unranked fallback: case-insensitive substring match, newest first; there is no index to keep."""
+
+    def install(self):
+        pass
+
+    def uninstall(self):
+        pass
+
+    def index(self, proposal, body):
+        pass
+
+    def remove(self, proposal_id):
+        pass
+
+    def _matches(self, query, exclude_statuses):
+        query = query.strip()
+        if not query:
+            return Proposal.objects.none()
+        return Proposal.objects.using(self.connection.alias).filter(
+            Q(title__icontains=query) | Q(researcher__researchinterests__icontains=query)
+            | Q(extracted_text__content__icontains=query)
+        ).exclude(status__in=exclude_statuses)
+
+    def search(self, query, limit, offset=0, exclude_statuses=()):
+        ids = self._matches(query, exclude_statuses).order_by('-proposalID').values_list('pk', flat=True)
+        return [SearchHit(pk, 0.0, '') for pk in ids[offset:offset + limit]]
+
+    def count(self, query, exclude_statuses=()):
+        return self._matches(query, exclude_statuses).count()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(using=None):
+    conn = using or connection
+    try:
+        return BACKENDS[conn.vendor](conn)
+    except KeyError:
+        raise NotImplementedError(f"Full-text search isn't available on {conn.vendor}.")
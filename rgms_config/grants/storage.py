@@ -0,0 +1,157 @@
+"""
+Content-addressed storage for proposal documents.
+
+Files are stored once per unique content under blobs/ab/cd/<sha256><ext>, so
+re-uploading an identical document for a new version just points the new
+Proposal at the existing blob. DocumentBlob keeps a reference count per blob:
+save() adds a reference, delete() drops one and removes the file at zero.
+Django never deletes files when rows are deleted, so `manage.py gc_documents`
+recounts references from the Proposal table and removes unreferenced blobs.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+BLOB_DIR = 'blobs'
+
+
+def blob_name(sha256, extension):
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save(), never from `name`
+        return name
+
+    def _save(self, name, content):
+        from .models import DocumentBlob
+
+        extension = os.path.splitext(name)[1].lower()
+        digest = hashlib.sha256()
+        tmp_dir = self.path(os.path.join(BLOB_DIR, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (large upload / finished chunked upload): hash it, then move it
+            tmp_path = content.temporary_file_path()
+            with open(tmp_path, 'rb') as f:
+                for block in iter(lambda: f.read(64 * 1024), b''):
+                    digest.update(block)
+            owned_tmp = False
+        else:
+            fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            owned_tmp = True
+
+        sha256 = digest.hexdigest()
+        name = blob_name(sha256, extension)
+        full_path = self.path(name)
+        # Reference and file change together, so a concurrent delete() of the
+        # same blob can't remove the file under a fresh reference
+        with transaction.atomic():
+            blob, created = DocumentBlob.objects.select_for_update().get_or_create(
+                name=name, defaults={'sha256': sha256, 'size': 0, 'ref_count': 1}
+            )
+            if not created:
+                DocumentBlob.objects.filter(pk=blob.pk).update(
+                    ref_count=F('ref_count') + 1, last_referenced_at=timezone.now()
+                )
+            if os.path.exists(full_path):
+                # Identical content already stored
+                if owned_tmp:
+                    os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                file_move_safe(tmp_path, full_path, allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+            if created:
+                DocumentBlob.objects.filter(pk=blob.pk).update(size=os.path.getsize(full_path))
+        return name
+
+    def delete(self, name):
+        """Drop one reference to `name`; the file goes when nothing refers to it."""
+        from .models import DocumentBlob
+
+        with transaction.atomic():
+            blob = DocumentBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.ref_count > 1:
+                DocumentBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            # Last reference (or a file stored before blobs existed)
+            super().delete(name)
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    return document_storage
+
+
+def import_legacy_documents():
+    """Move documents saved before blobs existed into the blob store. Returns how many were moved."""
+    from django.core.files import File
+    from .models import Proposal
+
+    moved = 0
+    legacy = Proposal.objects.exclude(pdf_file='').exclude(pdf_file__startswith=f'{BLOB_DIR}/').exclude(pdf_file__isnull=True)
+    for old_name in legacy.values_list('pdf_file', flat=True).distinct():
+        if not document_storage.exists(old_name):
+            continue
+        with document_storage.open(old_name, 'rb') as f:
+            new_name = document_storage.save(old_name, File(f))
+        # save() took one reference; the recount in collect_garbage() fixes the total
+        Proposal.objects.filter(pdf_file=old_name).update(pdf_file=new_name)
+        FileSystemStorage.delete(document_storage, old_name)
+        moved += 1
+    return moved
+
+
+def recount_references():
+    """Reset every DocumentBlob.ref_count from the Proposal rows that point at it."""
+    from django.db.models import Count, OuterRef, Subquery, Value
+    from django.db.models.functions import Coalesce
+    from .models import DocumentBlob, Proposal
+
+    references = Proposal.objects.filter(pdf_file=OuterRef('name')).order_by().values('pdf_file').annotate(n=Count('pk')).values('n')
+    DocumentBlob.objects.update(ref_count=Coalesce(Subquery(references), Value(0)))
+
+
+def collect_garbage(grace, dry_run=False):
+    """
+    Delete blobs nothing refers to that haven't been referenced for `grace`
+    (a timedelta; protects uploads whose Proposal row isn't committed yet),
+    plus abandoned temp files. Returns (blobs removed, bytes freed).
+    """
+    from .models import DocumentBlob
+
+    recount_references()
+    cutoff = timezone.now() - grace
+    removed, freed = 0, 0
+    for blob in DocumentBlob.objects.filter(ref_count=0, last_referenced_at__lt=cutoff):
+        removed += 1
+        freed += blob.size
+        if not dry_run:
+            with transaction.atomic():
+                if DocumentBlob.objects.filter(pk=blob.pk, ref_count=0).delete()[0]:
+                    FileSystemStorage.delete(document_storage, blob.name)
+
+    tmp_dir = document_storage.path(os.path.join(BLOB_DIR, 'tmp'))
+    if not dry_run and os.path.isdir(tmp_dir):
+        for entry in os.scandir(tmp_dir):
+            if entry.stat().st_mtime < cutoff.timestamp():
+                os.remove(entry.path)
+    return removed, freed
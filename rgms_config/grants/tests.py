@@ -1,3 +1,1383 @@
-from django.test import TestCase
+import hashlib
+import os
+import zipfile
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import HOD, Researcher, Reviewer
+from .models import ProposalThread, Proposal, ProposalStatus, ProposalTransition, Grant, Budget, Evaluation, ProgressReport, BackgroundJob, LedgerEntry, UploadSession, DocumentBlob, ProposalText, ReviewerAssignment
+from . import accounting, analytics, documents, extraction, jobs, matching, reports, search, storage, uploads, workflow
+from .analytics import department_analytics
+from .views import SEARCH_PAGE_SIZE
+
+
+def make_researcher(username, department='Computing'):
+    return Researcher.objects.create_user(
+        username=username, role='Researcher',
+        department=department, researchinterests='AI'
+    )
+
+
+def make_hod(username='hod'):
+    return HOD.objects.create_user(username=username, role='HOD', deptID='CS')
+
+
+def make_reviewer(username='reviewer'):
+    return Reviewer.objects.create_user(username=username, role='Reviewer', specialization='AI', researchinterests='AI')
+
+
+def make_proposal(researcher, title, **fields):
+    thread = ProposalThread.objects.for_title(researcher, title)
+    return thread.add_revision(Proposal(**fields))
+
+
+def make_grant(researcher, title, allocated='1000.00', spent='0.00', status=ProposalStatus.APPROVED):
+    proposal = make_proposal(researcher, title, status=status)
+    grant = Grant.objects.create(
+        proposal=proposal, totalAllocatedAmount=Decimal(allocated),
+        startDate=date(2026, 1, 1), endDate=date(2026, 12, 31)
+    )
+    Budget.objects.create(grant=grant, totalSpent=Decimal(spent))
+    return grant
+
+
+class GrantListingTests(TestCase):
+    def setUp(self):
+        self.hod = make_hod()
+        self.researcher = make_researcher('alice')
+
+    def test_usage_percent_is_annotated_in_sql(self):
+        make_grant(self.researcher, 'Half', allocated='1000.00', spent='505.50')
+        make_grant(self.researcher, 'Over', allocated='100.00', spent='250.00')
+        make_grant(self.researcher, 'Empty', allocated='0.00', spent='10.00')
+
+        listing = {g.proposal.title: g for g in Grant.objects.for_listing()}
+
+        self.assertEqual(listing['Half'].usage_percent, 50)
+        self.assertEqual(listing['Over'].usage_percent, 100)
+        self.assertEqual(listing['Empty'].usage_percent, 0)
+        for grant in listing.values():
+            self.assertEqual(grant.get_usage_percent(), Grant.objects.get(pk=grant.pk).get_usage_percent())
+
+    def test_hod_dashboard_query_count_is_constant(self):
+        self.client.force_login(self.hod)
+        make_grant(self.researcher, 'First')
+
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(reverse('hod_dashboard'))
+
+        for i in range(10):
+            make_grant(make_researcher(f'user{i}'), f'Project {i}', spent=str(i * 50))
+
+        with self.assertNumQueries(len(baseline.captured_queries)):
+            response = self.client.get(reverse('hod_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['active_grants']), 11)
+
+
+class ReviewerQueueTests(TestCase):
+    def setUp(self):
+        self.reviewer = make_reviewer()
+        self.client.force_login(self.reviewer)
+        self.alice = make_researcher('alice', department='Computing')
+        self.bob = make_researcher('bob', department='Physics')
+
+    def get_queue(self, **params):
+        return self.client.get(reverse('reviewer_dashboard'), params)
+
+    def test_drafts_are_excluded_and_filters_apply(self):
+        Proposal.objects.create(researcher=self.alice, title='Draft', status=ProposalStatus.DRAFT)
+        pending = Proposal.objects.create(researcher=self.alice, title='A', status=ProposalStatus.PENDING)
+        physics = Proposal.objects.create(researcher=self.bob, title='B', status=ProposalStatus.PENDING)
+        Evaluation.objects.create(proposal=pending, reviewer=self.reviewer, score=80, feedbackComments='ok')
+
+        titles = lambda r: {p.title for p in r.context['proposals']}
+        self.assertEqual(titles(self.get_queue()), {'A', 'B'})
+        self.assertEqual(titles(self.get_queue(department='Physics')), {'B'})
+        self.assertEqual(titles(self.get_queue(unevaluated='1')), {'B'})
+
+        flags = {p.pk: p.evaluated_by_me for p in self.get_queue().context['proposals']}
+        self.assertEqual(flags, {pending.pk: True, physics.pk: False})
+
+    def test_keyset_pages_cover_queue_without_duplicates(self):
+        Proposal.objects.bulk_create([
+            Proposal(researcher=self.alice, title=f'P{i:03d}', status=ProposalStatus.PENDING) for i in range(60)
+        ])
+
+        for sort in ('newest', 'oldest', 'title'):
+            seen = []
+            response = self.get_queue(sort=sort)
+            while True:
+                seen.extend(p.proposalID for p in response.context['proposals'])
+                if not response.context['next_query']:
+                    break
+                response = self.client.get(reverse('reviewer_dashboard') + '?' + response.context['next_query'])
+            self.assertEqual(len(seen), 60)
+            self.assertEqual(len(set(seen)), 60)
+
+    def test_queue_query_count_is_constant(self):
+        Proposal.objects.create(researcher=self.alice, title='First', status=ProposalStatus.PENDING)
+        with CaptureQueriesContext(connection) as baseline:
+            self.get_queue()
+
+        for i in range(10):
+            Proposal.objects.create(researcher=make_researcher(f'user{i}'), title=f'P{i}', status=ProposalStatus.PENDING)
+
+        with self.assertNumQueries(len(baseline.captured_queries)):
+            self.get_queue()
+
+
+class LatestProposalVersionTests(TestCase):
+    def setUp(self):
+        self.alice = make_researcher('alice')
+        self.client.force_login(self.alice)
+
+    def seed_versions(self, titles, versions_per_title):
+        threads = ProposalThread.objects.bulk_create([
+            ProposalThread(researcher=self.alice, title=title, revision_count=versions_per_title) for title in titles
+        ])
+        Proposal.objects.bulk_create([
+            Proposal(researcher=self.alice, title=thread.title, thread=thread, revision=r,
+                     version=round(1.0 + (r - 1) * 0.1, 1), status=ProposalStatus.PENDING)
+            for thread in threads
+            for r in range(1, versions_per_title + 1)
+        ])
+        for thread in threads:
+            thread.head = Proposal.objects.get(thread=thread, revision=versions_per_title)
+        ProposalThread.objects.bulk_update(threads, ['head'])
+
+    def test_only_latest_version_of_each_title_is_listed(self):
+        self.seed_versions(['Alpha', 'Beta'], 3)
+        make_grant(self.alice, 'Funded')
+        make_researcher('bob')  # other researchers' proposals never leak in
+
+        response = self.client.get(reverse('researcher_dashboard'))
+        latest = {p.title: p.version for p in response.context['proposals']}
+
+        self.assertEqual(latest, {'Alpha': 1.2, 'Beta': 1.2, 'Funded': 1.0})
+
+    def test_dashboard_query_count_is_independent_of_history_length(self):
+        self.seed_versions(['Alpha'], 2)
+        self.client.get(reverse('researcher_dashboard'))  # warm the notification cache
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(reverse('researcher_dashboard'))
+
+        # Thousands of revisions across many titles
+        self.seed_versions([f'Project {i}' for i in range(50)], 60)
+        for i in range(5):
+            make_grant(self.alice, f'Funded {i}')
+
+        with self.assertNumQueries(len(baseline.captured_queries)):
+            response = self.client.get(reverse('researcher_dashboard'))
+        self.assertEqual(len(response.context['proposals']), 56)
+
+
+class ProposalThreadTests(TestCase):
+    def setUp(self):
+        self.alice = make_researcher('alice')
+        self.client.force_login(self.alice)
+
+    def test_submit_and_resubmit_extend_the_thread(self):
+        self.client.post(reverse('submit_proposal'), {'title': 'Alpha', 'requested_amount': '100'})
+        first = Proposal.objects.get()
+        self.client.post(reverse('resubmit_proposal', args=[first.pk]), {'title': 'Edited title', 'requested_amount': '200'})
+        self.client.post(reverse('submit_proposal'), {'title': 'Alpha', 'requested_amount': '300'})
+
+        thread = ProposalThread.objects.get()
+        history = list(thread.revisions.order_by('revision').values_list('revision', 'version', 'title'))
+        self.assertEqual(history, [(1, 1.0, 'Alpha'), (2, 1.1, 'Alpha'), (3, 1.2, 'Alpha')])
+        self.assertEqual(thread.revision_count, 3)
+        self.assertEqual(thread.head.revision, 3)
+
+    def test_deleting_the_head_moves_it_to_the_newest_remaining_revision(self):
+        first = make_proposal(self.alice, 'Alpha', status=ProposalStatus.PENDING)
+        second = make_proposal(self.alice, 'Alpha', status=ProposalStatus.PENDING)
+        third = make_proposal(self.alice, 'Alpha', status=ProposalStatus.PENDING)
+        thread = third.thread
+
+        third.delete()
+        thread.refresh_from_db()
+        self.assertEqual(thread.head, second)
+        self.assertEqual(list(Proposal.objects.latest_versions()), [second])
+
+        first.delete()  # not the head: the pointer stays put
+        thread.refresh_from_db()
+        self.assertEqual(thread.head, second)
+
+        second.delete()
+        thread.refresh_from_db()
+        self.assertIsNone(thread.head)
+
+    def test_deleting_every_revision_starts_the_title_over(self):
+        make_proposal(self.alice, 'Alpha', status=ProposalStatus.PENDING)
+        make_proposal(self.alice, 'Alpha', status=ProposalStatus.PENDING)
+        Proposal.objects.filter(title='Alpha').delete()
+
+        response = self.client.post(reverse('submit_proposal'), {'title': 'Alpha', 'requested_amount': '100'}, follow=True)
+        proposal = Proposal.objects.get()
+        self.assertEqual((proposal.revision, proposal.version), (1, 1.0))
+        self.assertNotContains(response, 'New version')
+
+    def test_proposals_without_a_thread_are_latest_versions(self):
+        loose = Proposal.objects.create(researcher=self.alice, title='Legacy', status=ProposalStatus.PENDING)
+        threaded = make_proposal(self.alice, 'Alpha', status=ProposalStatus.PENDING)
+        make_proposal(self.alice, 'Alpha', status=ProposalStatus.PENDING)
+        threaded.refresh_from_db()
+
+        latest = Proposal.objects.latest_versions()
+        self.assertIn(loose, latest)
+        self.assertNotIn(threaded, latest)
+        self.assertEqual(latest.count(), 2)
+
+    def test_cannot_resubmit_another_researchers_proposal(self):
+        other = make_proposal(make_researcher('bob'), 'Theirs', status=ProposalStatus.PENDING)
+        response = self.client.post(reverse('resubmit_proposal', args=[other.pk]), {'title': 'Theirs', 'requested_amount': '1'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Proposal.objects.count(), 1)
+
+
+class DepartmentAnalyticsTests(TestCase):
+    def setUp(self):
+        self.alice = make_researcher('alice')
+
+    def test_counts_and_totals_in_two_queries(self):
+        for status in [ProposalStatus.APPROVED, ProposalStatus.APPROVED, ProposalStatus.REJECTED, ProposalStatus.ON_TRACK,
+                       ProposalStatus.NEEDS_INTERVENTION, ProposalStatus.PENDING, ProposalStatus.DRAFT]:
+            make_proposal(self.alice, f'{status} {Proposal.objects.count()}', status=status)
+        make_grant(self.alice, 'Funded A', allocated='1500.00')
+        make_grant(self.alice, 'Funded B', allocated='500.50')
+
+        with self.assertNumQueries(2):
+            stats = department_analytics()
+
+        self.assertEqual(stats['total'], 9)
+        self.assertEqual(stats['approved'], 4)
+        self.assertEqual(stats['rejected'], 1)
+        self.assertEqual(stats['on_track'], 1)
+        self.assertEqual(stats['needs_intervention'], 1)
+        self.assertEqual(stats['active_grants'], 2)
+        self.assertEqual(stats['total_allocated'], Decimal('2000.50'))
+
+    def test_empty_tables(self):
+        stats = department_analytics()
+        self.assertEqual(stats['total'], 0)
+        self.assertEqual(stats['total_allocated'], 0)
+
+    def test_analytics_page_renders(self):
+        self.client.force_login(make_hod())
+        make_grant(self.alice, 'Funded')
+        response = self.client.get(reverse('hod_analytics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['active_grants_count'], 1)
+        self.assertEqual(response.context['approval_rate'], 100.0)
+
+
+class AnalyticsSnapshotTests(TestCase):
+    def setUp(self):
+        self.alice = make_researcher('alice')
+        self.reviewer = make_reviewer()
+        self.hod = make_hod()
+        analytics.rebuild_snapshot()
+
+    def assertInSync(self):
+        self.assertEqual(analytics.snapshot_drift(), {})
+
+    def test_workflow_keeps_snapshot_in_sync(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, BACKGROUND_JOBS_IN_PROCESS=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client.force_login(self.alice)
+        self.client.post(reverse('submit_proposal'), {'title': 'Draft', 'requested_amount': '100'})
+        for title in ('Alpha', 'Beta'):
+            self.client.post(reverse('submit_proposal'), {
+                'title': title, 'requested_amount': '100',
+                'pdf_file': SimpleUploadedFile(f'{title}.pdf', b'%PDF-1.4 ' + title.encode()),
+            })
+        draft, alpha, beta = Proposal.objects.order_by('pk')
+        self.assertEqual(alpha.status, ProposalStatus.PENDING)
+        self.assertInSync()
+
+        self.client.force_login(self.reviewer)
+        for proposal in (alpha, beta):
+            self.client.post(reverse('evaluate_proposal', args=[proposal.pk]), {'score': 80, 'feedbackComments': 'Good'})
+        self.assertInSync()
+
+        self.client.force_login(self.hod)
+        self.client.post(reverse('approve_proposal', args=[alpha.pk]), {
+            'action': 'approve', 'amount': '1000', 'start_date': '2026-01-01', 'end_date': '2026-12-31'
+        })
+        self.client.post(reverse('approve_proposal', args=[beta.pk]), {'action': 'reject'})
+        self.assertInSync()
+
+        grant = Grant.objects.get()
+        self.client.post(reverse('track_budget', args=[grant.pk]), {'top_up_amount': '250'})
+        self.client.post(reverse('project_detail', args=[grant.pk]), {'feedback': 'Late', 'status_flag': ProposalStatus.NEEDS_INTERVENTION.value})
+        self.assertInSync()
+
+        self.client.force_login(self.alice)
+        self.client.post(reverse('submit_report', args=[alpha.pk]), {
+            'content': 'Progress', 'milestonesAchieved': 'M1', 'expenditure_amount': '120.50'
+        })
+        self.assertInSync()
+
+        stats = analytics.snapshot_analytics()
+        self.assertEqual(stats['total_allocated'], Decimal('1250'))
+        self.assertEqual(stats['total_expenditure'], Decimal('120.50'))
+        self.assertEqual(stats['needs_intervention'], 1)
+        self.assertEqual(stats['rejected'], 1)
+
+    def test_analytics_page_reads_one_snapshot_row(self):
+        self.client.force_login(self.hod)
+        make_grant(self.alice, 'Funded')
+        analytics.rebuild_snapshot()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('hod_analytics'))
+        tables = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertIn('grants_analyticssnapshot', tables)
+        self.assertNotIn('"grants_proposal"', tables)
+
+    def test_check_command_reports_drift(self):
+        call_command('rebuild_analytics_snapshot', '--check', stdout=StringIO())
+        make_proposal(self.alice, 'Untracked', status=ProposalStatus.APPROVED)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_analytics_snapshot', '--check', stdout=StringIO())
+        call_command('rebuild_analytics_snapshot', stdout=StringIO())
+        self.assertInSync()
+
+
+class PDFExportJobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, BACKGROUND_JOBS_IN_PROCESS=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.hod = make_hod()
+        self.client.force_login(self.hod)
+
+    def test_enqueue_poll_and_download(self):
+        response = self.client.post(reverse('export_hod_analytics_pdf'))
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(job['status'], 'queued')
+
+        self.assertEqual(self.client.get(job['status_url']).json()['status'], 'queued')
+        self.assertEqual(jobs.run_pending(), 1)
+
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual(status['status'], 'done')
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+    def test_get_queues_and_redirects_to_status(self):
+        response = self.client.get(reverse('export_hod_analytics_pdf'))
+        job = BackgroundJob.objects.get()
+        self.assertRedirects(response, reverse('export_job_status', args=[job.pk]), fetch_redirect_response=False)
+        self.assertEqual(job.status, BackgroundJob.QUEUED)
+
+    def test_download_of_missing_file_is_404(self):
+        job = jobs.enqueue('analytics_pdf', {'hod_id': self.hod.pk}, requested_by=self.hod)
+        jobs.run_job(job.pk)
+        job.refresh_from_db()
+        os.remove(job.result_file.path)
+        self.assertEqual(self.client.get(reverse('export_job_download', args=[job.pk])).status_code, 404)
+
+        BackgroundJob.objects.filter(pk=job.pk).update(result_file='')
+        self.assertEqual(self.client.get(reverse('export_job_download', args=[job.pk])).status_code, 404)
+
+    def test_jobs_run_once_and_are_private(self):
+        job = jobs.enqueue('analytics_pdf', {'hod_id': self.hod.pk}, requested_by=self.hod)
+        self.assertTrue(jobs.run_job(job.pk))
+        self.assertFalse(jobs.run_job(job.pk))
+
+        self.client.force_login(make_hod('other_hod'))
+        self.assertEqual(self.client.get(reverse('export_job_status', args=[job.pk])).status_code, 404)
+
+    def test_failed_job_records_error(self):
+        job = jobs.enqueue('analytics_pdf', {'hod_id': 0}, requested_by=self.hod)
+        with self.assertLogs('grants.jobs', 'ERROR'):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.FAILED)
+        self.assertIn('DoesNotExist', job.error)
+
+    def test_stale_running_jobs_are_reclaimed(self):
+        job = jobs.enqueue('analytics_pdf', {'hod_id': self.hod.pk}, requested_by=self.hod)
+        self.assertTrue(jobs.claim(job.pk))  # ... and the worker dies
+        self.assertEqual(jobs.run_pending(), 0)
+
+        BackgroundJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        with override_settings(BACKGROUND_JOB_STALE_AFTER=60):
+            self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.DONE, 2))
+
+    def test_job_out_of_attempts_is_failed(self):
+        job = jobs.enqueue('analytics_pdf', {'hod_id': self.hod.pk}, requested_by=self.hod)
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status=BackgroundJob.RUNNING, attempts=3, started_at=timezone.now() - timedelta(hours=1)
+        )
+        with override_settings(BACKGROUND_JOB_STALE_AFTER=60, BACKGROUND_JOB_MAX_ATTEMPTS=3):
+            self.assertEqual(jobs.reclaim_stale(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.FAILED)
+
+    def test_run_reclaimed_from_a_slow_worker_is_discarded(self):
+        job = jobs.enqueue('analytics_pdf', {'hod_id': self.hod.pk}, requested_by=self.hod)
+
+        render = reports.analytics_pdf_job
+
+        def reclaimed_mid_run(job):
+            BackgroundJob.objects.filter(pk=job.pk).update(status=BackgroundJob.QUEUED, started_at=None)
+            render(job)
+
+        with mock.patch.object(reports, 'analytics_pdf_job', reclaimed_mid_run), self.assertLogs('grants.jobs', 'WARNING'):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.QUEUED)
+        self.assertFalse(job.result_file)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'exports')), [])
+
+    def test_old_finished_jobs_and_their_files_are_purged(self):
+        old = jobs.enqueue('analytics_pdf', {'hod_id': self.hod.pk}, requested_by=self.hod)
+        recent = jobs.enqueue('analytics_pdf', {'hod_id': self.hod.pk}, requested_by=self.hod)
+        jobs.run_pending()
+        old.refresh_from_db()
+        BackgroundJob.objects.filter(pk=old.pk).update(finished_at=timezone.now() - timedelta(days=30))
+
+        with override_settings(BACKGROUND_JOB_RETENTION_DAYS=7):
+            call_command('purge_jobs', stdout=StringIO())
+
+        self.assertEqual(list(BackgroundJob.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertFalse(os.path.exists(old.result_file.path))
+
+
+class PDFStylesheetCacheTests(TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir, ignore_errors=True)
+        os.makedirs(os.path.join(self.base_dir, 'static', 'css'))
+        self.css_path = os.path.join(self.base_dir, 'static', 'css', 'style.css')
+        self.write_css('.pdf-body { color: red; }', mtime=1_000_000)
+
+    def write_css(self, pdf_rules, mtime):
+        with open(self.css_path, 'w', encoding='utf-8') as f:
+            f.write('body { margin: 0; }\n/* =========================================\n   PDF EXPORT STYLES\n*/\n' + pdf_rules)
+        os.utime(self.css_path, (mtime, mtime))
+
+    def test_css_is_read_once_until_the_file_changes(self):
+        with override_settings(BASE_DIR=self.base_dir), mock.patch('builtins.open', wraps=open) as opened:
+            first = reports.load_pdf_css()
+            second = reports.load_pdf_css()
+            self.assertEqual(opened.call_count, 1)
+            self.assertTrue(first.startswith('/*'))
+            self.assertIn('color: red', first)
+            self.assertNotIn('margin: 0', first)
+            self.assertIs(first, second)
+
+            self.write_css('.pdf-body { color: blue; }', mtime=2_000_000)
+            self.assertIn('color: blue', reports.load_pdf_css())
+
+    def test_missing_stylesheet_falls_back(self):
+        with override_settings(BASE_DIR=os.path.join(self.base_dir, 'missing')):
+            self.assertEqual(reports.load_pdf_css(), reports.FALLBACK_PDF_CSS)
+
+    def test_compiled_template_is_reused(self):
+        self.assertIs(reports.get_pdf_template(), reports.get_pdf_template())
+
+
+class ConcurrentAccountingTests(TransactionTestCase):
+    THREADS = 8
+    OPERATIONS = 25
+    # Money movements per second the contended run must sustain; roughly 20x below
+    # what a laptop does on SQLite, so only a real serialisation regression trips it
+    MIN_OPS_PER_SECOND = 10
+
+    def test_concurrent_money_movements_lose_no_updates(self):
+        hod = make_hod()
+        grant = make_grant(make_researcher('alice'), 'Shared', allocated='1000.00')
+        hod.refresh_from_db()
+        starting_budget = hod.total_department_budget
+
+        def worker():
+            # Each thread gets its own DB connection and model instances
+            my_hod = HOD.objects.get(pk=hod.pk)
+            my_grant = Grant.objects.get(pk=grant.pk)
+            try:
+                for _ in range(self.OPERATIONS):
+                    accounting.record_expenditure(my_grant.proposal, Decimal('1.50'))
+                    accounting.top_up_grant(my_hod, my_grant, Decimal('2.00'))
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            for future in [pool.submit(worker) for _ in range(self.THREADS)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        total_ops = self.THREADS * self.OPERATIONS
+        grant.refresh_from_db()
+        hod.refresh_from_db()
+        self.assertEqual(grant.budget.totalSpent, Decimal('1.50') * total_ops)
+        self.assertEqual(grant.totalAllocatedAmount, Decimal('1000.00') + Decimal('2.00') * total_ops)
+        self.assertEqual(hod.total_department_budget, starting_budget - Decimal('2.00') * total_ops)
+        ops_per_second = 2 * total_ops / elapsed
+        self.assertGreater(ops_per_second, self.MIN_OPS_PER_SECOND, f"{ops_per_second:.0f} money movements/s")
+
+    def test_department_budget_cannot_be_overdrawn(self):
+        hod = make_hod()
+        HOD.objects.filter(pk=hod.pk).update(total_department_budget=Decimal('100.00'))
+        grant = make_grant(make_researcher('alice'), 'Shared')
+        successes = []
+
+        def worker():
+            try:
+                accounting.top_up_grant(HOD.objects.get(pk=hod.pk), Grant.objects.get(pk=grant.pk), Decimal('30.00'))
+                successes.append(True)
+            except accounting.InsufficientFunds:
+                pass
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            for future in [pool.submit(worker) for _ in range(self.THREADS)]:
+                future.result()
+
+        hod.refresh_from_db()
+        self.assertEqual(len(successes), 3)
+        self.assertEqual(hod.total_department_budget, Decimal('10.00'))
+
+
+class DatabaseProfileTests(TransactionTestCase):
+    def test_sqlite_profile_pragmas_are_applied(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite profile only")
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+    def test_loadtest_runs_the_workflow_and_cleans_up(self):
+        analytics.rebuild_snapshot()
+        out = StringIO()
+        call_command(
+            'loadtest', proposals=6, concurrency=3, researchers=2, reviewers=2, hods=1, stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn('18 requests', output)
+        self.assertIn('0 lock-wait error(s), 0 other error(s)', output)
+        self.assertFalse(Proposal.objects.exists())
+        self.assertFalse(Researcher.objects.exists())
+        self.assertFalse(BackgroundJob.objects.exists())
+        self.assertEqual(analytics.snapshot_drift(), {})
+
+
+class BudgetLedgerTests(TestCase):
+    def setUp(self):
+        self.hod = make_hod()
+        self.alice = make_researcher('alice')
+        self.proposal = make_proposal(self.alice, 'Alpha', status=ProposalStatus.REVIEW_COMPLETE)
+
+    def test_every_money_movement_is_appended(self):
+        grant = accounting.allocate_grant(self.hod, self.proposal, Decimal('1000'), '2026-01-01', '2026-12-31')
+        accounting.top_up_grant(self.hod, grant, Decimal('200'))
+        accounting.reallocate_grant(self.hod, grant, Decimal('1100'), '2026-01-01', '2026-12-31')
+        accounting.record_expenditure(self.proposal, Decimal('75.25'))
+        accounting.record_expenditure(self.proposal, Decimal('24.75'))
+
+        kinds = list(grant.ledger_entries.order_by('pk').values_list('kind', 'amount'))
+        self.assertEqual(kinds, [
+            (LedgerEntry.ALLOCATION, Decimal('1000')),
+            (LedgerEntry.TOP_UP, Decimal('200')),
+            (LedgerEntry.ADJUSTMENT, Decimal('-100')),
+            (LedgerEntry.EXPENDITURE, Decimal('75.25')),
+            (LedgerEntry.EXPENDITURE, Decimal('24.75')),
+        ])
+        grant.refresh_from_db()
+        self.assertEqual(grant.budget.totalSpent, grant.ledger_entries.totals()['expenditure'])
+
+    def test_period_sums_only_cover_the_range(self):
+        grant = accounting.allocate_grant(self.hod, self.proposal, Decimal('1000'), '2026-01-01', '2026-12-31')
+        for month, amount in [(1, '10'), (2, '20'), (3, '40')]:
+            LedgerEntry.objects.create(
+                grant=grant, kind=LedgerEntry.EXPENDITURE, amount=Decimal(amount),
+                created_at=datetime(2026, month, 15, tzinfo=dt_timezone.utc)
+            )
+
+        february = grant.ledger_entries.between(
+            datetime(2026, 2, 1, tzinfo=dt_timezone.utc), datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual(february.totals()['expenditure'], Decimal('20'))
+
+        self.client.force_login(self.hod)
+        response = self.client.get(reverse('track_budget', args=[grant.pk]), {'from': '2026-01-01', 'to': '2026-02-28'})
+        self.assertEqual(response.context['period_totals']['expenditure'], Decimal('30'))
+
+    def test_impossible_dates_drop_the_filter(self):
+        grant = accounting.allocate_grant(self.hod, self.proposal, Decimal('1000'), '2026-01-01', '2026-12-31')
+        accounting.record_expenditure(self.proposal, Decimal('15'))
+
+        self.client.force_login(self.hod)
+        response = self.client.get(reverse('track_budget', args=[grant.pk]), {'from': '2026-02-31', 'to': '2026-13-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['period_totals'])
+        self.assertEqual(len(response.context['ledger_entries']), 2)
+        self.assertEqual(len(list(response.context['messages'])), 2)
+
+    def test_entries_are_append_only(self):
+        grant = accounting.allocate_grant(self.hod, self.proposal, Decimal('1000'), '2026-01-01', '2026-12-31')
+        entry = grant.ledger_entries.get()
+        entry.amount = Decimal('1')
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+
+class ProposalDocumentTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.researcher = make_researcher('alice')
+        self.proposal = make_proposal(self.researcher, 'Docs', status=ProposalStatus.PENDING)
+        self.body = bytes(range(256)) * 1024  # 256 KiB, several chunks
+        self.proposal.pdf_file.save('docs.pdf', ContentFile(self.body))
+        self.url = reverse('proposal_document', args=[self.proposal.pk])
+        self.client.force_login(self.researcher)
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_download_is_streamed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(self.content(response), self.body)
+
+    def test_range_request(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.body)}')
+        self.assertEqual(self.content(response), self.body[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(self.content(response), self.body[-10:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.body)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+    def test_zero_length_suffix_range_is_unsatisfiable(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-0')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+        self.assertIs(documents.parse_range('bytes=-0', 10), False)
+        self.assertIs(documents.parse_range('bytes=-5', 0), False)
+        self.assertEqual(documents.parse_range('bytes=-20', 10), (0, 9))
+
+    def test_stale_if_range_gets_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+
+    def test_if_range_accepts_the_last_modified_date(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=last_modified)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.content(response), self.body[:10])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='Thu, 01 Jan 2015 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DOCUMENT_SENDFILE_HEADER='X-Accel-Redirect', DOCUMENT_SENDFILE_PREFIX='/protected/')
+    def test_sendfile_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.proposal.pdf_file.name)
+        self.assertEqual(response.content, b'')
+
+    def test_permissions(self):
+        self.client.force_login(make_researcher('mallory'))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+        self.client.force_login(make_reviewer())
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        Proposal.objects.filter(pk=self.proposal.pk).update(status=ProposalStatus.DRAFT)
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.researcher = make_researcher('alice')
+        self.client.force_login(self.researcher)
+        self.body = os.urandom(100 * 1024)
+
+    def start(self, body=None, **overrides):
+        body = self.body if body is None else body
+        data = {'filename': 'big.pdf', 'size': len(body), 'sha256': hashlib.sha256(body).hexdigest(), **overrides}
+        return self.client.post(reverse('start_upload'), data, content_type='application/json')
+
+    def put(self, url, start, end, body=None):
+        body = self.body if body is None else body
+        return self.client.put(
+            url, body[start:end + 1], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(body)}',
+        )
+
+    def upload(self, chunk=30 * 1024):
+        url = self.start().json()['upload_url']
+        for start in range(0, len(self.body), chunk):
+            response = self.put(url, start, min(start + chunk, len(self.body)) - 1)
+        return response
+
+    def test_chunks_assemble_and_verify(self):
+        response = self.upload()
+        self.assertEqual(response.json()['status'], UploadSession.COMPLETE)
+
+        session = UploadSession.objects.get()
+        with open(uploads.part_path(session), 'rb') as part:
+            self.assertEqual(part.read(), self.body)
+
+    def test_resume_after_gap(self):
+        url = self.start().json()['upload_url']
+        self.put(url, 0, 9999)
+        # Out-of-order chunk is refused and tells the client where to resume
+        response = self.put(url, 20000, 29999)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], 10000)
+        self.assertEqual(self.client.get(url).json()['received'], 10000)
+
+        response = self.put(url, 10000, len(self.body) - 1)
+        self.assertEqual(response.json()['status'], UploadSession.COMPLETE)
+
+    def test_checksum_mismatch_fails_upload(self):
+        url = self.start(sha256='0' * 64).json()['upload_url']
+        response = self.put(url, 0, len(self.body) - 1)
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(os.path.exists(uploads.part_path(UploadSession.objects.get())))
+
+    def test_rejects_bad_extension_and_size(self):
+        self.assertEqual(self.start(filename='virus.exe').status_code, 400)
+        with override_settings(UPLOAD_MAX_SIZE=1024):
+            self.assertEqual(self.start().status_code, 400)
+
+    def test_rejects_json_that_is_not_an_object(self):
+        for body in ('[]', '"big.pdf"', '42', 'null'):
+            response = self.client.post(reverse('start_upload'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_stale_sessions_are_purged_with_their_part_files(self):
+        url = self.start().json()['upload_url']
+        self.put(url, 0, 9999)
+        stale = UploadSession.objects.get()
+        failed_url = self.start(sha256='0' * 64).json()['upload_url']
+        self.put(failed_url, 0, len(self.body) - 1)
+        UploadSession.objects.update(created_at=timezone.now() - timedelta(days=2))
+        fresh = UploadSession.objects.get(pk=self.start().json()['upload_id'])
+
+        with override_settings(UPLOAD_SESSION_TTL=24 * 60 * 60):
+            call_command('purge_uploads', stdout=StringIO())
+
+        self.assertEqual(list(UploadSession.objects.all()), [fresh])
+        self.assertFalse(os.path.exists(uploads.part_path(stale)))
+        self.assertTrue(os.path.exists(uploads.part_path(fresh)))
+
+    def test_finished_upload_is_attached_to_new_proposal(self):
+        self.upload()
+        session = UploadSession.objects.get()
+        self.client.post(reverse('submit_proposal'), {
+            'title': 'Chunked', 'requested_amount': '100', 'upload_id': str(session.pk),
+        })
+
+        proposal = Proposal.objects.get(title='Chunked')
+        self.assertEqual(proposal.status, ProposalStatus.PENDING)
+        with proposal.pdf_file.open('rb') as f:
+            self.assertEqual(f.read(), self.body)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_sessions_are_private(self):
+        url = self.start().json()['upload_url']
+        self.client.force_login(make_researcher('mallory'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class DocumentStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.researcher = make_researcher('alice')
+
+    def save_version(self, body, title='Docs'):
+        proposal = make_proposal(self.researcher, title)
+        proposal.pdf_file.save('scan.pdf', ContentFile(body))
+        return proposal
+
+    def blob_files(self):
+        return [f for _, _, files in os.walk(os.path.join(self.media_root, 'blobs')) for f in files]
+
+    def test_identical_content_is_stored_once(self):
+        v1 = self.save_version(b'same document')
+        v2 = self.save_version(b'same document')
+        v3 = self.save_version(b'edited document')
+
+        self.assertEqual(v1.pdf_file.name, v2.pdf_file.name)
+        self.assertNotEqual(v1.pdf_file.name, v3.pdf_file.name)
+        self.assertTrue(v1.pdf_file.name.startswith('blobs/'))
+        self.assertEqual(len(self.blob_files()), 2)
+        self.assertEqual(DocumentBlob.objects.get(name=v1.pdf_file.name).ref_count, 2)
+
+    def test_delete_drops_file_with_last_reference(self):
+        v1 = self.save_version(b'same document')
+        v2 = self.save_version(b'same document')
+        name = v1.pdf_file.name
+
+        v1.pdf_file.delete()
+        self.assertTrue(storage.document_storage.exists(name))
+        v2.pdf_file.delete()
+        self.assertFalse(storage.document_storage.exists(name))
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    def test_gc_removes_unreferenced_blobs_after_grace(self):
+        kept = self.save_version(b'kept')
+        orphan = self.save_version(b'orphan', title='Gone')
+        orphan_name = orphan.pdf_file.name
+        orphan.delete()  # row deletion leaves the file behind
+
+        call_command('gc_documents', stdout=StringIO())
+        self.assertTrue(storage.document_storage.exists(orphan_name))  # still inside the grace period
+
+        DocumentBlob.objects.update(last_referenced_at=datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+        call_command('gc_documents', '--grace', '1', stdout=StringIO())
+        self.assertFalse(storage.document_storage.exists(orphan_name))
+        self.assertTrue(storage.document_storage.exists(kept.pdf_file.name))
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 1)
+
+    def test_import_legacy_documents(self):
+        legacy_dir = os.path.join(self.media_root, 'proposals', 'pdfs')
+        os.makedirs(legacy_dir)
+        for name in ('a.pdf', 'b.pdf'):
+            with open(os.path.join(legacy_dir, name), 'wb') as f:
+                f.write(b'old upload')
+        make_proposal(self.researcher, 'A', pdf_file='proposals/pdfs/a.pdf')
+        make_proposal(self.researcher, 'B', pdf_file='proposals/pdfs/b.pdf')
+
+        call_command('gc_documents', '--import-legacy', stdout=StringIO())
+        names = set(Proposal.objects.values_list('pdf_file', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names.pop().startswith('blobs/'))
+        self.assertEqual(os.listdir(legacy_dir), [])
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 2)
+
+
+def make_pdf(text):
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer)
+    pdf.drawString(72, 720, text)
+    pdf.save()
+    return buffer.getvalue()
+
+
+def make_docx(*paragraphs):
+    ns = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+    body = ''.join(f'<w:p><w:r><w:t>{p}</w:t></w:r></w:p>' for p in paragraphs)
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as docx:
+        docx.writestr('word/document.xml', f'<w:document xmlns:w="{ns}"><w:body>{body}</w:body></w:document>')
+    return buffer.getvalue()
+
+
+class ProposalSearchTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, BACKGROUND_JOBS_IN_PROCESS=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.alice = make_researcher('alice')
+        self.reviewer = make_reviewer()
+        self.client.force_login(self.reviewer)
+
+    def add(self, title, filename=None, body=b'', status=ProposalStatus.PENDING, researcher=None):
+        proposal = make_proposal(researcher or self.alice, title, status=status)
+        if filename:
+            proposal.pdf_file.save(filename, ContentFile(body))
+        job = jobs.enqueue('index_proposal', {'proposal_id': proposal.pk})
+        jobs.run_job(job.pk)
+        return proposal
+
+    def search(self, q, **params):
+        return self.client.get(reverse('search_proposals'), {'q': q, 'format': 'json', **params}).json()
+
+    def test_extracts_pdf_and_docx_text(self):
+        pdf = self.add('Solar', 'solar.pdf', make_pdf('Photovoltaic efficiency study'))
+        docx = self.add('Rivers', 'rivers.docx', make_docx('Sediment transport', 'in tropical estuaries'))
+        self.assertIn('Photovoltaic', ProposalText.objects.get(proposal=pdf).content)
+        self.assertEqual(ProposalText.objects.get(proposal=docx).content, 'Sediment transport\nin tropical estuaries')
+
+        self.assertEqual([r['id'] for r in self.search('photovoltaic')['results']], [pdf.pk])
+        self.assertEqual([r['id'] for r in self.search('estuaries')['results']], [docx.pk])
+
+    def test_identical_blob_is_extracted_once(self):
+        body = make_pdf('Shared text')
+        self.add('One', 'a.pdf', body)
+        with mock.patch.object(extraction, 'extract_text') as extract:
+            self.add('Two', 'b.pdf', body)
+        extract.assert_not_called()
+
+    def test_title_matches_rank_above_body_matches(self):
+        in_body = self.add('Coastal study', 'c.docx', make_docx('We also look at genomics briefly'))
+        in_title = self.add('Genomics of rice')
+        self.assertEqual([r['id'] for r in self.search('genomics')['results']], [in_title.pk, in_body.pk])
+
+    def test_research_interests_are_searchable_and_drafts_hidden(self):
+        bob = Researcher.objects.create_user(username='bob', role='Researcher', department='Physics', researchinterests='Quantum optics')
+        visible = self.add('Lasers', researcher=bob)
+        self.add('Lasers draft', researcher=bob, status=ProposalStatus.DRAFT)
+        self.assertEqual([r['id'] for r in self.search('quantum')['results']], [visible.pk])
+
+    def test_results_are_paginated(self):
+        for i in range(SEARCH_PAGE_SIZE + 3):
+            self.add(f'Robotics {i}')
+        first = self.search('robotics')
+        self.assertEqual(first['total'], SEARCH_PAGE_SIZE + 3)
+        self.assertTrue(first['has_next'])
+        second = self.search('robotics', page=2)
+        self.assertEqual(len(second['results']), 3)
+        self.assertFalse(set(r['id'] for r in first['results']) & set(r['id'] for r in second['results']))
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.add('Robotics')
+        self.assertEqual(self.search('robot AND (" NEAR')['total'], 0)
+        self.assertEqual(self.search('robot')['total'], 1)  # prefix match
+
+    def test_rebuild_command_reindexes_everything(self):
+        proposal = make_proposal(self.alice, 'Unindexed volcanology', status=ProposalStatus.PENDING)
+        self.assertEqual(self.search('volcanology')['total'], 0)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual([r['id'] for r in self.search('volcanology')['results']], [proposal.pk])
+
+    def test_html_page_renders(self):
+        self.add('Robotics')
+        response = self.client.get(reverse('search_proposals'), {'q': 'robotics'})
+        self.assertContains(response, 'Robotics')
+
+    def test_changed_research_interests_are_reindexed(self):
+        proposal = self.add('Lasers')
+        self.alice.researchinterests = 'Quantum optics'
+        self.alice.save()
+        self.alice.save()  # unchanged: no second job
+        self.assertEqual(BackgroundJob.objects.filter(kind='index_researcher').count(), 1)
+
+        jobs.run_pending()
+        self.assertEqual([r['id'] for r in self.search('quantum')['results']], [proposal.pk])
+        self.assertEqual(self.search('AI')['total'], 0)
+
+    def test_deleting_a_proposal_drops_it_from_the_index(self):
+        proposal = self.add('Volcanology')
+        proposal.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.INDEX_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(self.search('volcanology')['total'], 0)
+
+    def test_unsupported_database_falls_back_to_substring_match(self):
+        self.add('Coastal study', 'c.docx', make_docx('Mangrove erosion survey'))
+        self.add('Lasers draft', status=ProposalStatus.DRAFT)
+        with mock.patch.object(search, 'get_backend', side_effect=NotImplementedError):
+            result = self.search('mangrove')
+            self.assertFalse(result['ranked'])
+            self.assertEqual([r['title'] for r in result['results']], ['Coastal study'])
+            self.assertEqual(self.search('lasers')['total'], 0)
+            self.assertContains(self.client.get(reverse('search_proposals'), {'q': 'coastal'}), 'Ranked search is unavailable')
+
+    def test_backends_must_implement_the_whole_api(self):
+        class Partial(search.SearchBackend):
+            def install(self):
+                pass
+
+        with self.assertRaises(TypeError):
+            Partial(connection)
+
+
+class ReviewerMatchingTests(TestCase):
+    def setUp(self):
+        self.genomics = Reviewer.objects.create_user(
+            username='gene', role='Reviewer', specialization='Genomics', researchinterests='DNA sequencing, genome assembly', deptID='BIO'
+        )
+        self.robotics = Reviewer.objects.create_user(
+            username='robo', role='Reviewer', specialization='Robotics', researchinterests='robot navigation, control systems', deptID='ENG'
+        )
+        self.bio = make_researcher('bio', department='Faculty of Biological Sciences')
+        self.eng = make_researcher('eng', department='Faculty of Computing')
+
+    def pending(self, researcher, title):
+        return make_proposal(researcher, title, status=ProposalStatus.PENDING)
+
+    def test_similarity_prefers_matching_interests(self):
+        scores = matching.similarity(
+            ['genome assembly of wheat', 'autonomous robot navigation'],
+            ['genomics genome DNA', 'robotics robot control'],
+        )
+        self.assertGreater(scores[0, 0], scores[0, 1])
+        self.assertGreater(scores[1, 1], scores[1, 0])
+
+    def test_conflicts_compare_department_names_with_codes(self):
+        conflicts = matching._conflicts(
+            ['Faculty of Biological Sciences', 'Engineering', 'Faculty of Arts', 'Department of  Arts'],
+            ['BIO', 'eng', 'Arts', None],
+        )
+        self.assertEqual(conflicts.tolist(), [
+            [True, False, False, False],
+            [False, True, False, False],
+            [False, False, True, False],  # unknown departments still match by name
+            [False, False, True, False],
+        ])
+
+    def test_assign_respects_capacity_and_conflicts(self):
+        scores = np.array([[0.9, 0.1], [0.8, 0.2], [0.7, 0.3], [0.6, 0.4]])
+        conflicts = np.zeros(scores.shape, dtype=bool)
+        conflicts[0, 0] = True
+        result = matching.assign(scores, conflicts, needed=[1, 1, 1, 1], capacity=[2, 2])
+        # Reviewer 0 fills up on its best remaining matches; the rest spill to reviewer 1
+        self.assertEqual(sorted((i, j) for i, j, _ in result), [(0, 1), (1, 0), (2, 0), (3, 1)])
+
+    def test_plan_matches_by_topic_and_excludes_own_department(self):
+        dna = self.pending(self.eng, 'Genome assembly for DNA sequencing')
+        robots = self.pending(self.eng, 'Robot navigation control')
+        # Same department as the genomics reviewer: must go to someone else
+        conflict = self.pending(self.bio, 'DNA sequencing of soil microbes')
+
+        plan = matching.plan_assignments(per_proposal=1, capacity=2)
+        chosen = {a.proposal_id: a.reviewer_id for a in plan}
+        self.assertEqual(chosen[dna.pk], self.genomics.pk)
+        self.assertEqual(chosen[robots.pk], self.robotics.pk)
+        self.assertEqual(chosen[conflict.pk], self.robotics.pk)
+
+    def test_existing_assignments_count_towards_need_and_load(self):
+        proposal = self.pending(self.eng, 'Genome assembly')
+        ReviewerAssignment.objects.create(proposal=proposal, reviewer=self.genomics, score=0.5)
+        plan = matching.plan_assignments(per_proposal=2)
+        self.assertEqual([(a.proposal_id, a.reviewer_id) for a in plan], [(proposal.pk, self.robotics.pk)])
+        self.assertEqual(matching.plan_assignments(per_proposal=1), [])
+
+    def test_command_and_hod_view(self):
+        self.pending(self.eng, 'Genome assembly')
+        call_command('assign_reviewers', '--dry-run', stdout=StringIO())
+        self.assertFalse(ReviewerAssignment.objects.exists())
+
+        self.client.force_login(make_hod())
+        self.client.post(reverse('reviewer_assignments'), {'per_proposal': 2})
+        self.assertEqual(ReviewerAssignment.objects.count(), 2)
+        self.assertContains(self.client.get(reverse('reviewer_assignments')), 'Genome assembly')
+
+    def test_existing_pairs_are_not_counted_as_created(self):
+        self.pending(self.eng, 'Genome assembly')
+        plan = matching.plan_assignments(per_proposal=2)
+        self.assertEqual(matching.save_assignments(plan[:1]), 1)
+        replan = [ReviewerAssignment(proposal=a.proposal, reviewer=a.reviewer, score=a.score) for a in plan]
+        self.assertEqual(matching.save_assignments(replan), 1)
+        self.assertEqual(ReviewerAssignment.objects.count(), 2)
+
+    def test_assignment_list_is_paginated(self):
+        for i in range(5):
+            ReviewerAssignment.objects.create(proposal=self.pending(self.eng, f'Genome {i}'), reviewer=self.genomics, score=0.5)
+            ReviewerAssignment.objects.create(proposal=self.pending(self.bio, f'Robot {i}'), reviewer=self.robotics, score=0.25)
+        self.client.force_login(make_hod())
+
+        seen = []
+        query = {}
+        with mock.patch('grants.views.ASSIGNMENTS_PAGE_SIZE', 4):
+            while True:
+                response = self.client.get(reverse('reviewer_assignments'), query)
+                seen += [a.pk for a in response.context['assignments']]
+                if not response.context['next_query']:
+                    break
+                query = {'cursor': QueryDict(response.context['next_query'])['cursor']}
+        self.assertEqual(sorted(seen), sorted(ReviewerAssignment.objects.values_list('pk', flat=True)))
+        self.assertEqual(len(seen), 10)
+
+    def test_reviewer_can_filter_to_assigned(self):
+        mine = self.pending(self.eng, 'Genome assembly')
+        self.pending(self.eng, 'Robot arms')
+        ReviewerAssignment.objects.create(proposal=mine, reviewer=self.genomics)
+        self.client.force_login(self.genomics)
+        response = self.client.get(reverse('reviewer_dashboard'), {'assigned': '1'})
+        self.assertEqual([p.pk for p in response.context['proposals']], [mine.pk])
+
+
+class EvaluationAggregateTests(TestCase):
+    def setUp(self):
+        self.researcher = make_researcher('alice')
+        self.reviewers = [make_reviewer(f'rev{i}') for i in range(3)]
+
+    def evaluate(self, proposal, reviewer, score):
+        self.client.force_login(reviewer)
+        self.client.post(reverse('evaluate_proposal', args=[proposal.pk]), {'score': score, 'feedbackComments': 'ok'})
+
+    def test_evaluate_updates_aggregates(self):
+        proposal = make_proposal(self.researcher, 'Scored', status=ProposalStatus.PENDING)
+        for reviewer, score in zip(self.reviewers, [60, 80, 100]):
+            self.evaluate(proposal, reviewer, score)
+
+        proposal.refresh_from_db()
+        self.assertEqual(proposal.status, ProposalStatus.REVIEW_COMPLETE)
+        self.assertEqual((proposal.eval_count, proposal.eval_score_min, proposal.eval_score_max), (3, 60, 100))
+        self.assertEqual(proposal.eval_score_mean, 80)
+        self.assertAlmostEqual(proposal.eval_score_variance, 800 / 3)
+
+        annotated = Proposal.objects.with_evaluation_stats().get(pk=proposal.pk)
+        self.assertAlmostEqual(annotated.eval_mean, 80)
+        self.assertAlmostEqual(annotated.eval_variance, 800 / 3)
+
+    def test_hod_pending_list_ranks_by_score_without_n_plus_one(self):
+        low = make_proposal(self.researcher, 'Low', status=ProposalStatus.PENDING)
+        high = make_proposal(self.researcher, 'High', status=ProposalStatus.PENDING)
+        self.evaluate(low, self.reviewers[0], 40)
+        self.evaluate(high, self.reviewers[0], 90)
+        unscored = make_proposal(self.researcher, 'Unscored', status=ProposalStatus.REVIEW_COMPLETE)
+
+        hod = make_hod()
+        self.client.force_login(hod)
+        response = self.client.get(reverse('hod_dashboard'))
+        self.assertEqual([p.pk for p in response.context['proposals']], [high.pk, low.pk, unscored.pk])
+
+        for i in range(5):
+            p = make_proposal(self.researcher, f'More {i}', status=ProposalStatus.PENDING)
+            self.evaluate(p, self.reviewers[1], 50 + i)
+        self.client.force_login(hod)
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(reverse('hod_dashboard'))
+        # Later requests reset the query log, so take the count now
+        baseline_count = len(baseline)
+        for i in range(5):
+            p = make_proposal(self.researcher, f'Extra {i}', status=ProposalStatus.PENDING)
+            self.evaluate(p, self.reviewers[2], 70)
+        self.client.force_login(hod)
+        with self.assertNumQueries(baseline_count):
+            self.client.get(reverse('hod_dashboard'))
+
+    def test_status_changes_keep_aggregates(self):
+        proposal = make_proposal(self.researcher, 'Kept', status=ProposalStatus.PENDING)
+        self.evaluate(proposal, self.reviewers[0], 75)
+        self.client.force_login(make_hod())
+        self.client.post(reverse('approve_proposal', args=[proposal.pk]), {'action': 'reject'})
+        proposal.refresh_from_db()
+        self.assertEqual((proposal.status, proposal.eval_count, proposal.eval_score_sum), (ProposalStatus.REJECTED, 1, 75))
+
+    def test_reviewer_cannot_evaluate_twice(self):
+        proposal = make_proposal(self.researcher, 'Once', status=ProposalStatus.PENDING)
+        self.evaluate(proposal, self.reviewers[0], 70)
+        self.client.force_login(self.reviewers[0])
+        response = self.client.post(reverse('evaluate_proposal', args=[proposal.pk]), {'score': 10, 'feedbackComments': 'again'})
+        self.assertRedirects(response, reverse('view_evaluation', args=[proposal.pk]))
+        proposal.refresh_from_db()
+        self.assertEqual((proposal.eval_count, proposal.eval_score_sum), (1, 70))
+
+
+class ProposalWorkflowTests(TestCase):
+    def setUp(self):
+        self.alice = make_researcher('alice')
+        self.reviewer = make_reviewer()
+        self.hod = make_hod()
+
+    def pending(self, title='Flow'):
+        proposal = make_proposal(self.alice, title, status=ProposalStatus.PENDING)
+        workflow.record_created(proposal, by=self.alice)
+        return proposal
+
+    def test_transitions_are_recorded_with_time_in_previous_state(self):
+        proposal = self.pending()
+        ProposalTransition.objects.filter(proposal=proposal).update(changed_at=datetime.now(dt_timezone.utc) - timedelta(days=2))
+
+        self.assertTrue(workflow.transition(proposal, ProposalStatus.REVIEW_COMPLETE, by=self.reviewer))
+        # Another evaluation of a reviewed proposal is a no-op, not a new history row
+        self.assertFalse(workflow.transition(proposal, ProposalStatus.REVIEW_COMPLETE, by=self.reviewer))
+        workflow.transition(proposal, ProposalStatus.APPROVED, by=self.hod)
+
+        history = list(proposal.transitions.order_by('changed_at').values_list('from_status', 'to_status', 'changed_by'))
+        self.assertEqual(history, [
+            (None, ProposalStatus.PENDING, self.alice.pk),
+            (ProposalStatus.PENDING, ProposalStatus.REVIEW_COMPLETE, self.reviewer.pk),
+            (ProposalStatus.REVIEW_COMPLETE, ProposalStatus.APPROVED, self.hod.pk),
+        ])
+        self.assertEqual(Proposal.objects.get(pk=proposal.pk).status, ProposalStatus.APPROVED)
+
+        stats = workflow.time_in_state()
+        average, stays = stats[ProposalStatus.PENDING]
+        self.assertEqual(stays, 1)
+        self.assertAlmostEqual(average, 2 * 86400, delta=60)
+
+    def test_disallowed_and_stale_transitions_raise(self):
+        proposal = self.pending()
+        with self.assertRaises(workflow.InvalidTransition):
+            workflow.transition(proposal, ProposalStatus.ON_TRACK)
+
+        stale = Proposal.objects.get(pk=proposal.pk)
+        workflow.transition(proposal, ProposalStatus.REJECTED)
+        with self.assertRaises(workflow.InvalidTransition):
+            workflow.transition(stale, ProposalStatus.REVIEW_COMPLETE)
+        self.assertEqual(stale.status, ProposalStatus.REJECTED)
+        self.assertEqual(proposal.transitions.count(), 2)
+
+    def test_unreviewed_proposal_cannot_be_approved(self):
+        proposal = self.pending()
+        self.client.force_login(self.hod)
+        self.client.post(reverse('approve_proposal', args=[proposal.pk]), {
+            'action': 'approve', 'amount': '1000', 'start_date': '2026-01-01', 'end_date': '2026-12-31'
+        })
+        proposal.refresh_from_db()
+        self.assertEqual(proposal.status, ProposalStatus.PENDING)
+        self.assertFalse(Grant.objects.exists())
+
+    def test_closed_proposal_cannot_be_evaluated(self):
+        proposal = self.pending()
+        workflow.transition(proposal, ProposalStatus.REJECTED)
+        self.client.force_login(self.reviewer)
+        response = self.client.post(reverse('evaluate_proposal', args=[proposal.pk]), {'score': 90, 'feedbackComments': 'ok'})
+        self.assertRedirects(response, reverse('reviewer_dashboard'), fetch_redirect_response=False)
+        self.assertFalse(Evaluation.objects.exists())
+
+    def test_monitoring_only_accepts_monitoring_states(self):
+        grant = make_grant(self.alice, 'Funded')
+        self.client.force_login(self.hod)
+        url = reverse('project_detail', args=[grant.pk])
+        self.client.post(url, {'feedback': 'Hmm', 'status_flag': ProposalStatus.DRAFT.value})
+        self.client.post(url, {'feedback': 'Hmm', 'status_flag': 'Whatever'})
+        grant.proposal.refresh_from_db()
+        self.assertEqual(grant.proposal.status, ProposalStatus.APPROVED)
+        self.assertFalse(ProgressReport.objects.exists())
+
+        self.client.post(url, {'feedback': 'Good', 'status_flag': ProposalStatus.ON_TRACK.value})
+        grant.proposal.refresh_from_db()
+        self.assertEqual(grant.proposal.status, ProposalStatus.ON_TRACK)
+
+    def test_templates_show_status_labels(self):
+        self.pending('Shown')
+        self.client.force_login(self.alice)
+        self.assertContains(self.client.get(reverse('researcher_dashboard')), 'Pending')
+        self.client.force_login(self.reviewer)
+        response = self.client.get(reverse('reviewer_dashboard'), {'status': ProposalStatus.PENDING.value})
+        self.assertEqual([p.title for p in response.context['proposals']], ['Shown'])
+        self.assertContains(response, f'<option value="{ProposalStatus.PENDING.value}" selected>Pending</option>', html=True)
+
+
+class WorkflowIndexTests(TestCase):
+    """The hot workflow lookups are answered from an index on a realistically sized table."""
+    PROPOSALS = 3000
+
+    @classmethod
+    def setUpTestData(cls):
+        researchers = [make_researcher(f'r{i}') for i in range(30)]
+        reviewers = [make_reviewer(f'rev{i}') for i in range(20)]
+        statuses = [ProposalStatus.DRAFT, ProposalStatus.PENDING, ProposalStatus.REVIEW_COMPLETE, ProposalStatus.APPROVED, ProposalStatus.REJECTED]
+
+        threads = ProposalThread.objects.bulk_create([
+            ProposalThread(researcher=researchers[i % len(researchers)], title=f'P{i}', revision_count=1)
+            for i in range(cls.PROPOSALS)
+        ])
+        proposals = Proposal.objects.bulk_create([
+            Proposal(
+                thread=thread, researcher_id=thread.researcher_id, title=thread.title,
+                status=statuses[i % len(statuses)], revision=1,
+            )
+            for i, thread in enumerate(threads)
+        ])
+        for thread, proposal in zip(threads, proposals):
+            thread.head = proposal
+        ProposalThread.objects.bulk_update(threads, ['head'])
+
+        Evaluation.objects.bulk_create([
+            Evaluation(proposal=proposal, reviewer=reviewers[(i + k) % len(reviewers)], score=70, feedbackComments='ok')
+            for i, proposal in enumerate(proposals) for k in range(2)
+        ])
+        ProgressReport.objects.bulk_create([
+            ProgressReport(proposal=proposal, content='c', milestonesAchieved='m')
+            for proposal in proposals[::3] for _ in range(3)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        cls.researcher, cls.reviewer, cls.proposal = researchers[0], reviewers[0], proposals[0]
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), f"none of {index_names} in plan:\n{plan}")
+
+    def test_status_lists_use_status_index(self):
+        self.assertUsesIndex(Proposal.objects.filter(status=ProposalStatus.REVIEW_COMPLETE), 'proposal_status_date_idx')
+        self.assertUsesIndex(
+            Proposal.objects.filter(status=ProposalStatus.REJECTED).order_by('-submissionDate')[:5], 'proposal_status_date_idx'
+        )
+
+    def test_researcher_dashboard_uses_researcher_index(self):
+        self.assertUsesIndex(
+            Proposal.objects.filter(researcher=self.researcher).latest_versions().order_by('-submissionDate', '-proposalID'),
+            'proposal_researcher_date_idx',
+        )
+
+    def test_evaluation_lookup_uses_unique_index(self):
+        # SQLite names the index backing an inline UNIQUE constraint itself
+        names = ('unique_evaluation_per_reviewer', 'sqlite_autoindex_grants_evaluation')
+        self.assertUsesIndex(Evaluation.objects.filter(proposal=self.proposal, reviewer=self.reviewer), *names)
+        self.assertUsesIndex(Proposal.objects.filter(pk=self.proposal.pk).review_queue(self.reviewer), *names)
+
+    def test_progress_reports_use_report_index(self):
+        self.assertUsesIndex(
+            ProgressReport.objects.filter(proposal=self.proposal).order_by('-submissionDate'), 'report_proposal_date_idx'
+        )
@@ -0,0 +1,161 @@
+"""
+Chunked, resumable uploads of proposal documents.
+
+The client opens an UploadSession (filename, size, SHA-256), then PUTs the
+file in order as byte ranges. Each chunk is streamed straight from the request
+into a part file on disk, so neither the chunk nor the file is held in memory,
+and a dropped connection resumes from `session.received`. When the last byte
+arrives the part file is hashed and checked against the declared checksum;
+attach_upload() then moves it into storage as the proposal's document.
+Sessions never attached are removed, part files included, once they are older
+than UPLOAD_SESSION_TTL (purge_stale_uploads, `manage.py purge_uploads`).
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F
+from django.utils import timezone
+
+from .models import UploadSession
+
+ALLOWED_EXTENSIONS = ('pdf', 'doc', 'docx')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    pass
+
+
+class _PartFile(File):
+    # FileSystemStorage moves files exposing temporary_file_path() instead of copying them
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def max_upload_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 200 * 1024 * 1024)
+
+
+def chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+
+
+def session_ttl():
+    return timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 60 * 60))
+
+
+def part_path(session):
+    directory = getattr(settings, 'UPLOAD_SESSION_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial')
+    return os.path.join(directory, f'{session.pk}.part')
+
+
+def start_upload(owner, filename, size, sha256):
+    filename = os.path.basename(filename or '')
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise UploadError("Upload only PDF or Word documents (.doc, .docx).")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("File size is required.")
+    if not 0 < size <= max_upload_size():
+        raise UploadError(f"File size must be between 1 byte and {max_upload_size()} bytes.")
+    sha256 = (sha256 or '').lower()
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+        raise UploadError("A hex SHA-256 checksum is required.")
+
+    session = UploadSession.objects.create(owner=owner, filename=filename, size=size, sha256=sha256)
+    path = part_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return session
+
+
+def write_chunk(session, start, length, stream):
+    """
+    Write `length` bytes from `stream` at offset `start`. Chunks must arrive in
+    order; re-sending an already written offset is harmless. Returns the session
+    with `received` (and `status`, after the last chunk) refreshed.
+    """
+    if session.status != UploadSession.OPEN:
+        raise UploadError("This upload is already finished.")
+    if start != session.received:
+        raise UploadError(f"Expected a chunk starting at byte {session.received}.")
+    if length <= 0 or start + length > session.size:
+        raise UploadError("Chunk runs past the declared file size.")
+
+    written = 0
+    with open(part_path(session), 'r+b') as part:
+        part.seek(start)
+        while written < length:
+            block = stream.read(min(STREAM_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            part.write(block)
+            written += len(block)
+    if written != length:
+        # Client went away mid-chunk; it resumes from the unchanged offset
+        raise UploadError("Chunk was shorter than its Content-Range.")
+
+    # Only advance from the offset we wrote at, so a duplicate request can't double count
+    UploadSession.objects.filter(pk=session.pk, received=start, status=UploadSession.OPEN).update(
+        received=F('received') + length
+    )
+    session.refresh_from_db()
+    if session.received == session.size and session.status == UploadSession.OPEN:
+        _finish(session)
+    return session
+
+
+def _finish(session):
+    digest = hashlib.sha256()
+    with open(part_path(session), 'rb') as part:
+        for block in iter(lambda: part.read(STREAM_BLOCK_SIZE), b''):
+            digest.update(block)
+
+    if digest.hexdigest() == session.sha256:
+        session.status = UploadSession.COMPLETE
+        session.completed_at = timezone.now()
+    else:
+        session.status = UploadSession.FAILED
+        discard_part(session)
+    session.save(update_fields=['status', 'completed_at'])
+
+
+def discard_part(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def attach_upload(proposal, session):
+    """Move a completed upload into `proposal.pdf_file` (not saved) and drop the session."""
+    if session.status != UploadSession.COMPLETE:
+        raise UploadError("Upload is not complete.")
+    with open(part_path(session), 'rb') as part:
+        proposal.pdf_file.save(session.filename, _PartFile(part), save=False)
+    discard_part(session)
+    session.delete()
+
+
+def stale_sessions(now=None):
+    """Sessions (open, failed or complete but never attached) older than the TTL."""
+    return UploadSession.objects.filter(created_at__lt=(now or timezone.now()) - session_ttl())
+
+
+def purge_stale_uploads(now=None):
+    """Delete stale upload sessions and their part files. Returns the number removed."""
+    removed = 0
+    for session in stale_sessions(now).only('pk').iterator():
+        discard_part(session)
+        removed += UploadSession.objects.filter(pk=session.pk).delete()[0]
+    return removed
+
+
+def purge_uploads_job(job):
+    """Background job handler (kind 'purge_uploads')."""
+    purge_stale_uploads()
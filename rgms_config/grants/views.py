@@ -1,76 +1,94 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import Proposal, Grant, Budget, Evaluation, ProgressReport
+from users.decorators import role_required
+from .models import ProposalThread, Proposal, ProposalStatus, Grant, Budget, Evaluation, ProgressReport, BackgroundJob, UploadSession, ReviewerAssignment
 from .forms import ProposalForm, ProgressReportForm, EvaluationForm
-from decimal import Decimal
-from django.db.models import Max
-from django.db.models import Sum, Count
-from django.db.models import Max
-from users.models import Notification
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from xhtml2pdf import pisa
-from datetime import datetime
-from django.conf import settings
+from .pagination import keyset_paginate
+from . import accounting, analytics, jobs, matching, search, uploads, workflow
+from .documents import serve_file
+from decimal import Decimal, InvalidOperation
+from datetime import datetime, time, timedelta
+from users.models import Researcher
+from users.notifications import notify, notify_many
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
+from django.utils.text import slugify
+from django.views.decorators.http import require_http_methods, require_POST
+import json
 import os
-
-
-@login_required
+import re
+
+REVIEW_QUEUE_PAGE_SIZE = 25
+SEARCH_PAGE_SIZE = 20
+ASSIGNMENTS_PAGE_SIZE = 50
+# Per proposal, best match first; the pk keeps the keyset cursor unambiguous
+ASSIGNMENT_ORDERING = ('proposal_id', '-score', 'id')
+# HOD pending list orderings; unscored proposals sort last
+HOD_PENDING_SORTS = {
+    'score': (F('eval_mean').desc(nulls_last=True), 'proposalID'),
+    'agreement': (F('eval_variance').asc(nulls_last=True), F('eval_mean').desc(nulls_last=True)),
+    'newest': ('-submissionDate', '-proposalID'),
+}
+REVIEW_QUEUE_STATUSES = [s for s in ProposalStatus if s != ProposalStatus.DRAFT]
+# Last key is unique so the keyset cursor is unambiguous
+REVIEW_QUEUE_SORTS = {
+    'newest': ('-submissionDate', '-proposalID'),
+    'oldest': ('submissionDate', 'proposalID'),
+    'title': ('title', 'proposalID'),
+}
+
+
+@role_required('Researcher')
 def researcher_dashboard(request):
-    if request.user.role != 'Researcher':
-        return redirect('home') 
-    
-    # 1. Fetch ALL proposals for this researcher
-    all_proposals = Proposal.objects.filter(researcher=request.user.researcher)
-    
-    # 2. FILTER: Keep only the latest version of each proposal (Group by Title)
-    latest_proposals_map = {}
-    
-    for p in all_proposals:
-        # If we haven't seen this title yet, or if this version is higher than what we have stored
-        if p.title not in latest_proposals_map:
-            latest_proposals_map[p.title] = p
-        else:
-            if p.version > latest_proposals_map[p.title].version:
-                latest_proposals_map[p.title] = p
-
-    # Convert the dictionary back to a list and sort by Date (newest first)
-    my_proposals = sorted(latest_proposals_map.values(), key=lambda x: x.submissionDate, reverse=True)
+    # Latest version of each proposal (grouped by title), picked in the database
+    my_proposals = Proposal.objects.filter(
+        researcher=request.user.researcher
+    ).latest_versions().order_by('-submissionDate', '-proposalID')
     
     return render(request, 'grants/researcher_dashboard.html', {'proposals': my_proposals})
 
-login_required
+def _completed_upload(request):
+    """The finished chunked upload named by POST['upload_id'], if any."""
+    upload_id = request.POST.get('upload_id')
+    if not upload_id:
+        return None
+    return UploadSession.objects.filter(
+        pk=upload_id, owner_id=request.user.pk, status=UploadSession.COMPLETE
+    ).first()
+
+@role_required('Researcher')
 def submit_proposal(request):
-    if request.user.role != 'Researcher':
-        return redirect('home')
-    
     if request.method == 'POST':
         form = ProposalForm(request.POST, request.FILES)
         if form.is_valid():
             new_proposal = form.save(commit=False)
-            new_proposal.researcher = request.user.researcher
-            
-            existing_proposals = Proposal.objects.filter(
-                researcher=request.user.researcher, 
-                title=new_proposal.title
-            )
-            
-            if existing_proposals.exists():
-                current_max = existing_proposals.aggregate(Max('version'))['version__max']
-                new_proposal.version = current_max + 0.1 
-                messages.success(request, f"New version {new_proposal.version:.1f} submitted successfully!")
-            else:
-                new_proposal.version = 1.0
-                messages.success(request, "Proposal submitted successfully!")
+            upload = _completed_upload(request)
+            if upload:
+                uploads.attach_upload(new_proposal, upload)
+            thread = ProposalThread.objects.for_title(request.user.researcher, new_proposal.title)
+            is_new_version = thread.revision_count > 0
 
             if new_proposal.pdf_file:
-                new_proposal.status = 'Pending'
+                new_proposal.status = ProposalStatus.PENDING
+            else:
+                new_proposal.status = ProposalStatus.DRAFT
+
+            # Assigns the next revision/version and moves the thread head
+            thread.add_revision(new_proposal)
+            workflow.record_created(new_proposal, by=request.user)
+            # Text extraction + search indexing happen in the background
+            jobs.enqueue('index_proposal', {'proposal_id': new_proposal.pk}, requested_by=request.user)
+
+            if is_new_version:
+                messages.success(request, f"New version {new_proposal.version:.1f} submitted successfully!")
             else:
-                new_proposal.status = 'Draft'
+                messages.success(request, "Proposal submitted successfully!")
 
-            new_proposal.save()
             return redirect('researcher_dashboard')
         
         else:
@@ -83,36 +101,32 @@ def submit_proposal(request):
         
     return render(request, 'grants/submit_proposal.html', {'form': form})
 
-@login_required
+@role_required('Researcher')
 def resubmit_proposal(request, proposal_id):
-    if request.user.role != 'Researcher':
-        return redirect('home')
-        
     # Get the original proposal to pre-fill data
-    original_proposal = get_object_or_404(Proposal, pk=proposal_id)
+    original_proposal = get_object_or_404(
+        Proposal.objects.select_related('thread'), pk=proposal_id, researcher=request.user.researcher
+    )
     
     if request.method == 'POST':
         form = ProposalForm(request.POST, request.FILES)
         if form.is_valid():
             new_proposal = form.save(commit=False)
-            new_proposal.researcher = request.user.researcher
-            
-            # FORCE match the title so versioning logic works
-            new_proposal.title = original_proposal.title
-            
-            # CALCULATE NEW VERSION
-            # Find all proposals with this title to get the absolute max version
-            existing_proposals = Proposal.objects.filter(
-                researcher=request.user.researcher, 
-                title=original_proposal.title
+            upload = _completed_upload(request)
+            if upload:
+                uploads.attach_upload(new_proposal, upload)
+
+            # The new version joins the original's thread, keeping its title
+            thread = original_proposal.thread or ProposalThread.objects.for_title(
+                request.user.researcher, original_proposal.title
             )
-            current_max = existing_proposals.aggregate(Max('version'))['version__max']
-            new_proposal.version = current_max + 0.1
-            
+
             # Reset status for review
-            new_proposal.status = 'Pending'
+            new_proposal.status = ProposalStatus.PENDING
             
-            new_proposal.save()
+            thread.add_revision(new_proposal)
+            workflow.record_created(new_proposal, by=request.user)
+            jobs.enqueue('index_proposal', {'proposal_id': new_proposal.pk}, requested_by=request.user)
             messages.success(request, f"Version {new_proposal.version:.1f} submitted successfully! It has replaced the old version on your dashboard.")
             return redirect('researcher_dashboard')
     else:
@@ -128,10 +142,59 @@ def resubmit_proposal(request, proposal_id):
     })
 
 @login_required
-def grant_detail(request, proposal_id):
+@require_POST
+def start_upload(request):
+    """Open a chunked upload session: {filename, size, sha256} -> {upload_id, upload_url, chunk_size}."""
     if request.user.role != 'Researcher':
-        return redirect('home')
+        return JsonResponse({'error': 'Only researchers can upload proposals.'}, status=403)
+
+    try:
+        data = json.loads(request.body or '{}')
+    except ValueError:
+        data = request.POST
+    if not isinstance(data, dict):  # QueryDict is a dict too
+        return JsonResponse({'error': 'Expected a JSON object.'}, status=400)
+    try:
+        session = uploads.start_upload(request.user.researcher, data.get('filename'), data.get('size'), data.get('sha256'))
+    except uploads.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'upload_id': str(session.pk),
+        'upload_url': reverse('upload_session', args=[session.pk]),
+        'chunk_size': uploads.chunk_size(),
+    }, status=201)
+
 
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+@login_required
+def upload_session(request, upload_id):
+    """GET: how far an upload got (to resume). PUT: the next chunk, with a Content-Range header."""
+    session = get_object_or_404(UploadSession, pk=upload_id, owner_id=request.user.pk)
+
+    if request.method == 'PUT':
+        match = CONTENT_RANGE_RE.match(request.headers.get('Content-Range', ''))
+        if not match or int(match.group(3)) != session.size:
+            return JsonResponse({'error': 'Content-Range "bytes start-end/size" is required.'}, status=400)
+        start, end = int(match.group(1)), int(match.group(2))
+        try:
+            # Streams from the request body; request.body is never touched
+            session = uploads.write_chunk(session, start, end - start + 1, request)
+        except uploads.UploadError as e:
+            session.refresh_from_db()
+            return JsonResponse({'error': str(e), 'received': session.received}, status=409)
+    elif request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed.'}, status=405)
+
+    data = {'upload_id': str(session.pk), 'received': session.received, 'size': session.size, 'status': session.status}
+    if session.status == UploadSession.FAILED:
+        data['error'] = 'Checksum mismatch; please upload the file again.'
+        return JsonResponse(data, status=422)
+    return JsonResponse(data)
+
+@role_required('Researcher')
+def grant_detail(request, proposal_id):
     proposal = get_object_or_404(Proposal, pk=proposal_id)
     
     # 1. FIX: Fetch reports explicitly sorted by Newest First (-submissionDate)
@@ -159,11 +222,8 @@ def grant_detail(request, proposal_id):
         'reports': reports # 2. Pass the sorted list to the template
     })
 
-@login_required
+@role_required('Researcher')
 def submit_report(request, proposal_id):
-    if request.user.role != 'Researcher':
-        return redirect('home')
-
     proposal = get_object_or_404(Proposal, pk=proposal_id)
 
     if request.method == 'POST':
@@ -174,19 +234,10 @@ def submit_report(request, proposal_id):
             report.save()
 
             # --- LOGIC: UPDATE BUDGET TOTAL SPENT ---
-            try:
-                # 1. Get the grant and budget associated with this proposal
-                grant = proposal.grant
-                budget = grant.budget
-                
-                # 2. Add the report's expenditure to the total spent
-                if report.expenditure_amount > 0:
-                    budget.totalSpent += report.expenditure_amount
-                    budget.save()
-                    
-            except (Grant.DoesNotExist, Budget.DoesNotExist):
-                # If for some reason grant/budget doesn't exist, ignore financial update
-                pass
+            # Atomic F() update on the budget row; if for some reason the
+            # grant/budget doesn't exist, the financial update is skipped
+            if report.expenditure_amount > 0:
+                accounting.record_expenditure(proposal, report.expenditure_amount, report=report)
 
             messages.success(request, "Progress report submitted successfully.")
             return redirect('grant_detail', proposal_id=proposal.proposalID)
@@ -197,58 +248,205 @@ def submit_report(request, proposal_id):
 
 
 
-@login_required
+@role_required('Reviewer')
 def reviewer_dashboard(request):
-    # 1. Security check: Ensure the user is actually a Reviewer
-    if request.user.role != 'Reviewer':
-        return redirect('home')
-
     # 2. Get proposals. 
     # Reviewers should see everything that is NOT a 'Draft'.
+    # Researcher is joined up front and "evaluated by me" is an EXISTS subquery.
+    proposals_to_review = Proposal.objects.review_queue(request.user.reviewer)
 
-    proposals_to_review = Proposal.objects.all()
-    
-    # Get list of already evaluated proposals
-    evaluated_ids = Evaluation.objects.filter(
-        reviewer=request.user.reviewer
-    ).values_list('proposal_id', flat=True)
+    # 3. Filters
+    try:
+        status = ProposalStatus(int(request.GET.get('status', '')))
+    except ValueError:
+        status = None
+    department = request.GET.get('department', '')
+    unevaluated = request.GET.get('unevaluated') == '1'
+    assigned = request.GET.get('assigned') == '1'
+
+    if status in REVIEW_QUEUE_STATUSES:
+        proposals_to_review = proposals_to_review.filter(status=status)
+    if department:
+        proposals_to_review = proposals_to_review.filter(researcher__department=department)
+    if unevaluated:
+        proposals_to_review = proposals_to_review.filter(evaluated_by_me=False)
+    if assigned:
+        proposals_to_review = proposals_to_review.filter(assigned_to_me=True)
+
+    # 4. Keyset pagination (no OFFSET scans on deep pages)
+    sort = request.GET.get('sort', 'newest')
+    if sort not in REVIEW_QUEUE_SORTS:
+        sort = 'newest'
+    proposals, next_cursor = keyset_paginate(
+        proposals_to_review,
+        REVIEW_QUEUE_SORTS[sort],
+        cursor=request.GET.get('cursor'),
+        page_size=REVIEW_QUEUE_PAGE_SIZE
+    )
+
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_query = params.urlencode()
+
+    departments = Researcher.objects.order_by('department').values_list('department', flat=True).distinct()
 
     context = {
-        'proposals': proposals_to_review,
-        'evaluated_ids': evaluated_ids
+        'proposals': proposals,
+        'next_query': next_query,
+        'is_first_page': not request.GET.get('cursor'),
+        'statuses': REVIEW_QUEUE_STATUSES,
+        'departments': departments,
+        'selected_status': status,
+        'selected_department': department,
+        'unevaluated': unevaluated,
+        'assigned': assigned,
+        'sort': sort,
     }
     return render(request, 'users/reviewer_dashboard.html', context)
 
 
+@role_required('Reviewer')
+def search_proposals(request):
+    """Ranked full-text search over submitted proposals (title, interests, document text)."""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    try:
+        backend = search.get_backend()
+        ranked = True
+    except NotImplementedError:
+        backend = search.SubstringSearchBackend(connection)
+        ranked = False
+    hits, total = [], 0
+    if query:
+        # Only the requested page is fetched from the index, never the whole table
+        hits = backend.search(query, SEARCH_PAGE_SIZE, (page - 1) * SEARCH_PAGE_SIZE, exclude_statuses=[ProposalStatus.DRAFT])
+        total = backend.count(query, exclude_statuses=[ProposalStatus.DRAFT])
+
+    proposals = Proposal.objects.review_queue(request.user.reviewer).in_bulk([hit.proposal_id for hit in hits])
+    results = []
+    for hit in hits:
+        if hit.proposal_id in proposals:
+            proposal = proposals[hit.proposal_id]
+            proposal.rank, proposal.snippet = hit.rank, hit.snippet
+            results.append(proposal)
+
+    has_next = page * SEARCH_PAGE_SIZE < total
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'query': query,
+            'page': page,
+            'total': total,
+            'ranked': ranked,
+            'has_next': has_next,
+            'results': [{
+                'id': p.proposalID,
+                'title': p.title,
+                'researcher': p.researcher.username,
+                'status': p.get_status_display(),
+                'rank': p.rank,
+                'snippet': p.snippet,
+                'evaluate_url': reverse('evaluate_proposal', args=[p.proposalID]),
+            } for p in results],
+        })
+
+    return render(request, 'grants/search_results.html', {
+        'query': query,
+        'results': results,
+        'total': total,
+        'ranked': ranked,
+        'page': page,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if has_next else None,
+    })
+
+
 # HOD PART
 
-@login_required
+@role_required('HOD')
 def hod_dashboard(request):
-    if request.user.role != 'HOD':
-        return redirect('home')
-
-    # Pending
-    proposals = Proposal.objects.filter(status='Review Complete')
+    # Pending, with score summary from the stored evaluation aggregates (no per-row queries)
+    proposals = Proposal.objects.filter(status=ProposalStatus.REVIEW_COMPLETE).select_related('researcher').with_evaluation_stats()
+    sort = request.GET.get('sort', 'score')
+    if sort not in HOD_PENDING_SORTS:
+        sort = 'score'
+    proposals = proposals.order_by(*HOD_PENDING_SORTS[sort])
     
-    # Active
-    active_grants = Grant.objects.all()
+    # Active (proposal, researcher and budget joined in one query)
+    active_grants = Grant.objects.for_listing()
 
     # Rejected History (NEW)
-    rejected_proposals = Proposal.objects.filter(status='Rejected').order_by('-submissionDate')[:5] # Show last 5
+    rejected_proposals = Proposal.objects.filter(status=ProposalStatus.REJECTED).select_related('researcher').order_by('-submissionDate')[:5] # Show last 5
 
     return render(request, 'grants/hod_dashboard.html', {
         'proposals': proposals,
+        'sort': sort,
         'active_grants': active_grants,
         'rejected_proposals': rejected_proposals # Pass to template
     })
 
-@login_required
-def approve_proposal(request, proposal_id):
-    if request.user.role != 'HOD':
-        return redirect('home')
+@role_required('HOD')
+@require_POST
+def broadcast_notification(request):
+    message = request.POST.get('message', '').strip()[:255]
+    if not message:
+        messages.error(request, "Announcement text is required.")
+        return redirect('hod_dashboard')
+
+    researchers = Researcher.objects.filter(is_active=True)
+    department = request.POST.get('department', '').strip()
+    if department:
+        researchers = researchers.filter(department=department)
+
+    # One batched insert; researchers who already got this announcement recently are skipped
+    sent = notify_many(researchers.values_list('pk', flat=True), message)
+    messages.success(request, f"Announcement sent to {len(sent)} researcher(s).")
+    return redirect('hod_dashboard')
+
+@role_required('HOD')
+def reviewer_assignments(request):
+    """Match pending proposals to reviewers by interest similarity, and list who is on what."""
+    if request.method == 'POST':
+        try:
+            per_proposal = max(int(request.POST.get('per_proposal', matching.REVIEWERS_PER_PROPOSAL)), 1)
+        except ValueError:
+            per_proposal = matching.REVIEWERS_PER_PROPOSAL
+        created = matching.save_assignments(matching.plan_assignments(per_proposal=per_proposal), assigned_by=request.user)
+        messages.success(request, f"{created} reviewer assignment(s) created.")
+        return redirect('reviewer_assignments')
+
+    assignments = ReviewerAssignment.objects.filter(proposal__status=ProposalStatus.PENDING).select_related(
+        'proposal__researcher', 'reviewer'
+    )
+    assignments, next_cursor = keyset_paginate(
+        assignments,
+        ASSIGNMENT_ORDERING,
+        cursor=request.GET.get('cursor'),
+        page_size=ASSIGNMENTS_PAGE_SIZE
+    )
+
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_query = params.urlencode()
+
+    return render(request, 'grants/reviewer_assignments.html', {
+        'assignments': assignments,
+        'next_query': next_query,
+        'is_first_page': not request.GET.get('cursor'),
+        'per_proposal': matching.REVIEWERS_PER_PROPOSAL,
+    })
 
+@role_required('HOD')
+def approve_proposal(request, proposal_id):
     proposal = get_object_or_404(Proposal, pk=proposal_id)
-    evaluations = Evaluation.objects.filter(proposal=proposal)
+    evaluations = Evaluation.objects.filter(proposal=proposal).select_related('reviewer')
     hod_user = request.user.hod
 
     if request.method == 'POST':
@@ -257,11 +455,14 @@ def approve_proposal(request, proposal_id):
 
         if action == 'reject':
             # --- REJECTION LOGIC ---
-            proposal.status = 'Rejected'
-            proposal.save()
+            try:
+                workflow.transition(proposal, ProposalStatus.REJECTED, by=request.user)
+            except workflow.InvalidTransition as e:
+                messages.error(request, str(e))
+                return redirect('hod_dashboard')
 
             # Notify Researcher
-            Notification.objects.create(
+            notify(
                 recipient=proposal.researcher,
                 message=f"Update: Your proposal '{proposal.title}' has been REJECTED by the HOD.",
                 link=f"/grant/{proposal.proposalID}/" 
@@ -274,12 +475,35 @@ def approve_proposal(request, proposal_id):
             # --- EXISTING APPROVAL LOGIC ---
             try:
                 allocated_amount = Decimal(request.POST.get('amount'))
-            except (ValueError, TypeError):
+                if allocated_amount <= 0:
+                    raise ValueError
+            except (InvalidOperation, ValueError, TypeError):
                 messages.error(request, "Invalid amount entered.")
                 return redirect('approve_proposal', proposal_id=proposal.proposalID)
 
-            # Validation: Check against Department Budget
-            if allocated_amount > hod_user.total_department_budget:
+            # Create (or update) the Grant. Department funds are checked and
+            # debited in the same atomic UPDATE, so concurrent approvals can't overspend.
+            existing_grant = Grant.objects.filter(proposal=proposal).first()
+            if existing_grant is None and not workflow.allowed(proposal.status, ProposalStatus.APPROVED):
+                messages.error(request, f"A proposal that is {proposal.get_status_display()} can't be approved.")
+                return redirect('hod_dashboard')
+            try:
+                if existing_grant is None:
+                    # Funds and status move together: a lost race on the status undoes the allocation
+                    with transaction.atomic():
+                        accounting.allocate_grant(
+                            hod_user, proposal, allocated_amount,
+                            request.POST.get('start_date'), request.POST.get('end_date')
+                        )
+                        workflow.transition(proposal, ProposalStatus.APPROVED, by=request.user)
+                else:
+                    accounting.reallocate_grant(
+                        hod_user, existing_grant, allocated_amount,
+                        request.POST.get('start_date'), request.POST.get('end_date')
+                    )
+            except accounting.InsufficientFunds:
+                # Validation: Check against Department Budget
+                hod_user.refresh_from_db(fields=['total_department_budget'])
                 error_message = f"Insufficient funds. You tried to allocate RM{allocated_amount}, but have only RM{hod_user.total_department_budget}."
                 return render(request, 'grants/approve_form.html', {
                     'proposal': proposal, 
@@ -287,31 +511,12 @@ def approve_proposal(request, proposal_id):
                     'error_message': error_message, 
                     'hod_budget': hod_user.total_department_budget
                 })
-
-            # Create Grant
-            grant, created = Grant.objects.update_or_create(
-                proposal=proposal,
-                defaults={
-                    'totalAllocatedAmount': allocated_amount,
-                    'startDate': request.POST.get('start_date'),
-                    'endDate': request.POST.get('end_date')
-                }
-            )
+            except workflow.InvalidTransition as e:
+                messages.error(request, str(e))
+                return redirect('hod_dashboard')
             
-            if created:
-                hod_user.total_department_budget -= allocated_amount
-                hod_user.save()
-
-                Budget.objects.create(
-                    grant=grant,
-                    totalSpent=0.0,
-                    expendituresDetails="Initial allocation."
-                )
-                
-                proposal.status = 'Approved'
-                proposal.save()
-
-                Notification.objects.create(
+            if existing_grant is None:
+                notify(
                     recipient=proposal.researcher,
                     message=f"Good news! Your proposal '{proposal.title}' has been APPROVED.",
                     link=f"/grant/{proposal.proposalID}/"
@@ -329,11 +534,8 @@ def approve_proposal(request, proposal_id):
         'hod_budget': hod_user.total_department_budget
     })
 
-@login_required
+@role_required('HOD')
 def project_detail(request, grant_id):
-    if request.user.role != 'HOD':
-        return redirect('home')
-
     grant = get_object_or_404(Grant, pk=grant_id)
     proposal = grant.proposal
 
@@ -354,20 +556,32 @@ def project_detail(request, grant_id):
 
     if request.method == 'POST':
         action_request = request.POST.get('feedback')
-        status_flag = request.POST.get('status_flag') # e.g., 'On Track' or 'Needs Intervention'
+        try:
+            status_flag = ProposalStatus(int(request.POST.get('status_flag', '')))
+        except ValueError:
+            status_flag = None
+
+        if action_request and status_flag not in workflow.MONITORING_STATUSES:
+            messages.error(request, "Choose On Track or Needs Intervention.")
+        elif action_request:
+            # Validate the move before anything is written
+            try:
+                workflow.transition(proposal, status_flag, by=request.user)
+            except workflow.InvalidTransition as e:
+                messages.error(request, str(e))
+                return redirect('project_detail', grant_id=grant.pk)
 
-        if action_request:
             # 1. LOGIC: Choose the prefix based on the status
-            if status_flag == 'Needs Intervention':
+            if status_flag == ProposalStatus.NEEDS_INTERVENTION:
                 prefix = "URGENT INTERVENTION"
                 milestone_text = "⚠ Status set to Needs Intervention"
                 # More alarming notification message
                 notif_msg = f"URGENT: HOD requires intervention on '{proposal.title}'. See feedback."
             else:
                 prefix = "HOD FEEDBACK"
-                milestone_text = f"✔ Status set to {status_flag}"
+                milestone_text = f"✔ Status set to {status_flag.label}"
                 # Standard notification message
-                notif_msg = f"Update: HOD sent feedback for '{proposal.title}': {status_flag}"
+                notif_msg = f"Update: HOD sent feedback for '{proposal.title}': {status_flag.label}"
 
             # 2. Create the Report with the correct label
             ProgressReport.objects.create(
@@ -375,18 +589,15 @@ def project_detail(request, grant_id):
                 content=f"{prefix}: {action_request}",
                 milestonesAchieved=milestone_text 
             )
-            
-            proposal.status = status_flag
-            proposal.save()
 
             # --- NOTIFICATION TRIGGER ---
-            Notification.objects.create(
+            notify(
                 recipient=proposal.researcher,
                 message=notif_msg,
                 link=f"/grant/{proposal.proposalID}/"
             )
             
-            messages.success(request, f"Feedback sent and status updated to {status_flag}.")
+            messages.success(request, f"Feedback sent and status updated to {status_flag.label}.")
             return redirect('hod_dashboard')
 
     return render(request, 'grants/project_monitoring_detail.html', {
@@ -396,11 +607,20 @@ def project_detail(request, grant_id):
         'time_progress': time_progress
     })
 
-@login_required
-def track_budget(request, grant_id):
-    if request.user.role != 'HOD':
-        return redirect('home')
+def _query_date(request, name):
+    """Parse an optional YYYY-MM-DD query parameter; bad dates drop the filter."""
+    raw = request.GET.get(name) or ''
+    try:
+        value = parse_date(raw)
+    except ValueError:
+        value = None
+    if raw and value is None:
+        messages.warning(request, f"Ignored invalid '{name}' date: {raw}.")
+    return value
 
+
+@role_required('HOD')
+def track_budget(request, grant_id):
     grant = get_object_or_404(Grant, pk=grant_id)
     budget = get_object_or_404(Budget, grant=grant) 
 
@@ -421,32 +641,33 @@ def track_budget(request, grant_id):
         try:
             additional_funds = Decimal(request.POST.get('top_up_amount'))
             hod_user = request.user.hod
-            
 
-            if hod_user.total_department_budget >= additional_funds:
-                grant.totalAllocatedAmount += additional_funds
-                grant.save()
-                
-                # budget.remainingBalance += additional_funds
-                # budget.save()
-                
-                hod_user.total_department_budget -= additional_funds
-                hod_user.save()
-
-                # --- NOTIFICATION 3: BUDGET TOP-UP ---
-                Notification.objects.create(
-                    recipient=grant.proposal.researcher,
-                    message=f"Budget Alert: Top-up of RM{additional_funds} approved for '{grant.proposal.title}'.",
-                    link=f"/grant/{grant.proposal.proposalID}/"
-                )
-                
-                messages.success(request, f"Successfully added ${additional_funds} to the project budget.")
-                return redirect('track_budget', grant_id=grant.grantID)
-            else:
-                messages.error(request, "Insufficient department funds for this top-up.")
-        except ValueError:
+            # Check-and-debit of department funds is one atomic UPDATE
+            accounting.top_up_grant(hod_user, grant, additional_funds)
+
+            # --- NOTIFICATION 3: BUDGET TOP-UP ---
+            notify(
+                recipient=grant.proposal.researcher,
+                message=f"Budget Alert: Top-up of RM{additional_funds} approved for '{grant.proposal.title}'.",
+                link=f"/grant/{grant.proposal.proposalID}/"
+            )
+            
+            messages.success(request, f"Successfully added ${additional_funds} to the project budget.")
+            return redirect('track_budget', grant_id=grant.grantID)
+        except accounting.InsufficientFunds:
+            messages.error(request, "Insufficient department funds for this top-up.")
+        except (InvalidOperation, ValueError, TypeError):
              messages.error(request, "Invalid amount entered.")
 
+    # BUDGET HISTORY: recent ledger entries plus totals for an optional period.
+    # Both are range scans on the (grant, created_at) ledger index.
+    period_start = _query_date(request, 'from')
+    period_end = _query_date(request, 'to')
+    ledger = grant.ledger_entries.between(
+        timezone.make_aware(datetime.combine(period_start, time.min)) if period_start else None,
+        timezone.make_aware(datetime.combine(period_end + timedelta(days=1), time.min)) if period_end else None
+    )
+
     return render(request, 'grants/budget_detail.html', {
         'grant': grant,
         'budget': budget,
@@ -454,33 +675,36 @@ def track_budget(request, grant_id):
         'remainingbalance': budget.remainingBalance,
         'usage_percent': round(usage_percent, 1),
         'alert_triggered': alert_triggered,
-        'hod_budget': request.user.hod.total_department_budget
+        'hod_budget': request.user.hod.total_department_budget,
+        'ledger_entries': ledger.order_by('-created_at')[:20],
+        'period_totals': ledger.totals() if (period_start or period_end) else None,
+        'period_start': period_start,
+        'period_end': period_end
     })
 
 
-@login_required
+@role_required('HOD')
 def hod_analytics(request):
-    if request.user.role != 'HOD':
-        return redirect('home')
+    # Counts and totals come from the precomputed snapshot row
+    stats = analytics.snapshot_analytics()
 
     # --- 1. BUDGET CALCULATIONS ---
     # Sum all allocated grant amounts (money committed from department budget)
-    allocation_data = Grant.objects.aggregate(total=Sum('totalAllocatedAmount'))
-    total_spent = allocation_data['total'] or 0
+    total_spent = stats['total_allocated']
     
     # Calculate remaining based on the HOD's limit
     remaining_funds = request.user.hod.total_department_budget
 
     # --- 2. KPI: ACTIVE GRANTS ---
     # We count grants that are currently running
-    active_grants_count = Grant.objects.count()
+    active_grants_count = stats['active_grants']
 
     # --- 3. SUCCESS METRICS (Accept vs Reject) ---
-    total_props = Proposal.objects.count()
-    approved_props = Proposal.objects.filter(status='Approved').count()
-    rejected_props = Proposal.objects.filter(status='Rejected').count()
-    on_tracked_props = Proposal.objects.filter(status='On Track').count()
-    needs_intervention_props = Proposal.objects.filter(status='Needs Intervention').count()
+    total_props = stats['total']
+    approved_props = stats['approved']
+    rejected_props = stats['rejected']
+    on_tracked_props = stats['on_track']
+    needs_intervention_props = stats['needs_intervention']
 
     if total_props > 0:
         approval_rate = round(((needs_intervention_props + on_tracked_props + approved_props) / total_props * 100), 1)
@@ -490,6 +714,12 @@ def hod_analytics(request):
         approval_rate = 0
         rejection_rate = 0
 
+    # --- 4. TIME IN STAGE (from the transition history, not the reports) ---
+    time_in_state = [
+        {'status': status, 'days': seconds / 86400, 'stays': stays}
+        for status, (seconds, stays) in workflow.time_in_state().items()
+    ]
+
     return render(request, 'grants/hod_analytics.html', {
         'total_spent': float(total_spent),
         'remaining_funds': float(remaining_funds),
@@ -497,140 +727,86 @@ def hod_analytics(request):
         'approval_rate': approval_rate,
         'rejection_rate': rejection_rate,
         'on_tracked_props': on_tracked_props,
-        'needs_intervention_props': needs_intervention_props
+        'needs_intervention_props': needs_intervention_props,
+        'time_in_state': time_in_state,
     })
 
 
-@login_required
+@role_required('HOD')
+@require_http_methods(['GET', 'POST'])
 def export_hod_analytics_pdf(request):
-    """Export department analytics data as a PDF report."""
-    if request.user.role != 'HOD':
-        return redirect('home')
-    
-    # --- REUSE DATA CALCULATION LOGIC FROM hod_analytics ---
-    # 1. Budget calculations
-    allocation_data = Grant.objects.aggregate(total=Sum('totalAllocatedAmount'))
-    total_spent = allocation_data['total'] or 0
-    remaining_funds = request.user.hod.total_department_budget
-    
-    # Calculate total budget for display
-    total_budget = float(total_spent) + float(remaining_funds)
-    
-    # Calculate budget utilization percentage
-    if total_budget > 0:
-        budget_utilization = (float(total_spent) / total_budget) * 100
-    else:
-        budget_utilization = 0
-    
-    # 2. Active grants KPI
-    active_grants_count = Grant.objects.count()
-    
-    # 3. Success metrics
-    total_props = Proposal.objects.count()
-    approved_props = Proposal.objects.filter(status='Approved').count()
-    rejected_props = Proposal.objects.filter(status='Rejected').count()
-    
-    if total_props > 0:
-        approval_rate = round((approved_props / total_props) * 100, 1)
-        rejection_rate = round(rejected_props / total_props * 100, 1)
-    else:
-        approval_rate = 0
-        rejection_rate = 0
-    
-    # Read ONLY PDF-specific CSS from style.css file
-    css_path = os.path.join(settings.BASE_DIR, 'static', 'css', 'style.css')
-    css_content = ''
-    try:
-        with open(css_path, 'r', encoding='utf-8') as f:
-            full_css = f.read()
-            # Extract only the PDF EXPORT STYLES section
-            pdf_start = full_css.find('/* =========================================')
-            pdf_start = full_css.find('PDF EXPORT STYLES', pdf_start)
-            if pdf_start != -1:
-                # Find the start of the comment block
-                section_start = full_css.rfind('/*', 0, pdf_start)
-                # Get everything from that point onward
-                css_content = full_css[section_start:]
-    except Exception as e:
-        # Fallback CSS if file can't be read
-        css_content = '''
-        @page { size: A4; margin: 2cm; }
-        .pdf-body { font-family: Arial, sans-serif; font-size: 12pt; color: #333; }
-        .pdf-header { text-align: center; margin-bottom: 30px; border-bottom: 3px solid #2563eb; padding-bottom: 15px; }
-        .pdf-header h1 { color: #2563eb; margin: 0; font-size: 24pt; }
-        .pdf-header p { color: #666; margin: 5px 0 0 0; font-size: 11pt; }
-        .pdf-report-date { text-align: right; color: #666; font-size: 10pt; margin-bottom: 20px; }
-        .pdf-section { margin-bottom: 25px; }
-        .pdf-section-title { font-size: 16pt; font-weight: bold; color: #2563eb; margin-bottom: 10px; padding-bottom: 5px; border-bottom: 2px solid #e5e7eb; }
-        .pdf-kpi-table { width: 100%; border-collapse: collapse; margin-bottom: 20px; }
-        .pdf-kpi-table th { background-color: #f3f4f6; padding: 12px; text-align: left; font-weight: bold; border: 1px solid #d1d5db; }
-        .pdf-kpi-table td { padding: 12px; border: 1px solid #d1d5db; }
-        .pdf-kpi-table tr:nth-child(even) { background-color: #f9fafb; }
-        .pdf-value-positive { color: #10b981; font-weight: bold; }
-        .pdf-value-negative { color: #ef4444; font-weight: bold; }
-        .pdf-value-primary { color: #2563eb; font-weight: bold; }
-        .pdf-stat-grid { display: table; width: 100%; margin-top: 15px; }
-        .pdf-stat-row { display: table-row; }
-        .pdf-stat-label { display: table-cell; padding: 8px; font-weight: bold; width: 60%; }
-        .pdf-stat-value { display: table-cell; padding: 8px; text-align: right; }
-        .pdf-footer { margin-top: 40px; padding-top: 15px; border-top: 1px solid #d1d5db; text-align: center; color: #666; font-size: 9pt; }
-        '''
-    
-    # Prepare context for PDF template
-    context = {
-        'total_spent': float(total_spent),
-        'remaining_funds': float(remaining_funds),
-        'total_budget': total_budget,
-        'budget_utilization': budget_utilization,
-        'active_grants_count': active_grants_count,
-        'approval_rate': approval_rate,
-        'rejection_rate': rejection_rate,
-        'current_date': datetime.now().strftime('%B %d, %Y at %I:%M %p'),
-        'css_content': css_content  # Pass only PDF CSS to template
-    }
-    
-    # Render HTML template with context
-    html = render_to_string('grants/hod_analytics_pdf.html', context)
-    
-    # Create PDF
-    response = HttpResponse(content_type='application/pdf')
-    filename = f"Department_Analytics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    # Convert HTML to PDF
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    
-    if pisa_status.err:
-        return HttpResponse('Error generating PDF', status=500)
-    
-    return response
-
+    """
+    Queue a PDF export of the department analytics; rendering runs in the background.
+    POST answers 202 with the job; GET (old bookmarks and scripts) redirects to its status.
+    """
+    job = jobs.enqueue('analytics_pdf', {'hod_id': request.user.pk}, requested_by=request.user)
+    if request.method == 'GET':
+        return redirect('export_job_status', job_id=job.pk)
+    return JsonResponse({
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': reverse('export_job_status', args=[job.pk]),
+    }, status=202)
 
 
+@login_required
+def export_job_status(request, job_id):
+    """Poll an export job; includes the download URL once the file is ready."""
+    job = get_object_or_404(BackgroundJob, pk=job_id, requested_by=request.user)
+    data = {'job_id': job.pk, 'status': job.status}
+    if job.status == BackgroundJob.DONE:
+        data['download_url'] = reverse('export_job_download', args=[job.pk])
+    elif job.status == BackgroundJob.FAILED:
+        data['error'] = 'Error generating PDF'
+    return JsonResponse(data)
 
 
 @login_required
+def export_job_download(request, job_id):
+    job = get_object_or_404(BackgroundJob, pk=job_id, requested_by=request.user, status=BackgroundJob.DONE)
+    # The file may have been purged (grants.jobs.purge_finished_jobs) or lost
+    if not job.result_file or not job.result_file.storage.exists(job.result_file.name):
+        raise Http404("This export is no longer available.")
+    return FileResponse(
+        job.result_file.open('rb'),
+        as_attachment=True,
+        filename=os.path.basename(job.result_file.name),
+        content_type='application/pdf'
+    )
+
+
+@role_required('Reviewer')
 def evaluate_proposal(request, proposal_id):
-    # Security: Ensure only Reviewers can access
-    if request.user.role != 'Reviewer':
-        return redirect('home')
-
     proposal = get_object_or_404(Proposal, pk=proposal_id)
 
+    # One evaluation per reviewer (enforced by the unique_evaluation_per_reviewer constraint)
+    if Evaluation.objects.filter(proposal=proposal, reviewer=request.user.reviewer).exists():
+        messages.info(request, f"You have already evaluated {proposal.title}.")
+        return redirect('view_evaluation', proposal_id=proposal.proposalID)
+    if not workflow.allowed(proposal.status, ProposalStatus.REVIEW_COMPLETE):
+        messages.error(request, f"{proposal.title} is {proposal.get_status_display()} and no longer open for review.")
+        return redirect('reviewer_dashboard')
+
     if request.method == 'POST':
         form = EvaluationForm(request.POST)
         if form.is_valid():
             evaluation = form.save(commit=False)
-            evaluation.proposal = proposal
             evaluation.reviewer = request.user.reviewer # Link to Reviewer profile
-            evaluation.save()
-
-            # Update status so HOD can see it
-            proposal.status = 'Review Complete'
-            proposal.save()
+            # Saves the evaluation, updates the score aggregates and moves the
+            # proposal to Review Complete so the HOD can see it, all or nothing
+            try:
+                with transaction.atomic():
+                    proposal.add_evaluation(evaluation)
+                    workflow.transition(proposal, ProposalStatus.REVIEW_COMPLETE, by=request.user)
+            except IntegrityError:
+                # Double submit: the first request already saved it
+                return redirect('view_evaluation', proposal_id=proposal.proposalID)
+            except workflow.InvalidTransition as e:
+                messages.error(request, str(e))
+                return redirect('reviewer_dashboard')
 
             # --- NOTIFICATION TRIGGER ---
-            Notification.objects.create(
+            notify(
                 recipient=proposal.researcher,
                 message=f"Update: A reviewer has evaluated '{proposal.title}'.",
                 link=f"/grant/{proposal.proposalID}/"
@@ -648,11 +824,8 @@ def evaluate_proposal(request, proposal_id):
 
 
 
-@login_required
+@role_required('Reviewer')
 def view_evaluation(request, proposal_id):
-    if request.user.role != 'Reviewer':
-        return redirect('home')
-
     proposal = get_object_or_404(Proposal, pk=proposal_id)
     
     # Fetch the evaluation specifically created by this reviewer for this proposal
@@ -661,4 +834,29 @@ def view_evaluation(request, proposal_id):
     return render(request, 'grants/view_evaluation.html', {
         'proposal': proposal, 
         'evaluation': evaluation
-    })
\ No newline at end of file
+    })
+
+@login_required
+def proposal_document(request, proposal_id):
+    proposal = get_object_or_404(Proposal.objects.select_related('researcher'), pk=proposal_id)
+
+    # Owner, any HOD, and reviewers once it has been submitted
+    role = request.user.role
+    if role == 'Researcher':
+        allowed = proposal.researcher_id == request.user.pk
+    elif role == 'Reviewer':
+        allowed = proposal.status != ProposalStatus.DRAFT
+    else:
+        allowed = role == 'HOD'
+    if not allowed:
+        return redirect('home')
+
+    if not proposal.pdf_file:
+        raise Http404("No document attached.")
+    try:
+        # Stored under its content hash; give the download a readable name
+        extension = os.path.splitext(proposal.pdf_file.name)[1]
+        filename = f"{slugify(proposal.title) or 'proposal'}-v{proposal.version:.1f}{extension}"
+        return serve_file(request, proposal.pdf_file, filename=filename)
+    except FileNotFoundError:
+        raise Http404("Document file is missing.")
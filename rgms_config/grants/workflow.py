@@ -0,0 +1,87 @@
+"""
+The proposal workflow.
+
+Proposal.status only changes through transition(): the move is checked
+against TRANSITIONS, applied with a conditional UPDATE (so two requests can't
+both move a proposal out of the same state), appended to ProposalTransition
+and mirrored into the analytics snapshot, all in one transaction.
+"""
+from django.db import transaction
+from django.db.models import Avg, Count
+from django.utils import timezone
+
+from . import analytics
+from .models import Proposal, ProposalStatus, ProposalTransition
+
+# Allowed moves. A state listed as its own target is a harmless no-op
+# (e.g. another reviewer's evaluation of a proposal already in Review Complete).
+TRANSITIONS = {
+    ProposalStatus.DRAFT: {ProposalStatus.PENDING},
+    ProposalStatus.PENDING: {ProposalStatus.REVIEW_COMPLETE, ProposalStatus.REJECTED},
+    ProposalStatus.REVIEW_COMPLETE: {ProposalStatus.REVIEW_COMPLETE, ProposalStatus.APPROVED, ProposalStatus.REJECTED},
+    ProposalStatus.APPROVED: {ProposalStatus.ON_TRACK, ProposalStatus.NEEDS_INTERVENTION},
+    ProposalStatus.ON_TRACK: {ProposalStatus.ON_TRACK, ProposalStatus.NEEDS_INTERVENTION},
+    ProposalStatus.NEEDS_INTERVENTION: {ProposalStatus.ON_TRACK, ProposalStatus.NEEDS_INTERVENTION},
+    ProposalStatus.REJECTED: set(),
+}
+
+# States a HOD can set from the monitoring page
+MONITORING_STATUSES = (ProposalStatus.ON_TRACK, ProposalStatus.NEEDS_INTERVENTION)
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def allowed(current, new):
+    return new in TRANSITIONS.get(current, ())
+
+
+def record_created(proposal, by=None):
+    """Start the history of a newly saved proposal."""
+    ProposalTransition.objects.create(proposal=proposal, to_status=proposal.status, changed_by=by)
+    analytics.record_proposal_created(proposal.status)
+
+
+def transition(proposal, status, by=None):
+    """
+    Move `proposal` to `status` and record it. Returns False when it is
+    already there (an allowed no-op). Raises InvalidTransition for a move the
+    workflow doesn't allow, or when another request changed the status first.
+    """
+    status = ProposalStatus(status)
+    current = ProposalStatus(proposal.status)
+    if not allowed(current, status):
+        raise InvalidTransition(f"A proposal can't go from {current.label} to {status.label}.")
+    if status == current:
+        return False
+
+    now = timezone.now()
+    with transaction.atomic():
+        if not Proposal.objects.filter(pk=proposal.pk, status=current).update(status=status):
+            proposal.refresh_from_db(fields=['status'])
+            raise InvalidTransition(f"This proposal was just moved to {proposal.get_status_display()}.")
+        entered_at = (
+            ProposalTransition.objects.filter(proposal=proposal)
+            .order_by('-changed_at').values_list('changed_at', flat=True).first()
+        )
+        ProposalTransition.objects.create(
+            proposal=proposal, from_status=current, to_status=status, changed_by=by, changed_at=now,
+            seconds_in_previous=max(int((now - entered_at).total_seconds()), 0) if entered_at else None,
+        )
+        analytics.record_status_change(current, status)
+    proposal.status = status
+    return True
+
+
+def time_in_state(since=None):
+    """
+    Average time proposals spent in each state before leaving it:
+    {ProposalStatus: (average seconds, number of stays)}. Stays still in
+    progress aren't counted. `since` limits it to stays that ended after then.
+    """
+    stays = ProposalTransition.objects.filter(from_status__isnull=False, seconds_in_previous__isnull=False)
+    if since is not None:
+        stays = stays.filter(changed_at__gte=since)
+    rows = stays.values('from_status').annotate(average=Avg('seconds_in_previous'), stays=Count('pk')).order_by('from_status')
+    return {ProposalStatus(row['from_status']): (row['average'], row['stays']) for row in rows}
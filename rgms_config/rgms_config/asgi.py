@@ -3,6 +3,10 @@ ASGI config for rgms_config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn rgms_config.asgi:application``) to
+enable the live notification stream at /notifications/stream/, which keeps one
+idle connection per user open without tying up a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,6 +34,14 @@ ALLOWED_HOSTS = []
 
 AUTH_USER_MODEL = 'users.User'
 
+# Loads the user's Researcher/Reviewer/HOD row with the session user (one query per request).
+# ModelBackend stays listed so sessions created before RoleModelBackend (which store its
+# path) remain valid; Django records RoleModelBackend for every new login.
+AUTHENTICATION_BACKENDS = [
+    'users.backends.RoleModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -70,6 +80,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'users.context_processors.user_notifications',
+                'grants.context_processors.workflow',
             ],
         },
     },
@@ -81,13 +92,146 @@ WSGI_APPLICATION = 'rgms_config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# RGMS_DB_PROFILE picks the database:
+#   sqlite   - the local db.sqlite3 file (default). WAL lets readers carry on while
+#              one writer commits; synchronous=NORMAL only fsyncs at checkpoints (safe
+#              in WAL mode, the last commits can be lost on power failure, never corrupted).
+#   postgres - RGMS_DB_NAME / _USER / _PASSWORD / _HOST / _PORT. Needs psycopg 3
+#              (`pip install "psycopg[binary,pool]"`). With RGMS_DB_POOL=1 each worker
+#              process keeps a psycopg connection pool; otherwise connections are
+#              reused for CONN_MAX_AGE seconds. (Django doesn't allow both at once.)
+# `manage.py loadtest` exercises submit/evaluate/approve concurrently against either.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # KiB when negative, i.e. 64 MiB
+    'temp_store': 'MEMORY',
+}
+
+DATABASE_PROFILES = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Concurrent writers wait for the lock (busy timeout, seconds) instead of failing
+            # straight away; IMMEDIATE takes the write lock at BEGIN so transactions can't
+            # deadlock upgrading it.
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in SQLITE_PRAGMAS.items()),
+        },
+        'TEST': {
+            # File-backed so threaded tests get real locking (shared-cache :memory: can't wait on locks)
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    'postgres': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('RGMS_DB_NAME', 'rgms'),
+        'USER': os.environ.get('RGMS_DB_USER', 'rgms'),
+        'PASSWORD': os.environ.get('RGMS_DB_PASSWORD', ''),
+        'HOST': os.environ.get('RGMS_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('RGMS_DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('RGMS_DB_CONN_MAX_AGE', 600)),
+        # Persistent connections are pinged before reuse so a restarted server doesn't 500 a request
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Fail a request stuck behind a row lock instead of hanging a worker
+            'options': '-c lock_timeout=10000 -c statement_timeout=30000',
+        },
+    },
+}
+
+DB_PROFILE = os.environ.get('RGMS_DB_PROFILE', 'sqlite')
+if DB_PROFILE not in DATABASE_PROFILES:
+    raise ImproperlyConfigured(f"RGMS_DB_PROFILE must be one of {', '.join(DATABASE_PROFILES)}, not {DB_PROFILE!r}.")
+
+DATABASES = {'default': DATABASE_PROFILES[DB_PROFILE]}
+
+if DB_PROFILE == 'postgres' and os.environ.get('RGMS_DB_POOL', '') in ('1', 'true', 'yes'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('RGMS_DB_POOL_MIN', 2)),
+        'max_size': int(os.environ.get('RGMS_DB_POOL_MAX', 10)),
+        'timeout': 10,
+    }
+
+
+# Cache (notification badge counters, ...)
+# LocMemCache is per process; with several worker processes use a shared backend
+# (e.g. FileBasedCache or Redis) so every worker sees the same counters.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rgms-default',
     }
 }
 
+# Sessions. RGMS_SESSION_MODE picks the engine:
+#   db             - a django_session row is read on every request (default)
+#   cached_db      - reads come from CACHES, writes still go through to the database
+#   signed_cookies - no server-side state; the session lives in a signed cookie, so
+#                    logging out can't revoke a copied cookie before it expires
+# cached_db relies on the cache being shared by every worker process (see CACHES):
+# with a per-process LocMemCache, logging out clears the session in one process only
+# and the others keep serving it. That pairing is refused unless RGMS_SINGLE_PROCESS=1
+# declares a single-process deployment (e.g. runserver).
+# Expired rows (db / cached_db) are removed with `manage.py purge_sessions`.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_MODE = os.environ.get('RGMS_SESSION_MODE', 'db')
+SINGLE_PROCESS = os.environ.get('RGMS_SINGLE_PROCESS') == '1'
+if SESSION_MODE not in SESSION_ENGINES:
+    raise ImproperlyConfigured(f"RGMS_SESSION_MODE must be one of {', '.join(SESSION_ENGINES)}, not {SESSION_MODE!r}.")
+if (SESSION_MODE == 'cached_db' and not SINGLE_PROCESS
+        and CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'):
+    raise ImproperlyConfigured(
+        "RGMS_SESSION_MODE=cached_db needs a cache shared by all worker processes, not LocMemCache; "
+        "configure CACHES or set RGMS_SINGLE_PROCESS=1 for a single-process deployment."
+    )
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+
+# Chunked proposal uploads (grants.uploads): largest accepted file and the chunk
+# size suggested to the browser, in bytes. Part files go to MEDIA_ROOT/uploads/partial
+# (same filesystem as MEDIA_ROOT, so finished uploads are moved, not copied).
+UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+# Upload sessions not attached to a proposal within this many seconds are removed
+# by `manage.py purge_uploads` (or the 'purge_uploads' background job)
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+
+# Department codes (HOD/Reviewer deptID) and the names researchers may type for
+# them; users.departments maps both onto the code, e.g. for reviewer conflicts.
+DEPARTMENTS = {
+    'CS': ['Computer Science', 'Computing', 'Computing and Informatics'],
+    'ENG': ['Engineering'],
+    'BIO': ['Biology', 'Biological Sciences', 'Life Sciences'],
+    'MATH': ['Mathematics', 'Mathematical Sciences'],
+    'PHY': ['Physics'],
+    'BUS': ['Business', 'Management', 'Business and Management'],
+}
+
+# Proposal documents are streamed by grants.documents. Set to 'X-Accel-Redirect'
+# (nginx) or 'X-Sendfile' (Apache/lighttpd) to hand the transfer to the web server;
+# for nginx, DOCUMENT_SENDFILE_PREFIX must be an `internal` location aliasing MEDIA_ROOT.
+DOCUMENT_SENDFILE_HEADER = None
+DOCUMENT_SENDFILE_PREFIX = '/protected-media/'
+
+# How long cached notification counts/lists live before being recomputed (seconds)
+NOTIFICATION_CACHE_TIMEOUT = 3600
+
+# notify_many() skips recipients who got the same message within this window (seconds)
+NOTIFICATION_COALESCE_SECONDS = 600
+
+# Read notifications older than this are removed by `manage.py purge_notifications`
+NOTIFICATION_RETENTION_DAYS = 90
+# Copy them to ArchivedNotification instead of just deleting
+NOTIFICATION_RETENTION_ARCHIVE = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -129,4 +273,16 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
-LOGIN_REDIRECT_URL = 'dashboard_dispatch'
\ No newline at end of file
+LOGIN_REDIRECT_URL = 'dashboard_dispatch'
+
+# Background jobs (PDF exports). By default they run on an in-process thread pool;
+# set BACKGROUND_JOBS_IN_PROCESS = False and run `python manage.py run_job_worker` instead.
+BACKGROUND_JOBS_IN_PROCESS = True
+BACKGROUND_JOB_WORKERS = 2
+
+# A job RUNNING for longer than this (seconds) is presumed lost with its worker and
+# requeued by the next worker pass, up to BACKGROUND_JOB_MAX_ATTEMPTS claims in all
+BACKGROUND_JOB_STALE_AFTER = 30 * 60
+BACKGROUND_JOB_MAX_ATTEMPTS = 3
+# Finished jobs (and their export files) are removed after this many days by `manage.py purge_jobs`
+BACKGROUND_JOB_RETENTION_DAYS = 7
\ No newline at end of file
@@ -42,6 +42,7 @@ urlpatterns = [
 
     path('reviewer/evaluate/<int:proposal_id>/', grant_views.evaluate_proposal, name='evaluate_proposal'),
     path('reviewer/view/<int:proposal_id>/', grant_views.view_evaluation, name='view_evaluation'),
+    path('reviewer/search/', grant_views.search_proposals, name='search_proposals'),
     
     # --- RESEARCHER FEATURES ---
     # Register a new account
@@ -55,21 +56,29 @@ urlpatterns = [
     path('submit-proposal/', grant_views.submit_proposal, name='submit_proposal'),
     # NEW: Resubmit Route
     path('resubmit/<int:proposal_id>/', grant_views.resubmit_proposal, name='resubmit_proposal'),
+    path('proposal/<int:proposal_id>/document/', grant_views.proposal_document, name='proposal_document'),
+    path('uploads/', grant_views.start_upload, name='start_upload'),
+    path('uploads/<uuid:upload_id>/', grant_views.upload_session, name='upload_session'),
 
     path('grant/<int:proposal_id>/', grant_views.grant_detail, name='grant_detail'),    
     path('grant/report/<int:proposal_id>/', grant_views.submit_report, name='submit_report'),
 
 	# --- HOD FEATURES ---
 	path('hod/dashboard/', grant_views.hod_dashboard, name='hod_dashboard'),
+    path('hod/announce/', grant_views.broadcast_notification, name='broadcast_notification'),
+    path('hod/assignments/', grant_views.reviewer_assignments, name='reviewer_assignments'),
     path('hod/approve/<int:proposal_id>/', grant_views.approve_proposal, name='approve_proposal'),
     path('hod/monitor/<int:grant_id>/', grant_views.project_detail, name='project_detail'),
     path('hod/budget/<int:grant_id>/', grant_views.track_budget, name='track_budget'),
     path('hod/analytics/', grant_views.hod_analytics, name='hod_analytics'),
     path('hod/analytics/export-pdf/', grant_views.export_hod_analytics_pdf, name='export_hod_analytics_pdf'),
+    path('hod/exports/<int:job_id>/', grant_views.export_job_status, name='export_job_status'),
+    path('hod/exports/<int:job_id>/download/', grant_views.export_job_download, name='export_job_download'),
 
 
     # --- NOTIFICATIONS ---
     path('notifications/read/', user_views.mark_notifications_read, name='mark_notifications_read'),
+    path('notifications/stream/', user_views.notification_stream, name='notification_stream'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,18 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+
+
+class RoleModelBackend(ModelBackend):
+    """
+    ModelBackend that loads the session user together with their role row
+    (Researcher / Reviewer / HOD) in one query, so `request.user.researcher`
+    and friends don't each cost an extra JOIN query later in the request.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User.objects.select_related(*User.ROLE_PROFILES.values()).get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,19 @@
+from functools import wraps
+
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect
+
+
+def role_required(*roles):
+    """
+    login_required plus a role check: logged-in users whose role isn't one of
+    `roles` are sent home, the same as the old inline `request.user.role` guards.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.user.role not in roles:
+                return redirect('home')
+            return view_func(request, *args, **kwargs)
+        return login_required(wrapper)
+    return decorator
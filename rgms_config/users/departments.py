@@ -0,0 +1,41 @@
+"""
+Department identity.
+
+HODs and reviewers carry a department code (deptID), while researchers type
+their department as free text at sign-up ("Faculty of Computing"). To compare
+the two, both sides are reduced to a department key: the code itself, or the
+code whose name or alias (settings.DEPARTMENTS) matches the text. Text that
+matches nothing keys on its normalised form, so two identical names still match.
+"""
+import re
+
+from django.conf import settings
+
+_PREFIX_RE = re.compile(r'^(faculty|department|dept|school|institute) of ')
+
+
+def _normalise(value):
+    text = ' '.join((value or '').lower().replace('&', ' and ').split())
+    return _PREFIX_RE.sub('', text)
+
+
+def _aliases():
+    aliases = {}
+    for code, names in settings.DEPARTMENTS.items():
+        key = code.strip().upper()
+        aliases[_normalise(code)] = key
+        for name in names:
+            aliases[_normalise(name)] = key
+    return aliases
+
+
+def department_key(value):
+    """The department code for a code or department name, else the normalised text ('' if blank)."""
+    text = _normalise(value)
+    return _aliases().get(text, text)
+
+
+def department_keys(values):
+    """department_key() for many values, building the alias table once."""
+    aliases = _aliases()
+    return [aliases.get(text, text) for text in map(_normalise, values)]
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Notification, User
+from users.notifications import notify, notify_many
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare per-row notify() against notify_many() on throwaway users. Nothing is kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=10000)
+        parser.add_argument(
+            '--single', type=int, default=1000,
+            help="How many recipients to time the one-INSERT-per-row path on (it's slow).",
+        )
+
+    def handle(self, *args, **options):
+        count = options['recipients']
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    [User(username=f'bench-notify-{i}', role='Researcher') for i in range(count)],
+                    batch_size=1000,
+                )
+
+                single = users[:options['single']]
+                started = time.perf_counter()
+                for user in single:
+                    notify(user, "Benchmark: single")
+                self.report("notify() loop", len(single), time.perf_counter() - started)
+
+                started = time.perf_counter()
+                created = notify_many(users, "Benchmark: bulk")
+                self.report("notify_many()", len(created), time.perf_counter() - started)
+
+                started = time.perf_counter()
+                created = notify_many(users, "Benchmark: bulk")
+                self.report("notify_many() coalesced", count, time.perf_counter() - started)
+                assert not created
+
+                self.stdout.write(f"Rows written: {Notification.objects.filter(recipient__in=users).count()}")
+                raise Rollback
+        except Rollback:
+            pass
+
+    def report(self, label, rows, elapsed):
+        rate = rows / elapsed if elapsed else float('inf')
+        self.stdout.write(f"{label:<26} {rows:>7} rows  {elapsed:8.3f}s  {rate:10.0f} rows/s")
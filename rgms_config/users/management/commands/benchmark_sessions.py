@@ -0,0 +1,115 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from users.models import Researcher
+
+PASSWORD = 'bench-sessions-pw'
+USERNAME_PREFIX = 'bench-session-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Log throwaway researchers in concurrently and time their requests under each session "
+        "engine (RGMS_SESSION_MODE values). Runs against the configured database; the users "
+        "and their sessions are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=8, help="Simultaneous clients.")
+        parser.add_argument('--requests', type=int, default=10, help="Dashboard requests per user after logging in.")
+        parser.add_argument(
+            '--modes', nargs='+', default=list(settings.SESSION_ENGINES),
+            help="Session modes to compare (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['modes']) - set(settings.SESSION_ENGINES)
+        if unknown:
+            raise CommandError(f"Unknown session mode(s): {', '.join(sorted(unknown))}")
+
+        # Password hashing would dwarf everything else; this measures the session layer
+        with override_settings(
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        ):
+            users = [
+                Researcher.objects.create_user(
+                    username=f'{USERNAME_PREFIX}{i}', password=PASSWORD, role='Researcher',
+                    department='Benchmark', researchinterests='',
+                )
+                for i in range(options['users'])
+            ]
+            try:
+                self.stdout.write(
+                    f"{'mode':<15} {'login p50':>10} {'login p95':>10} {'req p50':>9} {'req p95':>9} {'req/s':>8}"
+                )
+                for mode in options['modes']:
+                    self.run_mode(mode, users, options['concurrency'], options['requests'])
+            finally:
+                Researcher.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def run_mode(self, mode, users, concurrency, requests_per_user):
+        engine = settings.SESSION_ENGINES[mode]
+        with override_settings(SESSION_ENGINE=engine):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(lambda user: self.session_run(user, requests_per_user), users))
+            elapsed = time.perf_counter() - started
+
+            store = import_module(engine).SessionStore
+            for _, _, session_key in results:
+                if session_key:
+                    store(session_key=session_key).delete()
+
+        logins = [login for login, _, _ in results]
+        requests = [t for _, timings, _ in results for t in timings]
+        self.stdout.write(
+            f"{mode:<15} {ms(percentile(logins, 50)):>10} {ms(percentile(logins, 95)):>10} "
+            f"{ms(percentile(requests, 50)):>9} {ms(percentile(requests, 95)):>9} "
+            f"{len(requests) / elapsed:8.0f}"
+        )
+
+    def session_run(self, user, requests_per_user):
+        """One user's login plus dashboard requests; returns (login time, request times, session key)."""
+        client = Client()
+        dashboard = reverse('researcher_dashboard')
+        try:
+            started = time.perf_counter()
+            response = client.post(reverse('login'), {'username': user.username, 'password': PASSWORD})
+            login = time.perf_counter() - started
+            if response.status_code != 302:
+                raise CommandError(f"Login failed for {user.username} ({response.status_code}).")
+
+            timings = []
+            for _ in range(requests_per_user):
+                started = time.perf_counter()
+                response = client.get(dashboard)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"Dashboard returned {response.status_code} for {user.username}.")
+            cookie = client.cookies.get(settings.SESSION_COOKIE_NAME)
+            return login, timings, cookie.value if cookie else None
+        finally:
+            # Each pool thread has its own connection
+            connection.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def ms(seconds):
+    return f'{seconds * 1000:.1f}ms'
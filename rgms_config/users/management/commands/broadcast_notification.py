@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from users.models import User
+from users.notifications import notify_many
+
+
+class Command(BaseCommand):
+    help = "Send one notification to every user with the given role(s), e.g. a call-for-proposals deadline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('message')
+        parser.add_argument('--link', default=None, help="URL the notification points to.")
+        parser.add_argument(
+            '--role', action='append', choices=[r for r, _ in User.role_choices],
+            help="Recipient role; repeat for several. Defaults to everyone.",
+        )
+        parser.add_argument('--department', help="Only researchers in this department.")
+        parser.add_argument(
+            '--window', type=int, default=None,
+            help="Skip users who got the same message in the last N seconds (default: NOTIFICATION_COALESCE_SECONDS).",
+        )
+
+    def handle(self, *args, **options):
+        recipients = User.objects.filter(is_active=True)
+        if options['role']:
+            recipients = recipients.filter(role__in=options['role'])
+        if options['department']:
+            recipients = recipients.filter(researcher__department=options['department'])
+
+        window = None if options['window'] is None else timedelta(seconds=options['window'])
+        created = notify_many(recipients.values_list('pk', flat=True), options['message'], link=options['link'], window=window)
+        self.stdout.write(f"Sent {len(created)} notification(s).")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from users.retention import DEFAULT_BATCH_SIZE, expired, purge_read_notifications, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = "Delete (or archive) read notifications older than NOTIFICATION_RETENTION_DAYS, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Override NOTIFICATION_RETENTION_DAYS.")
+        parser.add_argument('--archive', action='store_true', default=None, help="Copy rows to ArchivedNotification before deleting.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows would be removed.")
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options['days'])
+        if options['dry_run']:
+            self.stdout.write(f"{expired(cutoff).count()} read notification(s) older than {cutoff:%Y-%m-%d} would be removed.")
+            return
+        removed = purge_read_notifications(
+            cutoff, archive=options['archive'], batch_size=options['batch_size'], pause=options['pause']
+        )
+        self.stdout.write(f"Removed {removed} read notification(s) older than {cutoff:%Y-%m-%d}.")
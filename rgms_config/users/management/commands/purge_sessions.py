@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.sessions import DEFAULT_BATCH_SIZE, expired_sessions, purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete expired django_session rows in small batches (a chunked `clearsessions`)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows would be removed.")
+
+    def handle(self, *args, **options):
+        expired = expired_sessions()
+        if expired is None:
+            self.stdout.write(f"{settings.SESSION_ENGINE} keeps no session rows; nothing to purge.")
+            return
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} expired session(s) would be removed.")
+            return
+        removed = purge_expired_sessions(batch_size=options['batch_size'], pause=options['pause'])
+        self.stdout.write(f"Removed {removed} expired session(s).")
@@ -6,6 +6,15 @@ class User(AbstractUser):
     role_choices = [('Researcher', 'Researcher'), ('Reviewer', 'Reviewer'), ('HOD', 'HOD')]
     role = models.CharField(max_length=20, choices=role_choices)
 
+    # Role -> reverse accessor of its multi-table-inheritance child
+    ROLE_PROFILES = {'Researcher': 'researcher', 'Reviewer': 'reviewer', 'HOD': 'hod'}
+
+    @property
+    def profile(self):
+        """The Researcher/Reviewer/HOD row for this user's role (no query if RoleModelBackend loaded it)."""
+        accessor = self.ROLE_PROFILES.get(self.role)
+        return getattr(self, accessor, None) if accessor else None
+
 class Researcher(User):
     department = models.CharField(max_length=100) 
     researchinterests = models.TextField() 
@@ -45,8 +54,30 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Unread badge count and "latest for recipient" lookups
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notif_recipient_read_idx'),
+            # Matches Meta.ordering, so "latest for recipient" reads the index instead of sorting
+            models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+            # Retention sweep: read notifications older than the cut-off
+            models.Index(fields=['is_read', 'created_at'], name='notif_read_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.recipient.username}: {self.message}"
+
+class ArchivedNotification(models.Model):
+    """Read notifications moved out of the hot table by the retention job."""
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    message = models.CharField(max_length=255)
+    link = models.CharField(max_length=200, blank=True, null=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"Notification for {self.recipient.username}: {self.message}"
\ No newline at end of file
+        return f"Archived notification for {self.recipient_id}: {self.message}"
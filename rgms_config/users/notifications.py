@@ -0,0 +1,164 @@
+"""
+Notification service: creating notifications and reading the bell badge data.
+
+The unread count and the latest few notifications are cached per user in
+Django's cache, so rendering the bell costs no queries once warm. The count is
+never adjusted in place: every write bumps the user's count version, and the
+next read recounts under the new version. A count computed before a write is
+stored under the old version and never served, so a late increment or recount
+can't resurrect a badge that mark_all_read() just cleared. New notifications
+are published to any open live streams (users.pubsub).
+
+notify_many() sends one message to many recipients with batched INSERTs,
+skipping anyone who already got the same message within the coalescing window.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+from .pubsub import broker
+
+LATEST_LIMIT = 5
+BULK_BATCH_SIZE = 1000
+
+
+def _timeout():
+    return getattr(settings, 'NOTIFICATION_CACHE_TIMEOUT', 3600)
+
+
+def _coalesce_window():
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_SECONDS', 600))
+
+
+def _unread_version_key(user_id):
+    return f'notifications:unread-version:{user_id}'
+
+
+def _unread_key(user_id, version):
+    return f'notifications:unread:{user_id}:{version}'
+
+
+def _unread_version(user_id):
+    key = _unread_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seeded from the clock so a lost version key never reuses an old count
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_unread(user_ids):
+    """Make the next unread_count() of each of `user_ids` recount from the table."""
+    for user_id in set(user_ids):
+        try:
+            cache.incr(_unread_version_key(user_id))
+        except ValueError:
+            # No version yet, so no count was cached under one either
+            pass
+
+
+def _latest_key(user_id):
+    return f'notifications:latest:{user_id}'
+
+
+def invalidate_latest(user_ids):
+    """Drop the cached latest-notifications lists of `user_ids` (e.g. after rows are removed)."""
+    cache.delete_many({_latest_key(i) for i in user_ids})
+
+
+def _on_created(notification):
+    user_id = notification.recipient_id
+    invalidate_unread([user_id])
+    cache.delete(_latest_key(user_id))
+    # No count in the event; open pages bump their own badge
+    broker.publish(user_id, serialize(notification))
+
+
+def serialize(notification, unread=None):
+    """JSON-ready form of a notification for the live stream."""
+    return {
+        'id': notification.pk,
+        'message': notification.message,
+        'link': notification.link,
+        'created_at': notification.created_at.isoformat(),
+        'unread_count': unread,
+    }
+
+
+def notify(recipient, message, link=None):
+    """Create a notification for `recipient` and update their cached badge."""
+    notification = Notification.objects.create(recipient=recipient, message=message, link=link)
+    # After commit, so a rolled-back notification is never counted
+    transaction.on_commit(lambda: _on_created(notification))
+    return notification
+
+
+def _on_bulk_created(created):
+    user_ids = [n.recipient_id for n in created]
+    invalidate_unread(user_ids)
+    invalidate_latest(user_ids)
+    for notification in created:
+        broker.publish(notification.recipient_id, serialize(notification))
+
+
+def notify_many(recipients, message, link=None, window=None):
+    """
+    Send the same notification to many users at once. `recipients` may be users
+    or user ids; duplicates are dropped, as is anyone who already received this
+    exact message and link within `window` (defaults to NOTIFICATION_COALESCE_SECONDS).
+    Returns the created notifications.
+    """
+    recipient_ids = list(dict.fromkeys(getattr(r, 'pk', r) for r in recipients))
+    if not recipient_ids:
+        return []
+
+    window = _coalesce_window() if window is None else window
+    now = timezone.now()
+    if window:
+        already_sent = set()
+        # Chunked so the IN (...) list stays under SQLite's variable limit
+        for start in range(0, len(recipient_ids), BULK_BATCH_SIZE):
+            already_sent.update(Notification.objects.filter(
+                recipient_id__in=recipient_ids[start:start + BULK_BATCH_SIZE],
+                message=message,
+                link=link,
+                created_at__gte=now - window,
+            ).values_list('recipient_id', flat=True))
+        recipient_ids = [i for i in recipient_ids if i not in already_sent]
+
+    created = Notification.objects.bulk_create(
+        [Notification(recipient_id=i, message=message, link=link, created_at=now) for i in recipient_ids],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    if created:
+        transaction.on_commit(lambda: _on_bulk_created(created))
+    return created
+
+
+def unread_count(user):
+    key = _unread_key(user.pk, _unread_version(user.pk))
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient=user, is_read=False).count()
+        # If a write bumped the version meanwhile, this lands under the old key and is ignored
+        cache.set(key, count, _timeout())
+    return count
+
+
+def latest(user):
+    notifications = cache.get(_latest_key(user.pk))
+    if notifications is None:
+        notifications = list(Notification.objects.filter(recipient=user)[:LATEST_LIMIT])
+        cache.set(_latest_key(user.pk), notifications, _timeout())
+    return notifications
+
+
+def mark_all_read(user):
+    Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+    transaction.on_commit(lambda: (invalidate_unread([user.pk]), cache.delete(_latest_key(user.pk))))
@@ -0,0 +1,70 @@
+"""
+In-process publish/subscribe for live notifications.
+
+Streaming connections (served by the ASGI app) subscribe with an asyncio
+queue bound to their event loop; the notification write path publishes from
+ordinary sync code. Delivery only reaches subscribers in the same process, so
+run the ASGI server as a single process (or with one broker per worker and
+sticky sessions) for the stream to see every notification.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class Subscription:
+    def __init__(self, user_id, loop, maxsize):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def _put(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Slow consumer: drop rather than grow without bound
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class NotificationBroker:
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Register a subscriber on the running event loop."""
+        subscription = Subscription(user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, payload):
+        """Deliver `payload` to every live subscriber of `user_id`; safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, payload)
+            except RuntimeError:
+                # Loop already closed; the stream's cleanup will unsubscribe it
+                pass
+        return len(subscribers)
+
+    def subscriber_count(self, user_id):
+        with self._lock:
+            return len(self._subscribers.get(user_id, ()))
+
+
+broker = NotificationBroker()
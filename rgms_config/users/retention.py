@@ -0,0 +1,74 @@
+"""
+Retention for the Notification table.
+
+Read notifications older than NOTIFICATION_RETENTION_DAYS are deleted (or
+copied to ArchivedNotification first) in small batches, each in its own short
+transaction, so the sweep never holds a long lock on the table. Unread
+notifications are never touched.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+from .notifications import invalidate_latest
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def retention_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+    return timezone.now() - timedelta(days=days)
+
+
+def expired(cutoff):
+    return Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+
+def purge_read_notifications(cutoff, archive=None, batch_size=DEFAULT_BATCH_SIZE, pause=0):
+    """
+    Remove read notifications created before `cutoff`, `batch_size` rows at a
+    time, sleeping `pause` seconds between batches. Returns the number removed.
+    """
+    if archive is None:
+        archive = getattr(settings, 'NOTIFICATION_RETENTION_ARCHIVE', False)
+    removed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                expired(cutoff).order_by('created_at').values('pk', 'recipient_id', 'message', 'link', 'created_at')[:batch_size]
+            )
+            if not batch:
+                break
+            if archive:
+                now = timezone.now()
+                ArchivedNotification.objects.bulk_create([
+                    ArchivedNotification(
+                        recipient_id=row['recipient_id'], message=row['message'], link=row['link'],
+                        created_at=row['created_at'], archived_at=now,
+                    )
+                    for row in batch
+                ])
+            Notification.objects.filter(pk__in=[row['pk'] for row in batch]).delete()
+        # Cached "latest" lists may still hold the removed rows
+        invalidate_latest(row['recipient_id'] for row in batch)
+        removed += len(batch)
+        if len(batch) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return removed
+
+
+def purge_notifications_job(job):
+    """Background job handler (kind 'purge_notifications')."""
+    payload = job.payload
+    purge_read_notifications(
+        retention_cutoff(payload.get('days')),
+        archive=payload.get('archive'),
+        batch_size=payload.get('batch_size', DEFAULT_BATCH_SIZE),
+    )
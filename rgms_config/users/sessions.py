@@ -0,0 +1,61 @@
+"""
+Session housekeeping.
+
+With the db and cached_db session engines every session that expires without
+a logout leaves its django_session row behind. Django's `clearsessions` removes
+them in one DELETE, which on SQLite holds the single write lock for the whole
+sweep; purge_expired_sessions() does it in small batches instead, each in its
+own short transaction. Cached copies expire from the cache on their own, and
+the signed-cookie engine keeps nothing on the server, so there is nothing to purge.
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def session_model(engine=None):
+    """The Session model behind `engine` (default SESSION_ENGINE), or None if it isn't database-backed."""
+    store = import_module(engine or settings.SESSION_ENGINE).SessionStore
+    if not hasattr(store, 'get_model_class'):
+        return None
+    return store.get_model_class()
+
+
+def expired_sessions(now=None, engine=None):
+    model = session_model(engine)
+    if model is None:
+        return None
+    return model.objects.filter(expire_date__lt=now or timezone.now())
+
+
+def purge_expired_sessions(batch_size=DEFAULT_BATCH_SIZE, pause=0, now=None, engine=None):
+    """
+    Delete expired session rows `batch_size` at a time, sleeping `pause`
+    seconds between batches. Returns the number removed.
+    """
+    expired = expired_sessions(now or timezone.now(), engine)
+    if expired is None:
+        return 0
+    removed = 0
+    while True:
+        with transaction.atomic():
+            keys = list(expired.order_by('expire_date').values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                break
+            expired.model.objects.filter(session_key__in=keys).delete()
+        removed += len(keys)
+        if len(keys) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return removed
+
+
+def purge_sessions_job(job):
+    """Background job handler (kind 'purge_sessions')."""
+    purge_expired_sessions(batch_size=job.payload.get('batch_size', DEFAULT_BATCH_SIZE))
@@ -1,3 +1,330 @@
-from django.test import TestCase
+import asyncio
+import os
+import runpy
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from unittest import mock
+
+from .backends import RoleModelBackend
+from .context_processors import user_notifications
+from .models import HOD, ArchivedNotification, Notification, Researcher
+from . import notifications, retention, sessions
+from .decorators import role_required
+from .pubsub import broker
+
+
+def make_researcher(username='alice'):
+    return Researcher.objects.create_user(
+        username=username, role='Researcher', department='Computing', researchinterests='AI'
+    )
+
+
+class NotificationServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_researcher()
+
+    def notify(self, message='Hello'):
+        # notify() updates the cache on commit; run the hooks inside the test transaction
+        with self.captureOnCommitCallbacks(execute=True):
+            return notifications.notify(self.alice, message, link='/')
+
+    def test_unread_counter_is_cached_and_recounted_after_writes(self):
+        self.notify()
+        self.assertEqual(notifications.unread_count(self.alice), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(self.alice), 1)
+
+        self.notify()
+        self.notify()
+        self.assertEqual(notifications.unread_count(self.alice), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(self.alice), 3)
+
+    def test_mark_read_resets_counter_and_latest(self):
+        self.notify('First')
+        self.assertEqual([n.message for n in notifications.latest(self.alice)], ['First'])
+
+        self.client.force_login(self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('mark_notifications_read'))
+
+        self.assertEqual(notifications.unread_count(self.alice), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+        self.assertTrue(all(n.is_read for n in notifications.latest(self.alice)))
+
+    def test_count_computed_before_mark_read_is_never_served(self):
+        self.notify()
+        # A reader starts recounting before mark_all_read() and stores its result after it
+        stale_key = notifications._unread_key(self.alice.pk, notifications._unread_version(self.alice.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.mark_all_read(self.alice)
+        cache.set(stale_key, 1)
+
+        self.assertEqual(notifications.unread_count(self.alice), 0)
+
+    def test_new_notification_refreshes_latest_list(self):
+        self.notify('First')
+        notifications.latest(self.alice)
+        self.notify('Second')
+        self.assertEqual([n.message for n in notifications.latest(self.alice)], ['Second', 'First'])
+
+    def test_context_processor_is_query_free_when_warm(self):
+        self.notify()
+        request = RequestFactory().get('/')
+        request.user = self.alice
+        user_notifications(request)
+
+        with self.assertNumQueries(0):
+            context = user_notifications(request)
+        self.assertEqual(context['notif_count'], 1)
+        self.assertEqual(len(context['notifications']), 1)
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_researcher()
+
+    def test_notify_publishes_to_subscribers(self):
+        async def receive():
+            subscription = broker.subscribe(self.alice.pk)
+            try:
+                # Publish from a worker thread, as the sync write path would
+                await asyncio.to_thread(broker.publish, self.alice.pk, {'id': 1, 'message': 'Hi'})
+                return await asyncio.wait_for(subscription.get(), timeout=1)
+            finally:
+                broker.unsubscribe(subscription)
+
+        self.assertEqual(asyncio.run(receive())['message'], 'Hi')
+        self.assertEqual(broker.subscriber_count(self.alice.pk), 0)
+
+    def test_created_notification_is_serialized_for_stream(self):
+        published = []
+        original = broker.publish
+        broker.publish = lambda user_id, payload: published.append((user_id, payload))
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                notification = notifications.notify(self.alice, 'Proposal Approved', link='/r/')
+        finally:
+            broker.publish = original
+
+        self.assertEqual(published[0][0], self.alice.pk)
+        self.assertEqual(published[0][1]['id'], notification.pk)
+        self.assertEqual(published[0][1]['link'], '/r/')
+
+    def test_stream_requires_login_and_asgi(self):
+        self.assertEqual(self.client.get(reverse('notification_stream')).status_code, 401)
+        self.client.force_login(self.alice)
+        # The WSGI test client can't hold the stream open
+        self.assertEqual(self.client.get(reverse('notification_stream')).status_code, 204)
+
+
+class BulkNotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.researchers = [make_researcher(f'r{i}') for i in range(5)]
+
+    def notify_many(self, recipients, message='Deadline Friday', **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return notifications.notify_many(recipients, message, **kwargs)
+
+    def test_one_insert_for_all_recipients(self):
+        # 1 coalescing lookup + 1 INSERT, regardless of recipient count
+        with self.assertNumQueries(2):
+            created = self.notify_many(self.researchers)
+        self.assertEqual(len(created), 5)
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_duplicate_recipients_are_dropped(self):
+        alice = self.researchers[0]
+        self.notify_many([alice, alice.pk, alice])
+        self.assertEqual(Notification.objects.filter(recipient=alice).count(), 1)
+
+    def test_repeats_within_window_are_coalesced(self):
+        self.notify_many(self.researchers[:2])
+        created = self.notify_many(self.researchers)
+        self.assertEqual({n.recipient_id for n in created}, {r.pk for r in self.researchers[2:]})
+        # A different message isn't coalesced
+        self.assertEqual(len(self.notify_many(self.researchers, 'Budget freeze')), 5)
+
+    def test_repeats_outside_window_are_sent(self):
+        self.notify_many(self.researchers)
+        Notification.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(len(self.notify_many(self.researchers, window=timedelta(minutes=10))), 5)
+
+    def test_cached_badges_are_refreshed(self):
+        alice = self.researchers[0]
+        self.assertEqual(notifications.unread_count(alice), 0)
+        self.notify_many(self.researchers)
+        self.assertEqual(notifications.unread_count(alice), 1)
+
+    def test_broadcast_command_filters_by_department(self):
+        other = Researcher.objects.create_user(
+            username='bob', role='Researcher', department='Physics', researchinterests='Optics'
+        )
+        out = StringIO()
+        call_command('broadcast_notification', 'Physics seminar', '--department', 'Physics', stdout=out)
+        self.assertIn('Sent 1', out.getvalue())
+        self.assertEqual(list(Notification.objects.values_list('recipient_id', flat=True)), [other.pk])
+
+    def test_hod_can_announce_to_researchers(self):
+        hod = HOD.objects.create_user(username='hod', role='HOD', deptID='CS')
+        self.client.force_login(hod)
+        self.client.post(reverse('broadcast_notification'), {'message': 'Call for proposals'})
+        self.assertEqual(Notification.objects.filter(message='Call for proposals').count(), 5)
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_researcher()
+        old = timezone.now() - timedelta(days=200)
+        for i in range(5):
+            Notification.objects.create(recipient=self.alice, message=f'Old read {i}', is_read=True, created_at=old)
+        Notification.objects.create(recipient=self.alice, message='Old unread', created_at=old)
+        Notification.objects.create(recipient=self.alice, message='Recent read', is_read=True)
+
+    def remaining(self):
+        return set(Notification.objects.values_list('message', flat=True))
+
+    def test_purge_removes_only_old_read_notifications(self):
+        removed = retention.purge_read_notifications(retention.retention_cutoff(90), batch_size=2)
+        self.assertEqual(removed, 5)
+        self.assertEqual(self.remaining(), {'Old unread', 'Recent read'})
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+    def test_archive_copies_rows_before_deleting(self):
+        retention.purge_read_notifications(retention.retention_cutoff(90), archive=True)
+        self.assertEqual(ArchivedNotification.objects.filter(recipient=self.alice).count(), 5)
+        self.assertEqual(self.remaining(), {'Old unread', 'Recent read'})
+
+    def test_purge_invalidates_cached_latest_list(self):
+        notifications.latest(self.alice)
+        retention.purge_read_notifications(retention.retention_cutoff(90))
+        self.assertEqual(len(notifications.latest(self.alice)), 2)
+
+    def test_command_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command('purge_notifications', '--dry-run', stdout=out)
+        self.assertIn('5 read notification(s)', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 7)
+
+        call_command('purge_notifications', '--days', '30', stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+class RoleResolutionTests(TestCase):
+    def setUp(self):
+        self.alice = make_researcher()
+        self.hod = HOD.objects.create_user(
+            username='boss', role='HOD', deptID='CS', total_department_budget=100000
+        )
+
+    def test_backend_loads_role_row_with_the_user(self):
+        backend = RoleModelBackend()
+        with self.assertNumQueries(1):
+            user = backend.get_user(self.hod.pk)
+            self.assertEqual(user.hod.deptID, 'CS')
+            self.assertEqual(user.profile, user.hod)
+        with self.assertNumQueries(1):
+            user = backend.get_user(self.alice.pk)
+            self.assertEqual(user.profile.department, 'Computing')
+        self.assertIsNone(backend.get_user(0))
+
+    def test_role_required_redirects_other_roles(self):
+        @role_required('HOD')
+        def view(request):
+            return 'ok'
+
+        factory = RequestFactory()
+        request = factory.get('/')
+        request.user = self.hod
+        self.assertEqual(view(request), 'ok')
+        request.user = self.alice
+        self.assertEqual(view(request).url, reverse('home'))
+
+    def test_sessions_from_the_old_backend_stay_logged_in(self):
+        self.client.force_login(self.alice, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get(reverse('researcher_dashboard')).status_code, 200)
+
+    def test_new_logins_use_the_role_backend(self):
+        self.alice.set_password('pw')
+        self.alice.save()
+        self.assertTrue(self.client.login(username=self.alice.username, password='pw'))
+        self.assertEqual(self.client.session['_auth_user_backend'], 'users.backends.RoleModelBackend')
+
+    def test_guarded_views_still_send_other_roles_home(self):
+        self.client.force_login(self.alice)
+        self.assertRedirects(self.client.get(reverse('hod_dashboard')), reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('researcher_dashboard')).status_code, 200)
+
+
+class SessionPurgeTests(TestCase):
+    def setUp(self):
+        from django.contrib.sessions.backends.db import SessionStore
+
+        self.live = SessionStore()
+        self.live.create()
+        for _ in range(5):
+            store = SessionStore()
+            store.create()
+            store.get_model_class().objects.filter(session_key=store.session_key).update(
+                expire_date=timezone.now() - timedelta(days=1)
+            )
+
+    def remaining(self):
+        return list(sessions.session_model().objects.values_list('session_key', flat=True))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_purge_removes_expired_rows_in_batches(self):
+        self.assertEqual(sessions.purge_expired_sessions(batch_size=2), 5)
+        self.assertEqual(self.remaining(), [self.live.session_key])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_command_dry_run_and_purge(self):
+        out = StringIO()
+        call_command('purge_sessions', '--dry-run', stdout=out)
+        self.assertIn('5 expired session(s) would be removed', out.getvalue())
+        self.assertEqual(len(self.remaining()), 6)
+
+        call_command('purge_sessions', '--batch-size', '3', stdout=StringIO())
+        self.assertEqual(self.remaining(), [self.live.session_key])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_have_nothing_to_purge(self):
+        self.assertIsNone(sessions.session_model())
+        self.assertEqual(sessions.purge_expired_sessions(), 0)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_cached_db_login_reads_session_from_cache(self):
+        alice = make_researcher()
+        self.client.force_login(alice)
+        self.client.get(reverse('researcher_dashboard'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('researcher_dashboard'))
+        self.assertFalse([q for q in queries if 'django_session' in q['sql']])
+
+    def load_settings(self, **env):
+        # Settings are evaluated once at startup; run the module again under `env`
+        with mock.patch.dict(os.environ, env):
+            for name in {'RGMS_SESSION_MODE', 'RGMS_SINGLE_PROCESS'} - env.keys():
+                os.environ.pop(name, None)
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'rgms_config', 'settings.py'))
+
+    def test_cached_db_with_per_process_cache_is_refused(self):
+        self.assertEqual(self.load_settings()['SESSION_ENGINE'], 'django.contrib.sessions.backends.db')
+        with self.assertRaises(ImproperlyConfigured):
+            self.load_settings(RGMS_SESSION_MODE='cached_db')
+        single = self.load_settings(RGMS_SESSION_MODE='cached_db', RGMS_SINGLE_PROCESS='1')
+        self.assertEqual(single['SESSION_ENGINE'], 'django.contrib.sessions.backends.cached_db')
@@ -1,10 +1,18 @@
+import asyncio
+import json
+
 from django.shortcuts import render, redirect
 from django.contrib.auth import login
 from .forms import ResearcherSignUpForm
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
-from .models import Notification
+from . import notifications
+from .pubsub import broker
+
+# Seconds between SSE keep-alive comments on an idle stream
+STREAM_KEEPALIVE = 25
 
 def home(request):
     return render(request, 'home.html')
@@ -34,5 +42,37 @@ def dashboard_dispatch(request):
 @require_POST
 def mark_notifications_read(request):
     """Marks all notifications for the user as read."""
-    Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
-    return JsonResponse({'status': 'success'})
\ No newline at end of file
+    notifications.mark_all_read(request.user)
+    return JsonResponse({'status': 'success'})
+
+
+async def notification_stream(request):
+    """
+    Server-sent events stream of new notifications for the logged-in user.
+    Needs the ASGI app (an idle connection must not hold a worker thread);
+    under WSGI it answers 204, which tells EventSource not to reconnect.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    async def events():
+        subscription = broker.subscribe(user.pk)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscription.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: notification\nid: {payload["id"]}\ndata: {json.dumps(payload)}\n\n'
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response